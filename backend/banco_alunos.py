@@ -0,0 +1,625 @@
+# -*- coding: utf-8 -*-
+"""
+Cadastro de alunos e histórico de correções em SQLite (modo WAL).
+
+Cada correção é um INSERT no histórico, sem reescrever o cadastro inteiro,
+e transações curtas evitam que correções simultâneas percam entradas umas
+das outras. Na primeira abertura, o conteúdo de alunos.json é migrado.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+BANCO_ALUNOS = os.environ.get("BANCO_ALUNOS", "alunos.db")
+ALUNOS_JSON = "alunos.json"
+
+VERSAO_ESQUEMA = 5
+
+# Largura das faixas de acertos na distribuição por prova (0-9, 10-19, ...).
+FAIXA_ACERTOS = 10
+# Questões listadas no resumo de cada turma, das mais erradas para as menos.
+QUESTOES_MAIS_ERRADAS = 10
+
+COLUNAS_HISTORICO = (
+    "id",
+    "codigo_aluno",
+    "nome",
+    "turma",
+    "ano",
+    "dia",
+    "idioma",
+    "data_correcao",
+    "acertos",
+    "total_questoes",
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS alunos (
+    codigo TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    turma TEXT
+);
+CREATE TABLE IF NOT EXISTS historico (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codigo_aluno TEXT NOT NULL REFERENCES alunos (codigo),
+    ano TEXT,
+    dia TEXT,
+    idioma TEXT,
+    data_correcao TEXT,
+    acertos INTEGER,
+    total_questoes INTEGER,
+    entrada TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_historico_aluno ON historico (codigo_aluno);
+CREATE INDEX IF NOT EXISTS idx_historico_prova ON historico (ano, dia);
+"""
+
+# Versão 2: agregados por prova mantidos a cada correção (sem reler o histórico).
+ESQUEMA_AGREGADOS = """
+CREATE INDEX IF NOT EXISTS idx_alunos_turma ON alunos (turma);
+CREATE TABLE IF NOT EXISTS agregados_prova (
+    ano TEXT,
+    dia TEXT,
+    quantidade INTEGER NOT NULL,
+    soma_acertos INTEGER NOT NULL,
+    soma_quadrados INTEGER NOT NULL,
+    minimo INTEGER,
+    maximo INTEGER,
+    PRIMARY KEY (ano, dia)
+);
+CREATE TABLE IF NOT EXISTS distribuicao_acertos (
+    ano TEXT,
+    dia TEXT,
+    faixa INTEGER,
+    quantidade INTEGER NOT NULL,
+    PRIMARY KEY (ano, dia, faixa)
+);
+"""
+
+
+# Versão 4: `origem` identifica a folha de um job (job_id:indice); a folha
+# corrigida de novo depois de um restart não duplica o histórico.
+ESQUEMA_ORIGEM = """
+ALTER TABLE historico ADD COLUMN origem TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_historico_origem ON historico (origem);
+"""
+
+# Versão 5: as exportações incrementais usam historico.id (a chave primária)
+# como cursor; o índice por data da correção que a versão 3 criava para elas
+# só pesava nas escritas e é removido.
+ESQUEMA_CURSOR_ID = """
+DROP INDEX IF EXISTS idx_historico_data;
+"""
+
+
+def _linha_historico(codigo_aluno, entrada, origem=None):
+    detalhes = entrada.get("detalhes_prova", {})
+    analise = entrada.get("analise", {})
+    return (
+        codigo_aluno,
+        str(detalhes.get("ano", "")),
+        str(detalhes.get("dia", "")),
+        detalhes.get("idioma"),
+        entrada.get("data_correcao"),
+        analise.get("acertos"),
+        analise.get("total_questoes"),
+        json.dumps(entrada, ensure_ascii=False),
+        origem,
+    )
+
+
+def _executar_script(conexao, script):
+    # executescript faria COMMIT no meio da transação da migração.
+    for comando in script.split(";"):
+        conexao.execute(comando)
+
+
+def _acumular_agregados(conexao, linhas):
+    """Soma as novas linhas de histórico aos agregados da prova (ano, dia)."""
+    validas = [
+        (ano, dia, acertos)
+        for _, ano, dia, _, _, acertos, total, *_ in linhas
+        if total and acertos is not None
+    ]
+    conexao.executemany(
+        "INSERT INTO agregados_prova (ano, dia, quantidade, soma_acertos, "
+        "soma_quadrados, minimo, maximo) VALUES (?, ?, 1, ?, ?, ?, ?) "
+        "ON CONFLICT (ano, dia) DO UPDATE SET "
+        "quantidade = quantidade + 1, "
+        "soma_acertos = soma_acertos + excluded.soma_acertos, "
+        "soma_quadrados = soma_quadrados + excluded.soma_quadrados, "
+        "minimo = MIN(minimo, excluded.minimo), "
+        "maximo = MAX(maximo, excluded.maximo)",
+        [(ano, dia, a, a * a, a, a) for ano, dia, a in validas],
+    )
+    conexao.executemany(
+        "INSERT INTO distribuicao_acertos (ano, dia, faixa, quantidade) "
+        "VALUES (?, ?, ?, 1) "
+        "ON CONFLICT (ano, dia, faixa) DO UPDATE SET quantidade = quantidade + 1",
+        [(ano, dia, a // FAIXA_ACERTOS * FAIXA_ACERTOS) for ano, dia, a in validas],
+    )
+
+
+def _recalcular_agregados(conexao):
+    conexao.execute("DELETE FROM agregados_prova")
+    conexao.execute("DELETE FROM distribuicao_acertos")
+    conexao.execute(
+        "INSERT INTO agregados_prova SELECT ano, dia, COUNT(*), SUM(acertos), "
+        "SUM(acertos * acertos), MIN(acertos), MAX(acertos) FROM historico "
+        "WHERE total_questoes > 0 AND acertos IS NOT NULL GROUP BY ano, dia"
+    )
+    conexao.execute(
+        "INSERT INTO distribuicao_acertos SELECT ano, dia, faixa, COUNT(*) FROM "
+        f"(SELECT ano, dia, acertos / {FAIXA_ACERTOS} * {FAIXA_ACERTOS} AS faixa "
+        "FROM historico WHERE total_questoes > 0 AND acertos IS NOT NULL) "
+        "GROUP BY ano, dia, faixa"
+    )
+
+
+def _filtros_historico(
+    turma=None, ano=None, dia=None, codigo_aluno=None, desde=None, ate=None
+):
+    """
+    Condições SQL (sobre historico h e alunos a). `desde`/`ate` limitam o
+    id da linha do histórico: depois de `desde` e até `ate`, inclusive. O id
+    só cresce, ao contrário da data da correção (relógio ajustado, folhas
+    de um lote registradas fora de ordem), então serve de cursor.
+    """
+    condicoes, parametros = [], []
+    if desde is not None:
+        condicoes.append("h.id > ?")
+        parametros.append(int(desde))
+    if ate is not None:
+        condicoes.append("h.id <= ?")
+        parametros.append(int(ate))
+    for coluna, valor in (
+        ("a.turma", turma),
+        ("h.ano", ano),
+        ("h.dia", dia),
+        ("h.codigo_aluno", codigo_aluno),
+    ):
+        if valor is not None:
+            condicoes.append(f"{coluna} = ?")
+            parametros.append(str(valor))
+    return condicoes, parametros
+
+
+class BancoAlunos:
+    """
+    Acesso ao banco de alunos. Uma conexão por thread (o SQLite não
+    compartilha conexões entre threads); as escritas usam BEGIN IMMEDIATE
+    para serializar no próprio banco.
+    """
+
+    def __init__(self, caminho=BANCO_ALUNOS, json_legado=ALUNOS_JSON):
+        self.caminho = caminho
+        self.json_legado = json_legado
+        self._local = threading.local()
+        self._pronto = False
+        self._lock_inicio = threading.Lock()
+
+    def iniciar(self):
+        """
+        Cria/atualiza o esquema. Feito uma vez, no startup da API ou na
+        primeira consulta, nunca no import.
+        """
+        with self._lock_inicio:
+            if self._pronto:
+                return
+            conexao = self._abrir()
+            try:
+                self._migrar(conexao)
+            finally:
+                conexao.close()
+            self._pronto = True
+
+    def _abrir(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        conexao.execute("PRAGMA foreign_keys=ON")
+        return conexao
+
+    def _conexao(self):
+        if not self._pronto:
+            self.iniciar()
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = self._local.conexao = self._abrir()
+        return conexao
+
+    def _escrever(self, funcao, conexao=None):
+        conexao = conexao or self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = funcao(conexao)
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+        conexao.execute("COMMIT")
+        return resultado
+
+    def _migrar(self, conexao):
+        """Cria/atualiza o esquema uma única vez por versão (PRAGMA user_version)."""
+
+        def migrar(conexao):
+            versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+            importados = 0
+            if versao < 1:
+                _executar_script(conexao, ESQUEMA)
+                importados = self._importar_json(conexao)
+            if versao < 2:
+                _executar_script(conexao, ESQUEMA_AGREGADOS)
+                _recalcular_agregados(conexao)
+            if versao < 4:
+                _executar_script(conexao, ESQUEMA_ORIGEM)
+            if versao < 5:
+                _executar_script(conexao, ESQUEMA_CURSOR_ID)
+            if versao < VERSAO_ESQUEMA:
+                conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+            return importados
+
+        importados = self._escrever(migrar, conexao)
+        if importados:
+            print(
+                f"✅ {importados} alunos migrados de '{self.json_legado}' para '{self.caminho}'."
+            )
+
+    def _importar_json(self, conexao):
+        if not self.json_legado or not os.path.exists(self.json_legado):
+            return 0
+        with open(self.json_legado, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        for codigo, aluno in dados.items():
+            conexao.execute(
+                "INSERT OR IGNORE INTO alunos (codigo, nome, turma) VALUES (?, ?, ?)",
+                (codigo, aluno.get("nome", "Não cadastrado"), aluno.get("turma")),
+            )
+            # Roda na versão 1 do esquema, ainda sem a coluna `origem`.
+            conexao.executemany(
+                "INSERT INTO historico (codigo_aluno, ano, dia, idioma, "
+                "data_correcao, acertos, total_questoes, entrada) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    _linha_historico(codigo, entrada)[:-1]
+                    for entrada in aluno.get("historico", [])
+                ],
+            )
+        return len(dados)
+
+    def obter_aluno(self, codigo):
+        """Cadastro do aluno (codigo, nome, turma) ou None."""
+        linha = (
+            self._conexao()
+            .execute(
+                "SELECT codigo, nome, turma FROM alunos WHERE codigo = ?", (codigo,)
+            )
+            .fetchone()
+        )
+        return dict(linha) if linha else None
+
+    def obter_alunos(self, codigos):
+        """Cadastros de vários alunos em uma consulta: {codigo: aluno}."""
+        codigos = list(set(codigos))
+        if not codigos:
+            return {}
+        marcadores = ", ".join("?" * len(codigos))
+        linhas = self._conexao().execute(
+            f"SELECT codigo, nome, turma FROM alunos WHERE codigo IN ({marcadores})",
+            codigos,
+        )
+        return {linha["codigo"]: dict(linha) for linha in linhas}
+
+    def cadastrar_aluno(self, codigo, nome, turma=None):
+        self._escrever(
+            lambda conexao: conexao.execute(
+                "INSERT OR REPLACE INTO alunos (codigo, nome, turma) VALUES (?, ?, ?)",
+                (codigo, nome, turma),
+            )
+        )
+
+    def registrar_correcoes(self, correcoes):
+        """
+        Acrescenta ao histórico uma lista de (codigo_aluno, entrada) ou
+        (codigo_aluno, entrada, origem) numa transação. Uma origem já
+        registrada é ignorada (a correção daquela folha já está no histórico).
+        """
+        linhas = [_linha_historico(*correcao) for correcao in correcoes]
+
+        def inserir(conexao):
+            novas = linhas
+            origens = [linha[-1] for linha in linhas if linha[-1] is not None]
+            if origens:
+                marcadores = ", ".join("?" * len(origens))
+                registradas = {
+                    origem
+                    for (origem,) in conexao.execute(
+                        f"SELECT origem FROM historico WHERE origem IN ({marcadores})",
+                        origens,
+                    )
+                }
+                novas = [linha for linha in linhas if linha[-1] not in registradas]
+            conexao.executemany(
+                "INSERT INTO historico (codigo_aluno, ano, dia, idioma, "
+                "data_correcao, acertos, total_questoes, entrada, origem) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                novas,
+            )
+            _acumular_agregados(conexao, novas)
+
+        self._escrever(inserir)
+
+    def registrar_correcao(self, codigo_aluno, entrada, origem=None):
+        self.registrar_correcoes([(codigo_aluno, entrada, origem)])
+
+    def historico(self, codigo_aluno=None, ano=None, dia=None):
+        """Entradas de histórico (mais antigas primeiro), com filtros opcionais."""
+        condicoes, parametros = [], []
+        for coluna, valor in (
+            ("codigo_aluno", codigo_aluno),
+            ("ano", ano),
+            ("dia", dia),
+        ):
+            if valor is not None:
+                condicoes.append(f"{coluna} = ?")
+                parametros.append(str(valor))
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        linhas = self._conexao().execute(
+            f"SELECT entrada FROM historico {where} ORDER BY id", parametros
+        )
+        return [json.loads(linha["entrada"]) for linha in linhas]
+
+    def alunos_com_historico(self):
+        """
+        Gera (codigo, nome, historico) para todos os alunos, em uma única
+        consulta; o histórico traz só ano, dia, idioma, acertos e total.
+        """
+        linhas = self._conexao().execute(
+            "SELECT a.codigo, a.nome, h.id, h.ano, h.dia, h.idioma, h.acertos, "
+            "h.total_questoes FROM alunos a "
+            "LEFT JOIN historico h ON h.codigo_aluno = a.codigo "
+            "ORDER BY a.codigo, h.id"
+        )
+        atual = None
+        for linha in linhas:
+            if atual is None or atual[0] != linha["codigo"]:
+                if atual is not None:
+                    yield atual
+                atual = (linha["codigo"], linha["nome"], [])
+            if linha["id"] is not None:
+                atual[2].append(dict(linha))
+        if atual is not None:
+            yield atual
+
+    def percorrer_historico(self, apos=0, limite=None, **filtros):
+        """
+        Gera as linhas do histórico (COLUNAS_HISTORICO) com id > `apos`, em
+        ordem de id, filtradas por turma, ano, dia e/ou codigo_aluno. Usa uma
+        conexão própria, somente leitura, para poder ser consumido aos poucos
+        por uma resposta em streaming (em qualquer thread).
+        """
+        condicoes, parametros = _filtros_historico(**filtros)
+        condicoes.append("h.id > ?")
+        parametros.append(apos)
+        sql = (
+            f"SELECT h.id, h.codigo_aluno, a.nome, a.turma, h.ano, h.dia, h.idioma, "
+            f"h.data_correcao, h.acertos, h.total_questoes FROM historico h "
+            f"JOIN alunos a ON a.codigo = h.codigo_aluno "
+            f"WHERE {' AND '.join(condicoes)} ORDER BY h.id"
+        )
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(limite)
+        for linha in self._consultar_aos_poucos(sql, parametros):
+            yield dict(zip(COLUNAS_HISTORICO, linha))
+
+    def _consultar_aos_poucos(self, sql, parametros):
+        """Linhas de uma consulta numa conexão própria, somente leitura, uma a uma."""
+        if not self._pronto:
+            self.iniciar()
+        conexao = sqlite3.connect(
+            f"file:{self.caminho}?mode=ro", uri=True, check_same_thread=False
+        )
+        try:
+            yield from conexao.execute(sql, parametros)
+        finally:
+            conexao.close()
+
+    def percorrer_correcoes(self, **filtros):
+        """
+        Gera cada correção do histórico (filtros de `_filtros_historico`) com
+        o resultado por área e as questões erradas, em ordem de id.
+        """
+        condicoes, parametros = _filtros_historico(**filtros)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        sql = (
+            "SELECT h.id, h.codigo_aluno, a.nome, a.turma, h.ano, h.dia, h.idioma, "
+            "h.data_correcao, h.acertos, h.total_questoes, "
+            "json_extract(h.entrada, '$.analise.por_area'), "
+            "json_extract(h.entrada, '$.analise.questoes_erradas') "
+            "FROM historico h JOIN alunos a ON a.codigo = h.codigo_aluno "
+            f"{where} ORDER BY h.id"
+        )
+        for *linha, por_area, erradas in self._consultar_aos_poucos(sql, parametros):
+            correcao = dict(zip(COLUNAS_HISTORICO, linha))
+            correcao["por_area"] = json.loads(por_area) if por_area else []
+            correcao["questoes_erradas"] = json.loads(erradas) if erradas else []
+            yield correcao
+
+    def ultima_correcao(self, **filtros):
+        """Id da linha de histórico mais recente que passa nos filtros, ou None."""
+        condicoes, parametros = _filtros_historico(**filtros)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return (
+            self._conexao()
+            .execute(
+                "SELECT MAX(h.id) FROM historico h "
+                f"JOIN alunos a ON a.codigo = h.codigo_aluno {where}",
+                parametros,
+            )
+            .fetchone()[0]
+        )
+
+    def resumo_turmas(self, **filtros):
+        """
+        Gera o resumo de cada (turma, ano, dia): correções, média, mínimo e
+        máximo de acertos, média por área e as questões mais erradas. Tudo é
+        agregado no SQLite; a memória depende do número de turmas, não de alunos.
+        """
+        condicoes, parametros = _filtros_historico(**filtros)
+        condicoes.append("h.total_questoes > 0")
+        where = f"WHERE {' AND '.join(condicoes)}"
+        origem = "FROM historico h JOIN alunos a ON a.codigo = h.codigo_aluno"
+        chave = "COALESCE(a.turma, ''), h.ano, h.dia"
+
+        areas = {}
+        for turma, ano, dia, area, media in self._consultar_aos_poucos(
+            f"SELECT {chave}, json_extract(p.value, '$.area'), "
+            f"AVG(json_extract(p.value, '$.acertos')) {origem}, "
+            f"json_each(h.entrada, '$.analise.por_area') p {where} "
+            f"GROUP BY {chave}, json_extract(p.value, '$.area') ORDER BY MIN(p.key)",
+            parametros,
+        ):
+            areas.setdefault((turma, ano, dia), {})[area] = round(media, 2)
+
+        erradas = {}
+        for turma, ano, dia, questao, vezes in self._consultar_aos_poucos(
+            f"SELECT {chave}, q.value, COUNT(*) {origem}, "
+            f"json_each(h.entrada, '$.analise.questoes_erradas') q {where} "
+            f"GROUP BY {chave}, q.value ORDER BY COUNT(*) DESC, q.value",
+            parametros,
+        ):
+            lista = erradas.setdefault((turma, ano, dia), [])
+            if len(lista) < QUESTOES_MAIS_ERRADAS:
+                lista.append({"questao": questao, "erros": vezes})
+
+        for (
+            turma,
+            ano,
+            dia,
+            correcoes,
+            alunos,
+            media,
+            minimo,
+            maximo,
+        ) in self._consultar_aos_poucos(
+            f"SELECT {chave}, COUNT(*), COUNT(DISTINCT h.codigo_aluno), "
+            f"AVG(h.acertos), MIN(h.acertos), MAX(h.acertos) {origem} {where} "
+            f"GROUP BY {chave} ORDER BY {chave}",
+            parametros,
+        ):
+            yield {
+                "turma": turma or None,
+                "ano": ano,
+                "dia": dia,
+                "correcoes": correcoes,
+                "alunos": alunos,
+                "media_acertos": round(media, 2),
+                "minimo": minimo,
+                "maximo": maximo,
+                "por_area": areas.get((turma, ano, dia), {}),
+                "questoes_mais_erradas": erradas.get((turma, ano, dia), []),
+            }
+
+    def proximo_cursor(self, apos=0, limite=100, **filtros):
+        """Valor de `apos` para a página seguinte, ou None se esta é a última."""
+        condicoes, parametros = _filtros_historico(**filtros)
+        condicoes.append("h.id > ?")
+        parametros.extend([apos, limite - 1])
+        linhas = (
+            self._conexao()
+            .execute(
+                f"SELECT h.id FROM historico h JOIN alunos a ON a.codigo = h.codigo_aluno "
+                f"WHERE {' AND '.join(condicoes)} ORDER BY h.id LIMIT 2 OFFSET ?",
+                parametros,
+            )
+            .fetchall()
+        )
+        return linhas[0]["id"] if len(linhas) == 2 else None
+
+    def agregados(self, ano=None, dia=None):
+        """Média, desvio, extremos e distribuição de acertos por prova (ano, dia)."""
+        condicoes, parametros = [], []
+        for coluna, valor in (("ano", ano), ("dia", dia)):
+            if valor is not None:
+                condicoes.append(f"{coluna} = ?")
+                parametros.append(str(valor))
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        conexao = self._conexao()
+
+        distribuicoes = {}
+        for linha in conexao.execute(
+            f"SELECT ano, dia, faixa, quantidade FROM distribuicao_acertos {where} "
+            "ORDER BY faixa",
+            parametros,
+        ):
+            faixa = f"{linha['faixa']}-{linha['faixa'] + FAIXA_ACERTOS - 1}"
+            distribuicoes.setdefault((linha["ano"], linha["dia"]), {})[faixa] = linha[
+                "quantidade"
+            ]
+
+        provas = []
+        for linha in conexao.execute(
+            f"SELECT * FROM agregados_prova {where} ORDER BY ano, dia", parametros
+        ):
+            quantidade = linha["quantidade"]
+            media = linha["soma_acertos"] / quantidade
+            variancia = max(0.0, linha["soma_quadrados"] / quantidade - media * media)
+            provas.append(
+                {
+                    "ano": linha["ano"],
+                    "dia": linha["dia"],
+                    "quantidade": quantidade,
+                    "media_acertos": round(media, 2),
+                    "desvio_padrao": round(variancia**0.5, 2),
+                    "minimo": linha["minimo"],
+                    "maximo": linha["maximo"],
+                    "distribuicao": distribuicoes.get((linha["ano"], linha["dia"]), {}),
+                }
+            )
+        return provas
+
+
+def _teste_de_carga(threads=8, escritas=250):
+    """Correções simultâneas: nenhuma escrita perdida e latência por escrita estável."""
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        banco = BancoAlunos(os.path.join(diretorio, "carga.db"), json_legado=None)
+        for i in range(threads):
+            banco.cadastrar_aluno(f"{i:02d}", f"Aluno {i}")
+
+        def corrigir(indice):
+            banco._conexao()
+            tempos = []
+            for n in range(escritas):
+                entrada = {
+                    "detalhes_prova": {"ano": "2023", "dia": "1", "idioma": "ingles"},
+                    "analise": {"acertos": n % 90, "total_questoes": 90},
+                }
+                inicio = time.perf_counter()
+                banco.registrar_correcao(f"{indice:02d}", entrada)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            return tempos
+
+        with ThreadPoolExecutor(threads) as executor:
+            tempos = list(executor.map(corrigir, range(threads)))
+
+        total = len(banco.historico())
+        esperado = threads * escritas
+        amostra = escritas // 10
+        inicio = sum(sum(t[:amostra]) for t in tempos) / (threads * amostra)
+        fim = sum(sum(t[-amostra:]) for t in tempos) / (threads * amostra)
+        print(f"Escritas: {total}/{esperado} {'✅' if total == esperado else 'ERRO'}")
+        print(
+            f"Latência média por escrita: {inicio:.2f} ms (início) x {fim:.2f} ms (fim)"
+        )
+
+
+if __name__ == "__main__":
+    _teste_de_carga()
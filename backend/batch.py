@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Correção offline em lote, usando todos os núcleos da máquina.
+
+Percorre uma pasta (imagens e PDFs, recursivamente) ou um único PDF, lê as
+folhas em um pool de processos e corrige cada uma com o gabarito do
+repositório (baixado da API uma vez e guardado em disco). Cada folha lida
+vira uma linha em `<saida>/resultados.ndjson`, gravada na hora: rodar de
+novo com a mesma saída pula as folhas já processadas e continua de onde a
+execução anterior parou. No fim, grava as estatísticas da turma.
+
+Uso (a partir da pasta backend):
+    python -m batch <pasta_ou_pdf> --ano 2023 --dia 1 --idioma ingles
+                    [--saida lote] [--workers N] [--layout nome] [--registrar]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from entrada_pdf import PdfInvalido, paginas_pdf
+from layout import LAYOUT_PADRAO, carregar_layout
+
+EXTENSOES_IMAGEM = ("jpg", "jpeg", "png")
+ARQUIVO_RESULTADOS = "resultados.ndjson"
+ARQUIVO_ESTATISTICAS = "estatisticas.json"
+# Progresso impresso a cada tantas folhas.
+INTERVALO_PROGRESSO = 50
+
+
+def _inicializar_worker():
+    # Os leitores imprimem a depuração de cada folha; no lote isso só atrasa.
+    sys.stdout = open(os.devnull, "w")
+
+
+def _ler(imagem, layout):
+    """Roda no worker: (codigo, respostas, confianca, None) ou (None, None, None, erro)."""
+    from folha import FolhaIlegivel, ler_folha
+
+    try:
+        codigo, respostas, confianca = ler_folha(imagem, layout)
+        return codigo, respostas, confianca, None
+    except FolhaIlegivel as e:
+        return None, None, None, str(e)
+    except Exception as e:
+        return None, None, None, f"Erro ao processar a folha: {e}"
+
+
+def listar_folhas(entrada):
+    """
+    Gera (id, imagem, erro) de cada folha: imagem é o caminho do arquivo ou,
+    para páginas de PDF, os bytes da página; id é o caminho relativo (com
+    #pagina=N). Páginas que não puderam ser extraídas vêm só com o erro.
+    """
+    if os.path.isfile(entrada):
+        base, arquivos = os.path.dirname(entrada), [entrada]
+    else:
+        base = entrada
+        arquivos = sorted(
+            os.path.join(pasta, nome)
+            for pasta, _, nomes in os.walk(entrada)
+            for nome in nomes
+        )
+    for caminho in arquivos:
+        rotulo = os.path.relpath(caminho, base)
+        extensao = caminho.split(".")[-1].lower()
+        if extensao in EXTENSOES_IMAGEM:
+            yield rotulo, caminho, None
+        elif extensao == "pdf":
+            try:
+                paginas = paginas_pdf(caminho)
+            except PdfInvalido as e:
+                yield rotulo, None, str(e)
+                continue
+            for numero, conteudo, extensao_pagina in paginas:
+                pagina = f"{rotulo}#pagina={numero}"
+                if extensao_pagina is None:
+                    yield pagina, None, str(conteudo)
+                else:
+                    yield pagina, conteudo, None
+
+
+def carregar_checkpoint(caminho):
+    """Ids já processados em uma execução anterior (linhas incompletas são descartadas)."""
+    feitos = set()
+    if not os.path.exists(caminho):
+        return feitos
+    validas = 0
+    with open(caminho, "rb") as f:
+        for linha in f:
+            try:
+                feitos.add(json.loads(linha)["folha"])
+            except (ValueError, KeyError):
+                break
+            validas += len(linha)
+    # Uma interrupção no meio da escrita deixa a última linha pela metade.
+    with open(caminho, "r+b") as f:
+        f.truncate(validas)
+    return feitos
+
+
+async def _obter_gabarito(ano, idioma, dia):
+    from enem_question_analyzer import cliente_enem, repositorio_gabaritos
+
+    try:
+        return await repositorio_gabaritos.obter(ano, idioma, dia)
+    finally:
+        await cliente_enem.fechar()
+
+
+class CorrecaoLote:
+    """Uma execução do lote: pool de leitura, correção e checkpoint em NDJSON."""
+
+    def __init__(self, opcoes):
+        from banco_alunos import BancoAlunos
+        from motor_correcao import GabaritoDia
+
+        self.opcoes = opcoes
+        # Os ids das folhas (listar_folhas) são relativos a esta pasta.
+        self.base = (
+            opcoes.entrada
+            if os.path.isdir(opcoes.entrada)
+            else os.path.dirname(opcoes.entrada)
+        )
+        self.layout = carregar_layout(opcoes.layout).nome
+        questoes = asyncio.run(_obter_gabarito(opcoes.ano, opcoes.idioma, opcoes.dia))
+        if not questoes:
+            raise SystemExit("ERRO: Não foi possível obter o gabarito oficial.")
+        self.gabarito = GabaritoDia(questoes, opcoes.dia, opcoes.ano)
+        self.banco = BancoAlunos()
+        os.makedirs(opcoes.saida, exist_ok=True)
+        self.caminho_resultados = os.path.join(opcoes.saida, ARQUIVO_RESULTADOS)
+        self.contagem = {"corrigidas": 0, "falhas": 0}
+
+    def _corrigir(self, folha, codigo, respostas, confianca, erro):
+        from folha import montar_resultado, resumir_leitura
+        from motor_correcao import corrigir_turma
+
+        if erro is not None:
+            self.contagem["falhas"] += 1
+            return {"folha": folha, "error": erro}
+        aluno = self.banco.obter_aluno(codigo)
+        analise = corrigir_turma([respostas], self.gabarito).analise_aluno(0)
+        linha = {
+            "folha": folha,
+            "codigo_aluno": codigo,
+            "nome_aluno": aluno["nome"] if aluno else None,
+            "respostas": respostas,
+            "analise": analise,
+            "leitura": resumir_leitura(confianca, self.opcoes.dia),
+        }
+        if aluno is None:
+            linha["error"] = f"Aluno com código '{codigo}' não encontrado."
+            self.contagem["falhas"] += 1
+            return linha
+
+        self.contagem["corrigidas"] += 1
+        if self.opcoes.registrar:
+            o = self.opcoes
+            entrada = montar_resultado(
+                aluno, codigo, str(o.ano), str(o.dia), o.idioma, analise, confianca
+            )
+            # A origem evita a entrada repetida se a execução cair entre o
+            # registro e a linha do checkpoint e for retomada.
+            origem = f"lote:{os.path.abspath(os.path.join(self.base, folha))}"
+            self.banco.registrar_correcao(codigo, entrada, origem)
+        return linha
+
+    def executar(self):
+        opcoes = self.opcoes
+        feitos = carregar_checkpoint(self.caminho_resultados)
+        if feitos:
+            print(f"🔁 {len(feitos)} folha(s) já processada(s); retomando.")
+
+        janela = opcoes.workers * 4
+        pendentes = {}
+        processadas = 0
+        inicio = time.perf_counter()
+
+        def registrar(saida, futuro):
+            nonlocal processadas
+            folha = pendentes.pop(futuro)
+            saida.write(
+                json.dumps(self._corrigir(folha, *futuro.result()), ensure_ascii=False)
+                + "\n"
+            )
+            saida.flush()
+            processadas += 1
+            if processadas % INTERVALO_PROGRESSO == 0:
+                decorrido = time.perf_counter() - inicio
+                print(
+                    f"   {processadas} folhas em {decorrido:.1f} s "
+                    f"({processadas / decorrido:.1f} folhas/s)"
+                )
+
+        executor = ProcessPoolExecutor(
+            max_workers=opcoes.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_worker,
+        )
+        try:
+            with open(self.caminho_resultados, "a", encoding="utf-8") as saida:
+                for folha, imagem, erro in listar_folhas(opcoes.entrada):
+                    if folha in feitos:
+                        continue
+                    if erro is not None:
+                        self.contagem["falhas"] += 1
+                        saida.write(
+                            json.dumps(
+                                {"folha": folha, "error": erro}, ensure_ascii=False
+                            )
+                            + "\n"
+                        )
+                        continue
+                    futuro = executor.submit(_ler, imagem, self.layout)
+                    pendentes[futuro] = folha
+                    if len(pendentes) >= janela:
+                        prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                        for futuro in prontos:
+                            registrar(saida, futuro)
+                for futuro in list(wait(pendentes).done):
+                    registrar(saida, futuro)
+        except KeyboardInterrupt:
+            print(
+                "\nInterrompido. As folhas já gravadas não serão refeitas: "
+                "rode o mesmo comando para continuar."
+            )
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise SystemExit(130)
+        executor.shutdown()
+
+        decorrido = time.perf_counter() - inicio
+        taxa = processadas / decorrido if decorrido and processadas else 0.0
+        print(
+            f"✅ {processadas} folha(s) processada(s) em {decorrido:.1f} s "
+            f"({taxa:.1f} folhas/s com {opcoes.workers} processos): "
+            f"{self.contagem['corrigidas']} corrigida(s), "
+            f"{self.contagem['falhas']} falha(s)."
+        )
+        self.gravar_estatisticas()
+
+    def gravar_estatisticas(self):
+        """Estatísticas da turma sobre todas as folhas corrigidas, inclusive as retomadas."""
+        from motor_correcao import corrigir_turma
+
+        respostas = []
+        with open(self.caminho_resultados, "r", encoding="utf-8") as f:
+            for linha in f:
+                resultado = json.loads(linha)
+                if "error" not in resultado:
+                    respostas.append(resultado["respostas"])
+        caminho = os.path.join(self.opcoes.saida, ARQUIVO_ESTATISTICAS)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(
+                corrigir_turma(respostas, self.gabarito).estatisticas(),
+                f,
+                ensure_ascii=False,
+                indent=4,
+            )
+        print(
+            f"✅ Resultados em '{self.caminho_resultados}', estatísticas em '{caminho}'."
+        )
+
+
+def _argumentos(argumentos=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m batch", description="Correção offline de folhas em lote."
+    )
+    parser.add_argument("entrada", help="pasta com imagens/PDFs ou um arquivo .pdf")
+    parser.add_argument("--ano", type=int, required=True)
+    parser.add_argument("--dia", type=int, choices=(1, 2), required=True)
+    parser.add_argument("--idioma", required=True, help="ingles ou espanhol")
+    parser.add_argument("--layout", default=LAYOUT_PADRAO)
+    parser.add_argument(
+        "--saida", help="pasta dos resultados (padrão: lote_<ano>_dia<dia>)"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--registrar",
+        action="store_true",
+        help="grava também as correções no histórico dos alunos (banco)",
+    )
+    opcoes = parser.parse_args(argumentos)
+    opcoes.workers = max(1, opcoes.workers)
+    opcoes.saida = opcoes.saida or f"lote_{opcoes.ano}_dia{opcoes.dia}"
+    if not os.path.exists(opcoes.entrada):
+        parser.error(f"'{opcoes.entrada}' não existe.")
+    return opcoes
+
+
+if __name__ == "__main__":
+    CorrecaoLote(_argumentos()).executar()
@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks dos leitores de folha.
+
+Uso (a partir da pasta backend):
+    python benchmark.py [imagem ...]
+    python benchmark.py escalas [imagem ...]
+    python benchmark.py inicializacao
+    python benchmark.py ocr [imagem ...]
+    python benchmark.py sinteticas [--quantidade 40] [--saida resultado.json]
+                                   [--base resultado_anterior.json]
+Sem imagens, usa as de imagens_teste/.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from configuracao import TesseractIndisponivel, estado_motores
+from contexto_folha import FAIXAS_ANCORAS, SheetContext, _ancoras_em_varias_passadas
+from enem_question_analyzer import corrigir_com_gabarito
+from gerador_folhas import gerar_folhas
+from layout import LAYOUT_PADRAO, carregar_layout
+from leitor_gabarito import extrair_respostas_gabarito
+from registro import registrar_por_marcadores
+from roi_code import extrair_codigo_aluno_automatico
+
+DIRETORIO_IMAGENS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "imagens_teste"
+)
+
+
+def _cronometrar(funcao, repeticoes):
+    """Menor tempo (ms) entre as repetições, com os prints dos leitores silenciados."""
+    tempos = []
+    for _ in range(repeticoes):
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos)
+
+
+def _ancoras_em_passada_unica(caminho):
+    contexto = SheetContext.de_arquivo(caminho)
+    contexto.procurar_palavra(
+        "assinatur", conf_minima=40, chave=f"{LAYOUT_PADRAO}:assinatura"
+    )
+    contexto.procurar_palavra(
+        "simulado", conf_minima=50, chave=f"{LAYOUT_PADRAO}:simulado"
+    )
+
+
+def comparar_passada_unica(caminhos, repeticoes=3):
+    """
+    Latência por folha de abrir a imagem e achar as âncoras dos dois
+    leitores: fluxo antigo (contexto_folha._ancoras_em_varias_passadas) x um
+    SheetContext compartilhado. A leitura das bolhas, igual nos dois, fica
+    de fora. Sem motor de OCR não há o que comparar e devolve [].
+    """
+    if not estado_motores()["tesseract"]["disponivel"]:
+        return []
+    resultados = []
+    for caminho in caminhos:
+        antes = _cronometrar(lambda: _ancoras_em_varias_passadas(caminho), repeticoes)
+        depois = _cronometrar(lambda: _ancoras_em_passada_unica(caminho), repeticoes)
+        resultados.append(
+            {
+                "imagem": os.path.basename(caminho),
+                "antes_ms": round(antes, 1),
+                "depois_ms": round(depois, 1),
+                "ganho": round(antes / depois, 2) if depois else None,
+            }
+        )
+    return resultados
+
+
+def _ler_por_layout(imagem, layout, escala_adaptativa):
+    contexto = SheetContext(imagem, escala_adaptativa=escala_adaptativa)
+    codigo = extrair_codigo_aluno_automatico(contexto, layout)
+    respostas = extrair_respostas_gabarito(contexto, layout) or {}
+    return contexto, codigo, "".join(respostas.values())
+
+
+def comparar_escalas(caminhos, larguras=(800, 1600, 3000, 4000), repeticoes=3):
+    """
+    Latência e acerto da leitura por layout com a escala de trabalho
+    adaptativa x tudo na resolução da foto, com cada imagem redimensionada
+    para as `larguras` dadas. A referência de acerto é a leitura da imagem
+    original em resolução cheia.
+    """
+    layout = carregar_layout()
+    resultados = []
+    for caminho in caminhos:
+        original = cv2.imread(caminho)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, codigo_ref, respostas_ref = _ler_por_layout(original, layout, False)
+
+        for largura in larguras:
+            fator = largura / original.shape[1]
+            imagem = cv2.resize(
+                original,
+                (largura, int(round(original.shape[0] * fator))),
+                interpolation=cv2.INTER_CUBIC if fator > 1 else cv2.INTER_AREA,
+            )
+            linha = {"imagem": os.path.basename(caminho), "largura": largura}
+            for rotulo, adaptativa in (("cheia", False), ("adaptativa", True)):
+                linha[f"{rotulo}_ms"] = round(
+                    _cronometrar(
+                        lambda: _ler_por_layout(imagem, layout, adaptativa), repeticoes
+                    ),
+                    1,
+                )
+                with contextlib.redirect_stdout(io.StringIO()):
+                    contexto, codigo, respostas = _ler_por_layout(
+                        imagem, layout, adaptativa
+                    )
+                acertos = sum(a == b for a, b in zip(respostas, respostas_ref))
+                linha[f"{rotulo}_acerto"] = round(acertos / len(respostas_ref), 3) * (
+                    codigo == codigo_ref
+                )
+            linha["escala_bolhas"] = round(contexto.escalas.get("bolhas", 1.0), 3)
+            linha["relidas"] = contexto.relidas
+            resultados.append(linha)
+    return resultados
+
+
+ETAPAS = ("decodificacao", "registro", "codigo", "respostas", "correcao")
+
+
+def _ler_sintetica(jpeg, layout, questoes):
+    """Pipeline de uma folha com o tempo (ms) de cada etapa."""
+    tempos = {}
+
+    def etapa(nome, funcao):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos[nome] = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        imagem = etapa("decodificacao", lambda: cv2.imdecode(jpeg, cv2.IMREAD_COLOR))
+        contexto = SheetContext(imagem)
+        etapa("registro", lambda: contexto.registro(layout))
+        codigo = etapa(
+            "codigo", lambda: extrair_codigo_aluno_automatico(contexto, layout)
+        )
+        respostas = (
+            etapa("respostas", lambda: extrair_respostas_gabarito(contexto, layout))
+            or {}
+        )
+        lista = [respostas.get(questao, "X") for questao in layout.questoes]
+        etapa("correcao", lambda: corrigir_com_gabarito(lista, questoes, 1))
+    return codigo, respostas, tempos, contexto
+
+
+def _acerto(folhas, questoes):
+    """Acerto do código, das respostas e folhas perfeitas sobre `folhas`."""
+    if not folhas:
+        return {"folhas": 0}
+    return {
+        "folhas": len(folhas),
+        "acerto_codigo": round(
+            sum(folha["codigo_ok"] for folha in folhas) / len(folhas), 4
+        ),
+        "acerto_respostas": round(
+            sum(folha["respostas_ok"] for folha in folhas) / (len(folhas) * questoes), 4
+        ),
+        "folhas_perfeitas": round(
+            sum(
+                folha["codigo_ok"] and folha["respostas_ok"] == questoes
+                for folha in folhas
+            )
+            / len(folhas),
+            4,
+        ),
+    }
+
+
+def _percentis(valores):
+    valores = np.asarray(valores, dtype=np.float64)
+    return {
+        "media": round(float(valores.mean()), 2),
+        "p50": round(float(np.percentile(valores, 50)), 2),
+        "p95": round(float(np.percentile(valores, 95)), 2),
+    }
+
+
+def executar_sinteticas(quantidade=40, semente=0, intensidade=1.0):
+    """
+    Gera `quantidade` folhas sintéticas (código e respostas conhecidos),
+    lê cada uma medindo as etapas e devolve o relatório em dict (JSON).
+    """
+    layout = carregar_layout()
+    folhas = []
+    for imagem, codigo, respostas, parametros in gerar_folhas(
+        quantidade, semente, layout, intensidade
+    ):
+        _, jpeg = cv2.imencode(".jpg", imagem, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        # Gabarito oficial sorteado à parte: só o tempo da correção importa aqui.
+        questoes = [{"correct": letra} for letra in respostas.values()]
+        lido, lidas, tempos, contexto = _ler_sintetica(jpeg, layout, questoes)
+        acertos = sum(lidas.get(q) == letra for q, letra in respostas.items())
+        folhas.append(
+            {
+                "largura": imagem.shape[1],
+                "parametros": parametros,
+                "registro": contexto.metodo_registro,
+                "ancoras": contexto.busca_ancoras,
+                "codigo_ok": lido == codigo,
+                "respostas_ok": acertos,
+                "tempos_ms": {k: round(v, 2) for k, v in tempos.items()},
+            }
+        )
+
+    totais = [sum(folha["tempos_ms"].values()) for folha in folhas]
+    buscas = [busca for folha in folhas for busca in folha["ancoras"].values()]
+    registradas = [folha for folha in folhas if folha["registro"] is not None]
+    metodos = {}
+    for folha in registradas:
+        metodos[folha["registro"]] = metodos.get(folha["registro"], 0) + 1
+    return {
+        "data": datetime.now().isoformat(),
+        "configuracao": {
+            "quantidade": quantidade,
+            "semente": semente,
+            "intensidade": intensidade,
+            "layout": f"{layout.nome} v{layout.versao}",
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+        },
+        "resumo": {
+            "latencia_ms": {
+                etapa: _percentis(
+                    [folha["tempos_ms"].get(etapa, 0) for folha in folhas]
+                )
+                for etapa in ETAPAS
+            }
+            | {"total": _percentis(totais)},
+            "folhas_por_segundo": round(1000 * quantidade / sum(totais), 2),
+            # Uma folha não registrada zera o acerto dela sem dizer nada sobre
+            # as bolhas: registro e classificação são medidos separadamente.
+            "registro": {
+                "folhas": quantidade,
+                "falhas": quantidade - len(registradas),
+                "metodos": metodos,
+            },
+            "classificacao": _acerto(registradas, len(layout.questoes)),
+            "ponta_a_ponta": _acerto(folhas, len(layout.questoes)),
+            "registro_fundo_escuro": registro_em_fundo_escuro(),
+            "ancoras": _resumo_ancoras(buscas),
+        },
+        "folhas": folhas,
+    }
+
+
+def registro_em_fundo_escuro(caminhos=None, borda=60, cinza=120):
+    """
+    Registro pelos marcadores das folhas reais como estão e com uma borda
+    de `cinza` em volta (foto sobre uma mesa escura): o contorno da folha
+    não pode esconder os marcadores de dentro dela.
+    """
+    layout = carregar_layout()
+    caminhos = caminhos or sorted(glob.glob(os.path.join(DIRETORIO_IMAGENS, "*.png")))
+    resultado = {"folhas": len(caminhos), "original": 0, "com_fundo": 0}
+    for caminho in caminhos:
+        folha = cv2.cvtColor(cv2.imread(caminho), cv2.COLOR_BGR2GRAY)
+        com_fundo = cv2.copyMakeBorder(
+            folha, borda, borda, borda, borda, cv2.BORDER_CONSTANT, value=cinza
+        )
+        resultado["original"] += registrar_por_marcadores(folha, layout) is not None
+        resultado["com_fundo"] += (
+            registrar_por_marcadores(com_fundo, layout) is not None
+        )
+    return resultado
+
+
+def _resumo_ancoras(buscas):
+    """Tempo de busca das âncoras e fração das buscas que passaram da 1ª faixa."""
+    if not buscas:
+        return {"buscas": 0}
+    primeiras = {"janela_aprendida", FAIXAS_ANCORAS[0][0]}
+    faixas = {}
+    for busca in buscas:
+        faixas[busca["faixa"]] = faixas.get(busca["faixa"], 0) + 1
+    return {
+        "buscas": len(buscas),
+        "ms": _percentis([busca["ms"] for busca in buscas]),
+        "faixas": faixas,
+        "taxa_fallback": round(
+            sum(busca["faixa"] not in primeiras for busca in buscas) / len(buscas), 4
+        ),
+    }
+
+
+def comparar_com_base(atual, base, tolerancia_latencia=0.2, tolerancia_acerto=0.002):
+    """Lista das regressões do relatório `atual` em relação ao `base`."""
+    regressoes = []
+    resumo, anterior = atual["resumo"], base["resumo"]
+    for etapa, valores in resumo["latencia_ms"].items():
+        antes = anterior["latencia_ms"].get(etapa, {}).get("p50")
+        if antes and valores["p50"] > antes * (1 + tolerancia_latencia) + 1:
+            regressoes.append(
+                f"latência p50 de '{etapa}': {antes} -> {valores['p50']} ms"
+            )
+    falhas, falhas_antes = resumo["registro"]["falhas"], anterior.get(
+        "registro", {}
+    ).get("falhas")
+    if falhas_antes is not None and falhas > falhas_antes:
+        regressoes.append(f"falhas de registro: {falhas_antes} -> {falhas}")
+    classificacao = resumo["classificacao"]
+    classificacao_antes = anterior.get("classificacao", {})
+    for chave in ("acerto_codigo", "acerto_respostas", "folhas_perfeitas"):
+        antes = classificacao_antes.get(chave)
+        if (
+            antes is not None
+            and classificacao.get(chave, 0) < antes - tolerancia_acerto
+        ):
+            regressoes.append(
+                f"classificação, {chave}: {antes} -> {classificacao[chave]}"
+            )
+    fundo = resumo["registro_fundo_escuro"]
+    if fundo["com_fundo"] < fundo["original"]:
+        regressoes.append(
+            f"registro com fundo escuro: {fundo['com_fundo']} de "
+            f"{fundo['original']} folhas registradas"
+        )
+    return regressoes
+
+
+def _imprimir_relatorio(relatorio):
+    resumo = relatorio["resumo"]
+    print(f"{'etapa':<15}{'média':>9}{'p50':>9}{'p95':>9}  (ms)")
+    for etapa, valores in resumo["latencia_ms"].items():
+        print(f"{etapa:<15}{valores['media']:>9}{valores['p50']:>9}{valores['p95']:>9}")
+    print(f"Folhas/s (sequencial): {resumo['folhas_por_segundo']}")
+    registro = resumo["registro"]
+    print(
+        f"Registro: {registro['folhas'] - registro['falhas']}/{registro['folhas']} "
+        f"folhas {registro['metodos']}"
+    )
+    for rotulo, chave in (
+        ("Classificação (folhas registradas)", "classificacao"),
+        ("Ponta a ponta", "ponta_a_ponta"),
+    ):
+        acerto = resumo[chave]
+        if not acerto["folhas"]:
+            print(f"{rotulo}: nenhuma folha")
+            continue
+        print(
+            f"{rotulo}: código {acerto['acerto_codigo']:.2%}, respostas "
+            f"{acerto['acerto_respostas']:.2%}, folhas perfeitas "
+            f"{acerto['folhas_perfeitas']:.2%}"
+        )
+    fundo = resumo["registro_fundo_escuro"]
+    print(
+        f"Registro das folhas reais: {fundo['original']}/{fundo['folhas']} como "
+        f"estão, {fundo['com_fundo']}/{fundo['folhas']} com fundo escuro"
+    )
+    ancoras = resumo["ancoras"]
+    if ancoras["buscas"]:
+        print(
+            f"Âncoras: {ancoras['buscas']} buscas, p50 {ancoras['ms']['p50']} ms, "
+            f"fallback {ancoras['taxa_fallback']:.2%} {ancoras['faixas']}"
+        )
+
+
+def _main_sinteticas(argumentos):
+    parser = argparse.ArgumentParser(prog="benchmark.py sinteticas")
+    parser.add_argument("--quantidade", type=int, default=40)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--intensidade", type=float, default=1.0)
+    parser.add_argument("--saida", default="benchmark_sinteticas.json")
+    parser.add_argument("--base", help="relatório anterior para detectar regressões")
+    opcoes = parser.parse_args(argumentos)
+
+    relatorio = executar_sinteticas(
+        opcoes.quantidade, opcoes.semente, opcoes.intensidade
+    )
+    _imprimir_relatorio(relatorio)
+    with open(opcoes.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=4)
+    print(f"✅ Relatório gravado em '{opcoes.saida}'.")
+
+    if opcoes.base:
+        with open(opcoes.base, "r", encoding="utf-8") as f:
+            regressoes = comparar_com_base(relatorio, json.load(f))
+        for regressao in regressoes:
+            print(f"REGRESSÃO: {regressao}")
+        if regressoes:
+            sys.exit(1)
+        print("✅ Sem regressões em relação à base.")
+
+
+def comparar_motores_ocr(caminhos, repeticoes=5):
+    """
+    Latência por chamada de cada motor de OCR disponível, na página inteira
+    (como no SheetContext) e numa região de um quarto da página.
+    """
+    from contexto_folha import LARGURA_OCR
+    from motor_ocr import MOTORES, criar_motor
+
+    linhas = []
+    for nome in MOTORES:
+        try:
+            motor = criar_motor(nome)
+        except TesseractIndisponivel as e:
+            print(f"AVISO: motor '{nome}' indisponível: {e}")
+            continue
+        for caminho in caminhos:
+            contexto = SheetContext.de_arquivo(caminho)
+            if contexto is None:
+                continue
+            imagem, _ = contexto.na_largura(LARGURA_OCR, ampliar=True)
+            altura, largura = imagem.shape
+            regiao = (0, 0, largura, altura // 4)
+            motor.ler_palavras(imagem)  # aquecimento (modelo, cache de disco)
+            linhas.append(
+                {
+                    "motor": nome,
+                    "imagem": os.path.basename(caminho),
+                    "pagina_ms": round(
+                        _cronometrar(lambda: motor.ler_palavras(imagem), repeticoes), 1
+                    ),
+                    "regiao_ms": round(
+                        _cronometrar(
+                            lambda: motor.ler_palavras(imagem, regiao), repeticoes
+                        ),
+                        1,
+                    ),
+                }
+            )
+    return linhas
+
+
+# Sobe a API como o uvicorn faria (lifespan completo) e mede cada fase.
+_SCRIPT_INICIALIZACAO = """
+import time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as cliente:
+    pronto = time.perf_counter()
+    cliente.get("/health")
+    health = time.perf_counter()
+print(importado - inicio, pronto - importado, health - pronto)
+"""
+
+
+def medir_inicializacao(repeticoes=5, workers=2):
+    """
+    Partida a frio da API em processos novos: import do main, startup
+    (lifespan: banco, pool de OCR, fila de jobs) e o primeiro /health.
+    Roda numa pasta temporária para não tocar nos dados da pasta backend.
+    """
+    diretorio_backend = os.path.dirname(os.path.abspath(__file__))
+    ambiente = dict(
+        os.environ,
+        PYTHONPATH=diretorio_backend,
+        OCR_WORKERS=str(workers),
+        PYTHONWARNINGS="ignore",
+    )
+    medidas = []
+    for _ in range(repeticoes):
+        with tempfile.TemporaryDirectory() as pasta:
+            inicio = time.perf_counter()
+            saida = subprocess.run(
+                [sys.executable, "-c", _SCRIPT_INICIALIZACAO],
+                cwd=pasta,
+                env=ambiente,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            total = time.perf_counter() - inicio
+        importacao, startup, health = map(float, saida.stdout.split()[-3:])
+        medidas.append((importacao, startup, health, total))
+
+    medianas = np.median(np.array(medidas) * 1000, axis=0)
+    return dict(
+        zip(
+            ("importacao_ms", "startup_ms", "primeiro_health_ms", "processo_ms"),
+            (round(float(valor), 1) for valor in medianas),
+        )
+    )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["sinteticas"]:
+        _main_sinteticas(sys.argv[2:])
+        sys.exit()
+
+    if sys.argv[1:2] == ["ocr"]:
+        caminhos = sys.argv[2:] or sorted(
+            glob.glob(os.path.join(DIRETORIO_IMAGENS, "*.png"))
+        )
+        print(f"{'motor':<13}{'imagem':<13}{'página (ms)':>13}{'região (ms)':>13}")
+        for linha in comparar_motores_ocr(caminhos):
+            print(
+                f"{linha['motor']:<13}{linha['imagem']:<13}"
+                f"{linha['pagina_ms']:>13}{linha['regiao_ms']:>13}"
+            )
+        sys.exit()
+
+    if sys.argv[1:2] == ["inicializacao"]:
+        for fase, valor in medir_inicializacao().items():
+            print(f"{fase:<22}{valor:>9} (mediana)")
+        sys.exit()
+
+    modo_escalas = sys.argv[1:2] == ["escalas"]
+    argumentos = sys.argv[2:] if modo_escalas else sys.argv[1:]
+    caminhos = argumentos or sorted(glob.glob(os.path.join(DIRETORIO_IMAGENS, "*.png")))
+
+    if modo_escalas:
+        print(
+            f"{'imagem':<13}{'largura':>8}{'cheia (ms)':>12}{'adapt. (ms)':>13}"
+            f"{'acerto':>8}{'escala':>8}{'relidas':>9}"
+        )
+        for linha in comparar_escalas(caminhos):
+            print(
+                f"{linha['imagem']:<13}{linha['largura']:>8}{linha['cheia_ms']:>12}"
+                f"{linha['adaptativa_ms']:>13}{linha['adaptativa_acerto']:>8}"
+                f"{linha['escala_bolhas']:>8}{linha['relidas']:>9}"
+            )
+        sys.exit()
+
+    resultados = comparar_passada_unica(caminhos)
+    if not resultados:
+        print("Sem motor de OCR (Tesseract): comparação da passada única ignorada.")
+        sys.exit()
+    print(f"{'imagem':<15}{'antes (ms)':>12}{'depois (ms)':>13}{'ganho':>8}")
+    for linha in resultados:
+        print(
+            f"{linha['imagem']:<15}{linha['antes_ms']:>12}{linha['depois_ms']:>13}"
+            f"{linha['ganho']:>7}x"
+        )
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import cv2
+import numpy as np
+
+# Estados de uma linha (questão ou coluna do código) além da opção marcada.
+SEM_MARCACAO = -1
+MARCACAO_MULTIPLA = -2
+# Sem contraste entre bolhas vazias e marcadas na folha (toda em branco, por
+# exemplo), os níveis ficam a esta distância do limiar fixo, para os dois lados.
+MEIO_CONTRASTE_PADRAO = 45.0
+
+
+def _imagem_de_rotulos(formato, contornos=None, circulos=None):
+    """
+    Rasteriza todas as bolhas numa única imagem de rótulos (0 = fundo,
+    i + 1 = bolha i), em vez de uma máscara do tamanho da ROI por bolha.
+    """
+    rotulos = np.zeros(formato, dtype=np.int32)
+    if contornos is not None:
+        for i, contorno in enumerate(contornos):
+            cv2.drawContours(rotulos, [contorno], -1, i + 1, -1)
+    if circulos is not None:
+        for i, (centro_x, centro_y, raio) in enumerate(circulos):
+            cv2.circle(rotulos, (int(centro_x), int(centro_y)), int(raio), i + 1, -1)
+    return rotulos
+
+
+def medias_por_bolha(
+    img_cinza_invertida, contornos=None, circulos=None, ignorar_zeros=False
+):
+    """
+    Intensidade média de cada bolha em uma única passada com np.bincount.
+
+    As bolhas são dadas como `contornos` (preenchidos) ou `circulos`
+    (centro_x, centro_y, raio). Com `ignorar_zeros`, pixels de valor 0 não
+    entram na média (mesmo critério de `mask[mask > 0]`).
+    """
+    total = len(contornos) if contornos is not None else len(circulos)
+    if total == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    rotulos = _imagem_de_rotulos(img_cinza_invertida.shape, contornos, circulos)
+    rotulos = rotulos.ravel()
+    intensidades = img_cinza_invertida.ravel()
+    if ignorar_zeros:
+        validos = intensidades > 0
+        rotulos = rotulos[validos]
+        intensidades = intensidades[validos]
+
+    somas = np.bincount(rotulos, weights=intensidades, minlength=total + 1)[1:]
+    contagens = np.bincount(rotulos, minlength=total + 1)[1:]
+    medias = np.zeros(total, dtype=np.float64)
+    np.divide(somas, contagens, out=medias, where=contagens > 0)
+    return medias
+
+
+def medias_em_circulos(img_cinza, centros, raio):
+    """
+    Intensidade média (invertida: 255 = preto) do miolo de cada bolha em
+    posições conhecidas. Só a caixa que contém os centros é recortada e
+    invertida. `centros` tem formato (..., 2); o resultado tem formato (...).
+    """
+    formato = centros.shape[:-1]
+    pontos = centros.reshape(-1, 2)
+    margem = int(np.ceil(raio)) + 1
+    altura, largura = img_cinza.shape[:2]
+    x0 = max(0, int(np.floor(pontos[:, 0].min())) - margem)
+    y0 = max(0, int(np.floor(pontos[:, 1].min())) - margem)
+    x1 = min(largura, int(np.ceil(pontos[:, 0].max())) + margem + 1)
+    y1 = min(altura, int(np.ceil(pontos[:, 1].max())) + margem + 1)
+    if x1 <= x0 or y1 <= y0:
+        return np.zeros(formato, dtype=np.float64)
+
+    recorte = cv2.bitwise_not(img_cinza[y0:y1, x0:x1])
+    circulos = [(round(x - x0), round(y - y0), max(1, round(raio))) for x, y in pontos]
+    return medias_por_bolha(recorte, circulos=circulos).reshape(formato)
+
+
+def matriz_preenchimento(img_cinza_invertida, grupos, ignorar_zeros=False):
+    """
+    Recebe grupos de contornos (um grupo por questão, na ordem A..E) e
+    devolve a matriz (questões x alternativas) de intensidades médias.
+    """
+    if not grupos:
+        return np.zeros((0, 0), dtype=np.float64)
+    largura = len(grupos[0])
+    contornos = [c for grupo in grupos for c in grupo]
+    medias = medias_por_bolha(
+        img_cinza_invertida, contornos=contornos, ignorar_zeros=ignorar_zeros
+    )
+    return medias.reshape(len(grupos), largura)
+
+
+def niveis_folha(preenchimento, limiar):
+    """
+    (vazio, cheio): intensidade típica de uma bolha em branco e de uma
+    marcada nesta folha, separadas por Otsu sobre todas as bolhas lidas.
+    Sem contraste suficiente, ficam simétricos em torno do `limiar` fixo.
+    """
+    valores = np.sort(np.ravel(preenchimento).astype(np.float64))
+    total = valores.size
+    if total >= 2:
+        # Otsu 1D: o corte que maximiza a variância entre as duas classes.
+        acumulado = np.cumsum(valores)
+        n = np.arange(1, total)
+        media_baixa = acumulado[:-1] / n
+        media_alta = (acumulado[-1] - acumulado[:-1]) / (total - n)
+        corte = int(np.argmax(n * (total - n) * (media_alta - media_baixa) ** 2)) + 1
+        vazio = float(np.median(valores[:corte]))
+        cheio = float(np.median(valores[corte:]))
+        if cheio - vazio >= 2 * MEIO_CONTRASTE_PADRAO:
+            return vazio, cheio
+    return limiar - MEIO_CONTRASTE_PADRAO, limiar + MEIO_CONTRASTE_PADRAO
+
+
+def classificar_marcacoes(preenchimento, limiar):
+    """
+    Decide cada linha da matriz de preenchimento (..., opções): o índice da
+    opção marcada, SEM_MARCACAO ou MARCACAO_MULTIPLA, e a confiança (0 a 1).
+
+    As bolhas são normalizadas entre os níveis vazio e cheio da própria
+    folha e contam como marcadas acima da metade. A confiança é a distância
+    (relativa) da bolha da linha que ficou mais perto desse corte: marcação
+    fraca, rasura ou duas bolhas parecidas dão confiança baixa.
+    """
+    preenchimento = np.asarray(preenchimento, dtype=np.float64)
+    vazio, cheio = niveis_folha(preenchimento, limiar)
+    normalizado = (preenchimento - vazio) / (cheio - vazio)
+    marcadas = normalizado > 0.5
+    quantidade = marcadas.sum(axis=-1)
+    escolhas = np.where(
+        quantidade == 0,
+        SEM_MARCACAO,
+        np.where(quantidade > 1, MARCACAO_MULTIPLA, np.argmax(normalizado, axis=-1)),
+    )
+    confianca = np.clip(np.abs(normalizado - 0.5).min(axis=-1) * 2, 0.0, 1.0)
+    return escolhas, confianca
+
+
+def _medias_por_mascara(img_cinza_invertida, contornos):
+    """Implementação antiga (uma máscara cheia por bolha), usada no benchmark."""
+    medias = []
+    for c in contornos:
+        mask = np.zeros(img_cinza_invertida.shape, dtype="uint8")
+        cv2.drawContours(mask, [c], -1, 255, -1)
+        pixels = cv2.bitwise_and(img_cinza_invertida, img_cinza_invertida, mask=mask)
+        medias.append(np.mean(pixels[mask > 0]))
+    return np.array(medias)
+
+
+def _folha_sintetica(questoes=90, alternativas=5, raio=9, passo=30):
+    """ROI sintética com uma grade de bolhas, uma marcada por linha."""
+    altura, largura = questoes * passo + passo, alternativas * passo + passo
+    img = np.full((altura, largura), 255, dtype=np.uint8)
+    contornos = []
+    rng = np.random.default_rng(0)
+    for q in range(questoes):
+        marcada = rng.integers(alternativas)
+        for a in range(alternativas):
+            centro = (passo + a * passo, passo + q * passo)
+            cv2.circle(img, centro, raio, 0, -1 if a == marcada else 1)
+            pontos = cv2.ellipse2Poly(centro, (raio, raio), 0, 0, 360, 10)
+            contornos.append(pontos.reshape(-1, 1, 2))
+    return cv2.bitwise_not(img), contornos
+
+
+if __name__ == "__main__":
+    import time
+
+    img_invertida, contornos = _folha_sintetica()
+    repeticoes = 20
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        antigo = _medias_por_mascara(img_invertida, contornos)
+    tempo_antigo = (time.perf_counter() - inicio) * 1000 / repeticoes
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        novo = medias_por_bolha(img_invertida, contornos=contornos)
+    tempo_novo = (time.perf_counter() - inicio) * 1000 / repeticoes
+
+    assert np.allclose(antigo, novo)
+    print(f"Bolhas por folha: {len(contornos)}")
+    print(f"Máscara por bolha: {tempo_antigo:.2f} ms/folha")
+    print(f"Imagem de rótulos: {tempo_novo:.2f} ms/folha")
+    print(f"Ganho: {tempo_antigo / tempo_novo:.1f}x")
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de resultados por conteúdo da imagem.
+
+A chave é o SHA-256 dos bytes enviados mais (ano, dia, idioma, layout e
+versão do layout); o valor é a leitura da folha e, depois de registrada, a
+correção. Reenviar a mesma foto não roda o OCR de novo nem duplica o
+histórico. O backend padrão fica no próprio processo; com
+CACHE_RESULTADOS=redis usa o Redis de REDIS_URL.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_RESULTADOS = os.environ.get("CACHE_RESULTADOS", "memoria")
+CACHE_CAPACIDADE = int(os.environ.get("CACHE_CAPACIDADE", "1024"))
+CACHE_TTL = int(os.environ.get("CACHE_TTL", str(24 * 60 * 60)))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+class CacheMemoria:
+    """LRU em memória com expiração (TTL), limitado a `capacidade` entradas."""
+
+    def __init__(self, capacidade=CACHE_CAPACIDADE, ttl=CACHE_TTL):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            expira_em, valor = entrada
+            if expira_em < time.monotonic():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._entradas[chave] = (time.monotonic() + self.ttl, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class CacheRedis:
+    """
+    Mesmo contrato do CacheMemoria, guardando JSON no Redis com expiração.
+    O limite de tamanho fica a cargo do Redis (maxmemory + allkeys-lru).
+    """
+
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL, prefixo="ocr_enem:resultado:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "CACHE_RESULTADOS=redis exige o pacote 'redis' (pip install redis)."
+            ) from e
+        self.ttl = ttl
+        self.prefixo = prefixo
+        self._cliente = redis.Redis.from_url(url)
+
+    def obter(self, chave):
+        valor = self._cliente.get(self.prefixo + chave)
+        return json.loads(valor) if valor is not None else None
+
+    def guardar(self, chave, valor):
+        self._cliente.set(
+            self.prefixo + chave, json.dumps(valor, ensure_ascii=False), ex=self.ttl
+        )
+
+    def __len__(self):
+        return sum(1 for _ in self._cliente.scan_iter(match=self.prefixo + "*"))
+
+
+class CacheResultados:
+    """Calcula as chaves e conta acertos/faltas sobre um dos backends acima."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.acertos = 0
+        self.faltas = 0
+
+    @staticmethod
+    def chave(conteudo, ano, dia, idioma, layout):
+        resumo = hashlib.sha256(conteudo).hexdigest()
+        return (
+            f"{resumo}:{ano}:{dia}:{str(idioma).lower()}:{layout.nome}:v{layout.versao}"
+        )
+
+    def obter(self, chave):
+        valor = self.backend.obter(chave)
+        if valor is None:
+            self.faltas += 1
+        else:
+            self.acertos += 1
+        return valor
+
+    def guardar_leitura(self, chave, codigo_aluno, respostas, confianca=None):
+        self.backend.guardar(
+            chave,
+            {
+                "codigo_aluno": codigo_aluno,
+                "respostas": list(respostas),
+                "confianca": confianca,
+            },
+        )
+
+    def guardar_resultado(
+        self, chave, codigo_aluno, respostas, resultado, confianca=None
+    ):
+        self.backend.guardar(
+            chave,
+            {
+                "codigo_aluno": codigo_aluno,
+                "respostas": list(respostas),
+                "confianca": confianca,
+                "resultado": resultado,
+            },
+        )
+
+    def estatisticas(self):
+        consultas = self.acertos + self.faltas
+        return {
+            "backend": type(self.backend).__name__,
+            "entradas": len(self.backend),
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "taxa_acerto": round(self.acertos / consultas, 3) if consultas else None,
+        }
+
+
+def criar_cache_resultados():
+    """Escolhe o backend pela variável CACHE_RESULTADOS (memoria ou redis)."""
+    if CACHE_RESULTADOS == "redis":
+        return CacheResultados(CacheRedis())
+    return CacheResultados(CacheMemoria())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente da api.enem.dev para montar o gabarito de um dia da prova.
+
+Uma sessão aiohttp compartilhada (conexões reaproveitadas), no máximo
+`concorrencia` requisições ao mesmo tempo, timeout por requisição e novas
+tentativas com espera exponencial em falhas transitórias. O resultado é
+indexado pelo número da questão, então uma questão faltando nunca desloca
+as outras. A URL base é configurável para testes com um servidor local.
+"""
+
+import asyncio
+import json
+import os
+import random
+
+ENEM_API_URL = os.environ.get("ENEM_API_URL", "https://api.enem.dev/v1")
+ENEM_API_CONCORRENCIA = int(os.environ.get("ENEM_API_CONCORRENCIA", "10"))
+ENEM_API_TIMEOUT = float(os.environ.get("ENEM_API_TIMEOUT", "10"))
+ENEM_API_TENTATIVAS = int(os.environ.get("ENEM_API_TENTATIVAS", "4"))
+
+QUESTOES_POR_DIA = 90
+# Respostas que valem uma nova tentativa; os demais erros são definitivos.
+STATUS_TRANSITORIOS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ApiEnemIndisponivel(RuntimeError):
+    """A API não respondeu mesmo depois de todas as tentativas."""
+
+
+class _ErroTransitorio(Exception):
+    pass
+
+
+def indices_do_dia(dia):
+    """Números das questões do dia (1: 1-90, 2: 91-180)."""
+    dia = int(dia)
+    if dia not in (1, 2):
+        raise ValueError("O dia da prova deve ser 1 ou 2.")
+    inicio = (dia - 1) * QUESTOES_POR_DIA + 1
+    return range(inicio, inicio + QUESTOES_POR_DIA)
+
+
+class ClienteEnem:
+    def __init__(
+        self,
+        url_base=ENEM_API_URL,
+        concorrencia=ENEM_API_CONCORRENCIA,
+        timeout=ENEM_API_TIMEOUT,
+        tentativas=ENEM_API_TENTATIVAS,
+        espera_inicial=0.5,
+    ):
+        self.url_base = url_base.rstrip("/")
+        self.concorrencia = max(1, concorrencia)
+        self.timeout = timeout
+        self.tentativas = max(1, tentativas)
+        self.espera_inicial = espera_inicial
+        self._sessao = None
+        self._loop = None
+        self._vagas = None
+
+    def _sessao_atual(self):
+        # aiohttp só é importado na primeira busca, fora do startup da API.
+        import aiohttp
+
+        # A sessão pertence ao event loop em que foi criada.
+        loop = asyncio.get_running_loop()
+        if self._sessao is None or self._sessao.closed or self._loop is not loop:
+            self._sessao = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concorrencia),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._loop = loop
+            self._vagas = asyncio.Semaphore(self.concorrencia)
+        return self._sessao
+
+    async def fechar(self):
+        if self._sessao is not None and not self._sessao.closed:
+            await self._sessao.close()
+        self._sessao = None
+
+    async def _obter_json(self, caminho, params=None):
+        """
+        JSON de `caminho`, ou None se a API responder 404. Qualquer outra
+        falha (mesmo definitiva, como um 4xx ou uma resposta que não é JSON)
+        vira ApiEnemIndisponivel.
+        """
+        import aiohttp
+
+        sessao = self._sessao_atual()
+        url = f"{self.url_base}{caminho}"
+        for tentativa in range(self.tentativas):
+            try:
+                async with self._vagas:
+                    async with sessao.get(url, params=params) as resposta:
+                        if resposta.status == 404:
+                            return None
+                        if resposta.status in STATUS_TRANSITORIOS:
+                            raise _ErroTransitorio(f"HTTP {resposta.status}")
+                        resposta.raise_for_status()
+                        return await resposta.json()
+            except (aiohttp.ClientResponseError, json.JSONDecodeError) as e:
+                # Erro definitivo (4xx) ou corpo que não é JSON: não adianta repetir.
+                raise ApiEnemIndisponivel(f"{url}: resposta inválida ({e}).") from e
+            except (
+                _ErroTransitorio,
+                aiohttp.ClientConnectionError,
+                aiohttp.ClientPayloadError,
+                asyncio.TimeoutError,
+            ) as e:
+                erro = e
+            if tentativa + 1 < self.tentativas:
+                espera = self.espera_inicial * 2**tentativa
+                await asyncio.sleep(espera * random.uniform(0.5, 1.5))
+        raise ApiEnemIndisponivel(
+            f"{url}: sem resposta após {self.tentativas} tentativas ({erro})."
+        )
+
+    async def buscar_questao(self, ano, indice, idioma):
+        """
+        Gabarito da questão `indice`. Questão inexistente ou do outro idioma
+        fica com "correct" None (não conta acerto) em vez de sumir da lista.
+        A inexistente (404) vem marcada como "provisoria": pode ser uma falha
+        passageira da API, então o gabarito não deve ser guardado para sempre.
+        """
+        dados = await self._obter_json(
+            f"/exams/{ano}/questions/{indice}", params={"language": idioma}
+        )
+        if dados is None:
+            print(f"AVISO: questão {indice} de {ano} não encontrada na API.")
+            return {
+                "index": indice,
+                "title": f"Questão {indice}",
+                "correct": None,
+                "provisoria": True,
+            }
+
+        idioma_questao = dados.get("language")
+        if idioma_questao is not None and idioma_questao.lower() != idioma.lower():
+            print(f"AVISO: questão {indice} de {ano} veio em '{idioma_questao}'.")
+            return {"index": indice, "title": dados.get("title"), "correct": None}
+        return {
+            "index": indice,
+            "title": dados.get("title"),
+            "correct": dados.get("correctAlternative"),
+            "language": idioma_questao or "portugues",
+        }
+
+    async def buscar_gabarito(self, ano, idioma, dia):
+        """Questões do dia, em ordem de número. Levanta ApiEnemIndisponivel."""
+        if await self._obter_json(f"/exams/{ano}") is None:
+            print(f"Erro ao buscar a prova: {ano} não encontrada.")
+            return []
+        tarefas = [
+            asyncio.ensure_future(self.buscar_questao(ano, indice, idioma))
+            for indice in indices_do_dia(dia)
+        ]
+        try:
+            return list(await asyncio.gather(*tarefas))
+        finally:
+            # Uma falha definitiva cancela as buscas que ainda não terminaram.
+            for tarefa in tarefas:
+                tarefa.cancel()
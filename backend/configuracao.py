@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração e inicialização do processo, sem efeitos colaterais no import.
+
+Caminhos vêm de variáveis de ambiente; o Tesseract é localizado e testado
+na primeira vez em que for necessário (uma vez por processo, sucesso ou
+falha) e os módulos pesados só são importados por quem os usa.
+"""
+
+import importlib.util
+import os
+import platform
+
+TESSERACT_CMD_WINDOWS = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD")
+
+UPLOADS_DIR = os.environ.get("UPLOADS_DIR", "uploads")
+RESULTADOS_DIR = os.environ.get("RESULTADOS_DIR", "resultados")
+# Uploads são lidos da memória; com MANTER_UPLOADS=1 cada imagem também é
+# gravada em UPLOADS_DIR (e mantida) para depuração.
+MANTER_UPLOADS = os.environ.get("MANTER_UPLOADS", "0").lower() in ("1", "true", "sim")
+TAMANHO_MAXIMO_UPLOAD = int(
+    float(os.environ.get("TAMANHO_MAXIMO_UPLOAD_MB", "20")) * 2**20
+)
+# Limites de um envio em lote (/corrigir/lote/ e /jobs/), contando o
+# conteúdo dos .zip.
+LOTE_MAXIMO_FOLHAS = int(os.environ.get("LOTE_MAXIMO_FOLHAS", "500"))
+LOTE_MAXIMO_DESCOMPACTADO = int(
+    float(os.environ.get("LOTE_MAXIMO_DESCOMPACTADO_MB", "1024")) * 2**20
+)
+
+_tesseract_versao = None
+_tesseract_erro = None
+
+
+class TesseractIndisponivel(RuntimeError):
+    """O executável do Tesseract não foi encontrado ou não respondeu."""
+
+
+class LoteGrandeDemais(ValueError):
+    """O lote passa de LOTE_MAXIMO_FOLHAS arquivos ou LOTE_MAXIMO_DESCOMPACTADO bytes."""
+
+
+def mensagem_upload_grande():
+    return f"Arquivo maior que o limite de {TAMANHO_MAXIMO_UPLOAD / 2**20:g} MB."
+
+
+class ContagemLote:
+    """
+    Soma os arquivos de um lote pelos tamanhos declarados, antes de lê-los;
+    `contar` levanta LoteGrandeDemais quando o lote passa dos limites. Os
+    arquivos maiores que TAMANHO_MAXIMO_UPLOAD não são lidos e não somam.
+    """
+
+    def __init__(self):
+        self.arquivos = 0
+        self.total = 0
+
+    def contar(self, tamanho):
+        self.arquivos += 1
+        self.total += tamanho if tamanho <= TAMANHO_MAXIMO_UPLOAD else 0
+        if self.arquivos > LOTE_MAXIMO_FOLHAS:
+            raise LoteGrandeDemais(
+                f"O lote passa do limite de {LOTE_MAXIMO_FOLHAS} arquivos."
+            )
+        if self.total > LOTE_MAXIMO_DESCOMPACTADO:
+            raise LoteGrandeDemais(
+                f"O lote passa do limite de {LOTE_MAXIMO_DESCOMPACTADO / 2**20:g} MB "
+                "descompactados."
+            )
+
+
+def preparar_diretorios():
+    """Cria as pastas de trabalho; chamado no startup da API."""
+    for diretorio in (UPLOADS_DIR, RESULTADOS_DIR):
+        os.makedirs(diretorio, exist_ok=True)
+
+
+def inicializar_tesseract():
+    """
+    Configura e verifica o Tesseract uma única vez por processo.
+    O caminho vem de TESSERACT_CMD; sem ela, usa o padrão do Windows se existir
+    ou o `tesseract` do PATH. Uma falha também é lembrada, para não chamar o
+    executável de novo a cada folha.
+    """
+    global _tesseract_versao, _tesseract_erro
+    if _tesseract_versao is not None:
+        return _tesseract_versao
+    if _tesseract_erro is not None:
+        raise TesseractIndisponivel(_tesseract_erro)
+
+    import pytesseract
+
+    if TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    elif platform.system() == "Windows" and os.path.exists(TESSERACT_CMD_WINDOWS):
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_WINDOWS
+
+    try:
+        _tesseract_versao = str(pytesseract.get_tesseract_version())
+    except Exception as e:
+        _tesseract_erro = (
+            "Tesseract não encontrado. Defina a variável de ambiente TESSERACT_CMD "
+            f"com o caminho do executável. ({e})"
+        )
+        raise TesseractIndisponivel(_tesseract_erro) from e
+    return _tesseract_versao
+
+
+def tesseract_disponivel():
+    """Há algum motor de OCR (tesserocr ou pytesseract) para as âncoras?"""
+    from motor_ocr import obter_motor
+
+    try:
+        obter_motor()
+        return True
+    except TesseractIndisponivel:
+        return False
+
+
+def estado_motores():
+    """Disponibilidade dos motores de leitura (para o /health)."""
+    import cv2
+
+    from motor_ocr import obter_motor
+
+    try:
+        motor = obter_motor()
+        tesseract = {"disponivel": True, "motor": motor.nome, "versao": motor.versao}
+    except TesseractIndisponivel as e:
+        tesseract = {"disponivel": False, "erro": str(e)}
+    return {
+        "opencv": cv2.__version__,
+        "tesseract": tesseract,
+        "rasterizacao_pdf": importlib.util.find_spec("fitz") is not None,
+    }
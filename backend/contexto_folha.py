@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+import os
+import string
+import threading
+import time
+import unicodedata
+from collections import deque
+
+import cv2
+import numpy as np
+
+import metricas
+from bolhas import classificar_marcacoes, medias_em_circulos
+from layout import escala_media, projetar, registrar_por_ancoras
+from motor_ocr import obter_motor
+from registro import LARGURA_REGISTRO, registrar_por_marcadores
+
+# Largura em que a página é passada ao Tesseract (mesma normalização do roi_code).
+LARGURA_OCR = 1285
+# Fotos grandes são decodificadas já reduzidas (IMREAD_REDUCED_*, 1/2, 1/4 ou
+# 1/8) desde que o menor lado continue com ao menos isso; 0 desliga.
+LARGURA_DECODIFICACAO = int(os.environ.get("LARGURA_DECODIFICACAO", "2000"))
+LEITURAS_REDUZIDAS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Raio (px) do miolo amostrado de cada bolha na escala de trabalho: a leitura
+# das bolhas roda na menor imagem em que a bolha ainda tem esse raio.
+RAIO_TRABALHO = 5.0
+# Linhas (questões/colunas do código) com confiança abaixo disso (ver
+# bolhas.classificar_marcacoes) são relidas em resolução cheia.
+CONFIANCA_RELEITURA = 0.3
+
+# Busca das âncoras de texto ("Simulado", "Assinatura"): primeiro só a faixa
+# em que elas costumam aparecer, em resolução reduzida e só com letras; a
+# faixa é alargada a cada falha até a página inteira em LARGURA_OCR.
+# (nome, fração da altura lida a partir do topo, largura do OCR)
+FAIXAS_ANCORAS = (
+    ("faixa_superior", 0.35, 1000),
+    ("metade_superior", 0.6, LARGURA_OCR),
+)
+CARACTERES_ANCORAS = string.ascii_letters + "ÁÂÃÀÉÊÍÓÔÕÚÇáâãàéêíóôõúç"
+# Folga (fração da altura) em volta das posições já vistas de uma âncora.
+MARGEM_JANELA = 0.04
+
+
+def dimensoes_imagem(conteudo):
+    """(largura, altura) do cabeçalho PNG ou JPEG, sem decodificar; None se não souber."""
+    if conteudo[:8] == b"\x89PNG\r\n\x1a\n":
+        return (
+            int.from_bytes(conteudo[16:20], "big"),
+            int.from_bytes(conteudo[20:24], "big"),
+        )
+    if conteudo[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(conteudo):
+        if conteudo[i] != 0xFF:
+            return None
+        marcador = conteudo[i + 1]
+        if marcador == 0xFF:
+            i += 1
+            continue
+        if marcador == 0x01 or 0xD0 <= marcador <= 0xD8:
+            i += 2
+            continue
+        # SOF0..SOF15 (exceto DHT, JPG e DAC) trazem altura e largura.
+        if 0xC0 <= marcador <= 0xCF and marcador not in (0xC4, 0xC8, 0xCC):
+            return (
+                int.from_bytes(conteudo[i + 7 : i + 9], "big"),
+                int.from_bytes(conteudo[i + 5 : i + 7], "big"),
+            )
+        i += 2 + int.from_bytes(conteudo[i + 2 : i + 4], "big")
+    return None
+
+
+def modo_leitura(conteudo, largura_minima=LARGURA_DECODIFICACAO):
+    """Flag do cv2.imdecode: a maior redução que mantém o menor lado >= largura_minima."""
+    dimensoes = dimensoes_imagem(conteudo) if largura_minima else None
+    if dimensoes:
+        menor_lado = min(dimensoes)
+        for fator, modo in LEITURAS_REDUZIDAS:
+            if menor_lado // fator >= largura_minima:
+                return modo
+    return cv2.IMREAD_COLOR
+
+
+def normalizar_texto(texto):
+    if not texto:
+        return ""
+    texto = texto.lower()
+    texto = "".join(
+        c
+        for c in unicodedata.normalize("NFD", texto)
+        if unicodedata.category(c) != "Mn"
+    )
+    return texto
+
+
+class JanelasAncoras:
+    """
+    Onde cada âncora foi encontrada nas últimas folhas (topo e base como
+    fração da altura da página), por layout. A janela aprendida cobre essas
+    posições com uma folga e é a primeira região lida na próxima folha.
+    """
+
+    def __init__(self, historico=50):
+        self._posicoes = {}
+        self._historico = historico
+        self._lock = threading.Lock()
+
+    def janela(self, chave):
+        """(início, fim) em fração da altura, ou None se a âncora nunca foi vista."""
+        with self._lock:
+            posicoes = list(self._posicoes.get(chave, ()))
+        if not posicoes:
+            return None
+        inicio = min(topo for topo, _ in posicoes) - MARGEM_JANELA
+        fim = max(base for _, base in posicoes) + MARGEM_JANELA
+        return max(0.0, inicio), min(1.0, fim)
+
+    def registrar(self, chave, topo, base):
+        with self._lock:
+            if chave not in self._posicoes:
+                self._posicoes[chave] = deque(maxlen=self._historico)
+            self._posicoes[chave].append((topo, base))
+
+
+janelas_ancoras = JanelasAncoras()
+
+
+class SheetContext:
+    """
+    Uma folha decodificada uma única vez.
+
+    Guarda a imagem BGR original, a versão em cinza e o resultado de uma única
+    passada de OCR sobre a página; o leitor do código do aluno e o leitor de
+    respostas consomem o mesmo contexto em vez de reabrir o arquivo.
+
+    Cada etapa trabalha na escala que lhe basta (registro e bolhas em
+    resolução reduzida, OCR em LARGURA_OCR); `escalas` guarda o fator usado
+    em cada uma. Homografias e centros devolvidos estão sempre em
+    coordenadas da imagem original.
+    """
+
+    def __init__(self, imagem, origem=None, escala_adaptativa=True):
+        self.imagem = imagem
+        self.origem = origem
+        self.escala_adaptativa = escala_adaptativa
+        self.escalas = {}
+        self.relidas = 0
+        # Confiança de cada linha lida, por leitor ("codigo", "respostas").
+        self.confianca = {}
+        # O que os leitores encontraram, para o overlay de depuração (ver
+        # overlay.py): "ancoras" (palavra por chave), "bolhas" (centros, raio,
+        # preenchimento e limiar por leitor), "regioes" e "marcadas" (x, y, raio)
+        # dos leitores por blocos. Só referências ao que já foi calculado.
+        self.deteccoes = {}
+        self._cinza = None
+        self._reduzidas = {}
+        self._palavras = None
+        self._palavras_faixa = {}
+        self._registros = {}
+        self.metodo_registro = None
+        # Tempo (ms) e faixa em que cada âncora foi achada, para o benchmark.
+        self.busca_ancoras = {}
+
+    @classmethod
+    def de_arquivo(cls, caminho_imagem):
+        imagem = cv2.imread(caminho_imagem)
+        if imagem is None:
+            print(f"ERRO: Não foi possível carregar a imagem: '{caminho_imagem}'")
+            return None
+        return cls(imagem, origem=caminho_imagem)
+
+    @classmethod
+    def de_bytes(cls, conteudo, origem=None):
+        """Decodifica o arquivo (PNG/JPEG) direto da memória, sem passar pelo disco."""
+        buffer = np.frombuffer(conteudo, dtype=np.uint8)
+        imagem = cv2.imdecode(buffer, modo_leitura(conteudo)) if buffer.size else None
+        if imagem is None:
+            print("ERRO: Não foi possível decodificar a imagem enviada.")
+            return None
+        return cls(imagem, origem=origem)
+
+    @classmethod
+    def obter(cls, origem):
+        """Aceita um SheetContext já montado, o conteúdo do arquivo ou o caminho."""
+        if isinstance(origem, cls):
+            return origem
+        if isinstance(origem, (bytes, bytearray, memoryview)):
+            return cls.de_bytes(origem)
+        return cls.de_arquivo(origem)
+
+    @property
+    def formato(self):
+        return self.imagem.shape[:2]
+
+    @property
+    def cinza(self):
+        if self._cinza is None:
+            self._cinza = cv2.cvtColor(self.imagem, cv2.COLOR_BGR2GRAY)
+        return self._cinza
+
+    def na_largura(self, largura, ampliar=False):
+        """
+        (imagem em cinza com `largura` px, fator em relação à original),
+        calculada uma vez por largura. Sem `ampliar`, nunca aumenta a imagem.
+        """
+        altura_original, largura_original = self.formato
+        largura = int(largura)
+        if (
+            largura == largura_original
+            or not ampliar
+            and (largura > largura_original or not self.escala_adaptativa)
+        ):
+            return self.cinza, 1.0
+        if largura not in self._reduzidas:
+            fator = largura / largura_original
+            self._reduzidas[largura] = cv2.resize(
+                self.cinza,
+                (largura, int(round(altura_original * fator))),
+                interpolation=cv2.INTER_AREA if fator < 1 else cv2.INTER_LINEAR,
+            )
+        return self._reduzidas[largura], largura / largura_original
+
+    @property
+    def palavras(self):
+        """
+        Palavras encontradas pelo OCR da página, em coordenadas da imagem
+        original: dicts com texto, texto_normalizado, conf, left, top, width, height.
+        """
+        if self._palavras is None:
+            self._palavras = self._ler_palavras()
+        return self._palavras
+
+    def _ler_palavras(self, inicio=0.0, fim=1.0, largura=LARGURA_OCR, caracteres=None):
+        imagem_ocr, fator = self.na_largura(largura, ampliar=True)
+        self.escalas["ocr"] = fator
+        regiao = None
+        if (inicio, fim) != (0.0, 1.0):
+            altura = imagem_ocr.shape[0]
+            topo = int(altura * inicio)
+            regiao = (0, topo, imagem_ocr.shape[1], int(altura * fim) - topo)
+        with metricas.medir("ocr_ancoras"):
+            encontradas = obter_motor().ler_palavras(imagem_ocr, regiao, caracteres)
+
+        return [
+            {
+                "texto": palavra["texto"],
+                "texto_normalizado": normalizar_texto(palavra["texto"]),
+                "conf": palavra["conf"],
+                "left": int(round(palavra["left"] / fator)),
+                "top": int(round(palavra["top"] / fator)),
+                "width": int(round(palavra["width"] / fator)),
+                "height": int(round(palavra["height"] / fator)),
+            }
+            for palavra in encontradas
+        ]
+
+    def registro(self, layout):
+        """
+        Homografia do referencial do `layout` para esta imagem, calculada uma
+        vez por folha e compartilhada pelos leitores. Usa os marcadores
+        impressos; o OCR das âncoras de texto só entra se eles falharem.
+        None se não registrar.
+        """
+        if layout.nome not in self._registros:
+            with metricas.medir("registro"):
+                reduzida, fator = self.na_largura(LARGURA_REGISTRO)
+                self.escalas["registro"] = fator
+                homografia = registrar_por_marcadores(reduzida, layout)
+                if homografia is not None:
+                    # Da escala de trabalho de volta para a imagem original.
+                    homografia = np.diag([1 / fator, 1 / fator, 1.0]) @ homografia
+                self.metodo_registro = "marcadores"
+                if homografia is None:
+                    homografia = registrar_por_ancoras(self, layout)
+                    self.metodo_registro = "ancoras" if homografia is not None else None
+            metricas.REGISTRO.incrementar(metodo=self.metodo_registro or "falhou")
+            self._registros[layout.nome] = homografia
+        return self._registros[layout.nome]
+
+    def preenchimento(self, homografia, centros_ref, raio_ref, limiar, nome=None):
+        """
+        Intensidade média das bolhas `centros_ref` (..., opções, 2) do layout.
+        A leitura é feita numa escala reduzida; só as linhas de baixa
+        confiança (marcação fraca, rasura, duas bolhas parecidas, com os
+        níveis da própria folha e `limiar` como referência sem contraste)
+        são relidas na resolução original. Com `nome`, as bolhas lidas ficam
+        em `deteccoes["bolhas"][nome]`.
+        """
+        centros = projetar(homografia, centros_ref)
+        raio = raio_ref * escala_media(homografia)
+
+        largura_original = self.formato[1]
+        largura = largura_original * min(1.0, RAIO_TRABALHO / raio)
+        # Arredonda para reaproveitar a mesma redução entre os leitores.
+        reduzida, fator = self.na_largura(int(np.ceil(largura / 100) * 100))
+        self.escalas["bolhas"] = fator
+        medias = medias_em_circulos(reduzida, centros * fator, raio * fator)
+        if fator != 1.0:
+            _, confianca = classificar_marcacoes(medias, limiar)
+            linhas = np.argwhere(confianca < CONFIANCA_RELEITURA)
+            for linha in map(tuple, linhas):
+                medias[linha] = medias_em_circulos(self.cinza, centros[linha], raio)
+            self.relidas += len(linhas)
+
+        if nome is not None:
+            self.deteccoes.setdefault("bolhas", {})[nome] = {
+                "centros": centros,
+                "raio": raio,
+                "preenchimento": medias,
+                "limiar": limiar,
+            }
+        return medias
+
+    def _palavras_na_faixa(self, inicio, fim, largura):
+        """OCR (só letras) da faixa horizontal [inicio, fim) da altura, uma vez por folha."""
+        chave = (round(inicio, 3), round(fim, 3), largura)
+        if chave not in self._palavras_faixa:
+            self._palavras_faixa[chave] = self._ler_palavras(
+                inicio, fim, largura, CARACTERES_ANCORAS
+            )
+        return self._palavras_faixa[chave]
+
+    @staticmethod
+    def _primeira(palavras, trecho, conf_minima):
+        for palavra in palavras:
+            if trecho in palavra["texto_normalizado"] and palavra["conf"] > conf_minima:
+                return palavra
+        return None
+
+    def procurar_palavra(self, trecho, conf_minima=-1, *, chave):
+        """
+        Primeira palavra cujo texto normalizado contém `trecho`. Lê primeiro
+        a janela em que a âncora `chave` ("layout:âncora", para que layouts
+        diferentes não dividam a mesma janela) foi vista nas folhas
+        anteriores, depois as FAIXAS_ANCORAS e só então a página inteira; a
+        posição encontrada alimenta a janela das próximas folhas.
+        """
+        inicio_busca = time.perf_counter()
+        tentativas = []
+        aprendida = janelas_ancoras.janela(chave)
+        if aprendida is not None:
+            tentativas.append(("janela_aprendida", *aprendida, FAIXAS_ANCORAS[0][2]))
+        tentativas.extend(
+            (nome, 0.0, fim, largura) for nome, fim, largura in FAIXAS_ANCORAS
+        )
+
+        palavra, faixa = None, "nao_encontrada"
+        with metricas.medir("busca_ancoras"):
+            for nome, inicio, fim, largura in tentativas:
+                palavra = self._primeira(
+                    self._palavras_na_faixa(inicio, fim, largura), trecho, conf_minima
+                )
+                if palavra is not None:
+                    faixa = nome
+                    break
+            else:
+                palavra = self._primeira(self.palavras, trecho, conf_minima)
+                if palavra is not None:
+                    faixa = "pagina_inteira"
+
+        metricas.ANCORAS.incrementar(faixa=faixa)
+        self.busca_ancoras[chave] = {
+            "faixa": faixa,
+            "ms": round((time.perf_counter() - inicio_busca) * 1000, 2),
+        }
+        if palavra is not None:
+            self.deteccoes.setdefault("ancoras", {})[chave] = palavra
+            altura = self.formato[0]
+            janelas_ancoras.registrar(
+                chave,
+                palavra["top"] / altura,
+                (palavra["top"] + palavra["height"]) / altura,
+            )
+        return palavra
+
+
+def _ancoras_em_varias_passadas(caminho_imagem):
+    """
+    Implementação antiga (cada leitor abre a imagem, pré-processa e passa o
+    OCR na página inteira por conta própria), usada no benchmark. Devolve as
+    âncoras 'assinatur' (leitor do código) e 'simulado' (leitor do gabarito).
+    """
+    motor = obter_motor()
+
+    def primeira(palavras, trecho, conf_minima):
+        for palavra in palavras:
+            if (
+                trecho in normalizar_texto(palavra["texto"])
+                and palavra["conf"] > conf_minima
+            ):
+                return palavra
+        return None
+
+    # roi_code: redimensiona para LARGURA_OCR e binariza antes do OCR.
+    imagem = cv2.imread(caminho_imagem)
+    altura, largura = imagem.shape[:2]
+    imagem = cv2.resize(
+        imagem,
+        (LARGURA_OCR, int(altura * LARGURA_OCR / largura)),
+        interpolation=cv2.INTER_AREA,
+    )
+    cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
+    _, binaria = cv2.threshold(cinza, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    assinatura = primeira(motor.ler_palavras(binaria), "assinatur", 40)
+
+    # leitor_gabarito: lê a imagem de novo e passa o OCR na resolução original.
+    imagem = cv2.imread(caminho_imagem)
+    cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
+    simulado = primeira(motor.ler_palavras(cinza), "simulado", 50)
+    return assinatura, simulado
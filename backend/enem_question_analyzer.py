@@ -1,74 +1,70 @@
 import asyncio
-import aiohttp
+import time
+
+import metricas
+from cliente_enem import ApiEnemIndisponivel, ClienteEnem
+from motor_correcao import GabaritoDia, corrigir_turma
+from repositorio_gabaritos import RepositorioGabaritos
 
 list_answers = []
 
+cliente_enem = ClienteEnem()
 
-async def fetch_questao(session, ano, index, language) -> dict:
-    url = f"https://api.enem.dev/v1/exams/{ano}/questions/{index}"
-    async with session.get(url) as response:
-        if response.status == 200:
-            data = await response.json()
-            questao_language = data.get("language")
 
-            if questao_language is None or questao_language.lower() == language.lower():
-                return {
-                    "index": data["index"],
-                    "title": data["title"],
-                    "correct": data.get("correctAlternative"),
-                    "language": questao_language or "portugues",
-                }
-        else:
-            return {"index": index, "title": f"Questão {index}", "correct": "Anulado"}
+async def fetch_todas_questoes(ano, language, dia) -> list:
+    """Gabarito do dia na API; [] se ela não responder (não vai para o cache)."""
+    with metricas.medir("api_enem"):
+        try:
+            return await cliente_enem.buscar_gabarito(ano, language, dia)
+        except ApiEnemIndisponivel as e:
+            print(f"ERRO: gabarito de {ano} (dia {dia}) indisponível: {e}")
+            return []
 
 
-async def fetch_todas_questoes(ano, language) -> list:
-    prova_url = f"https://api.enem.dev/v1/exams/{ano}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(prova_url) as r:
-            if r.status != 200:
-                print("Erro ao buscar a prova:", r.status)
-                return []
-            prova = await r.json()
+repositorio_gabaritos = RepositorioGabaritos(fetcher=fetch_todas_questoes)
 
-        tasks = [fetch_questao(session, ano, idx, language) for idx in range(1, 181)]
-        questoes = await asyncio.gather(*tasks)
 
-        return [q for q in questoes if q is not None]
+def corrigir_com_gabarito(
+    list_answers: list, questoes: list, test_day: int, ano: int = None
+):
+    """
+    Compara as respostas de um aluno com um gabarito já carregado: acertos,
+    acertos por área (no formato da prova de `ano`), questões erradas e em
+    branco (ver motor_correcao).
+    """
+    correcao = corrigir_turma([list_answers], GabaritoDia(questoes, test_day, ano))
+    return correcao.analise_aluno(0)
 
 
 async def compare_answers(list_answers: list, year: int, test_day: int, language: str):
-    questoes = await fetch_todas_questoes(year, language)
+    questoes = await repositorio_gabaritos.obter(year, language, test_day)
     print(f"\n✅ Total de questões encontradas na API: {len(questoes)}\n")
     print(f"✅ Total de respostas do usuário: {len(list_answers)}\n")
 
-    if test_day == 1:
-        start, end = 0, 90
-    elif test_day == 2:
-        start, end = 90, 180
-
-    questoes_dia = questoes[start:end]
-    num_questoes_comparar = min(len(questoes_dia), len(list_answers))
+    return corrigir_com_gabarito(list_answers, questoes, test_day, year)
 
-    acertos = 0
 
-    for i in range(num_questoes_comparar):
-        resposta_usuario = list_answers[i]
-        resposta_correta = questoes_dia[i]["correct"]
+async def medir_latencia(ano, language, dia=1):
+    """Mede a primeira consulta (fria) e as seguintes (quentes) do repositório."""
+    repositorio_gabaritos.invalidar(ano, language, dia)
 
-        acertou = (resposta_usuario == resposta_correta) or (
-            resposta_correta == "Anulado"
-        )
+    inicio = time.perf_counter()
+    await repositorio_gabaritos.obter(ano, language, dia)
+    frio_ms = (time.perf_counter() - inicio) * 1000
 
-        if acertou:
-            acertos += 1
+    inicio = time.perf_counter()
+    for _ in range(100):
+        await repositorio_gabaritos.obter(ano, language, dia)
+    quente_ms = (time.perf_counter() - inicio) * 1000 / 100
 
-    return {
-        "acertos": acertos,
-        "total_questoes": num_questoes_comparar
-    }
+    print(f"Latência fria (API):     {frio_ms:.1f} ms")
+    print(f"Latência quente (cache): {quente_ms:.4f} ms")
+    print(repositorio_gabaritos.estatisticas())
+    await cliente_enem.fechar()
 
 
 if __name__ == "__main__":
-    year: int = input("Digite o ano da prova do ENEM (ex: 2009): ")
-    asyncio.run(compare_answers(list_answers, year))
+    year = int(input("Digite o ano da prova do ENEM (ex: 2009): "))
+    language = input("Digite o idioma (ingles/espanhol): ")
+    dia = int(input("Digite o dia da prova (1 ou 2): "))
+    asyncio.run(medir_latencia(year, language, dia))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Entrada de PDFs (um PDF por turma, uma folha por página).
+
+As páginas são lidas uma de cada vez: se a página traz a foto escaneada
+embutida, os bytes dela são usados como estão (sem reprocessar o JPEG);
+senão a página é rasterizada com o PyMuPDF, se estiver instalado.
+"""
+
+import os
+
+# Resolução da rasterização de páginas sem imagem embutida.
+DPI_RASTERIZACAO = int(os.environ.get("DPI_RASTERIZACAO", "200"))
+
+# Imagens menores que isso numa página são logotipos, não a folha escaneada.
+BYTES_MINIMOS_IMAGEM = 10 * 1024
+
+
+class PdfInvalido(ValueError):
+    """O arquivo não abre como PDF (corrompido, truncado ou de outro formato)."""
+
+
+class PaginaSemImagem(ValueError):
+    """A página não tem imagem embutida e não há como rasterizá-la."""
+
+
+def _maior_imagem(pagina):
+    try:
+        imagens = pagina.images
+    except Exception as e:
+        print(f"AVISO: não foi possível extrair as imagens da página: {e}")
+        return None
+    imagens = [imagem for imagem in imagens if len(imagem.data) >= BYTES_MINIMOS_IMAGEM]
+    if not imagens:
+        return None
+    return max(imagens, key=lambda imagem: len(imagem.data))
+
+
+class _Rasterizador:
+    """Abre o documento no PyMuPDF só se alguma página precisar ser rasterizada."""
+
+    def __init__(self, caminho_pdf, dpi):
+        self.caminho_pdf = caminho_pdf
+        self.dpi = dpi
+        self._documento = None
+
+    def __call__(self, indice):
+        if self._documento is None:
+            try:
+                import fitz
+            except ImportError as e:
+                raise PaginaSemImagem(
+                    "Página sem imagem embutida; instale o PyMuPDF para rasterizá-la."
+                ) from e
+            self._documento = fitz.open(self.caminho_pdf)
+        pixmap = self._documento[indice].get_pixmap(dpi=self.dpi)
+        return pixmap.tobytes("png")
+
+    def fechar(self):
+        if self._documento is not None:
+            self._documento.close()
+
+
+def paginas_pdf(caminho_pdf, dpi=DPI_RASTERIZACAO):
+    """
+    Abre o PDF e devolve um gerador de (numero_pagina, bytes_da_imagem,
+    extensao), página a página; numa página que não pôde ser convertida, gera
+    (numero_pagina, erro, None). Só uma página fica em memória por vez,
+    qualquer que seja o tamanho do PDF. PdfInvalido se o arquivo não abrir.
+    """
+    from PyPDF2 import PdfReader
+
+    # Com um caminho o PyPDF2 carregaria o arquivo inteiro; com o arquivo
+    # aberto, os objetos de cada página são lidos sob demanda.
+    arquivo = open(caminho_pdf, "rb")
+    try:
+        leitor = PdfReader(arquivo)
+        total = len(leitor.pages)
+    except Exception as e:
+        arquivo.close()
+        raise PdfInvalido(f"Não foi possível abrir o PDF: {e}") from e
+    return _paginas(arquivo, leitor, total, _Rasterizador(caminho_pdf, dpi))
+
+
+def _paginas(arquivo, leitor, total, rasterizar):
+    try:
+        for indice in range(total):
+            try:
+                pagina = leitor.pages[indice]
+                imagem = _maior_imagem(pagina)
+                if imagem is not None:
+                    extensao = os.path.splitext(imagem.name)[1].lstrip(".").lower()
+                    conteudo, extensao = imagem.data, extensao or "png"
+                else:
+                    conteudo, extensao = rasterizar(indice), "png"
+            except Exception as e:
+                # Página corrompida (ou sem imagem e sem PyMuPDF): só ela falha.
+                yield indice + 1, e, None
+                continue
+            yield indice + 1, conteudo, extensao
+    finally:
+        rasterizar.fechar()
+        arquivo.close()
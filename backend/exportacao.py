@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação dos resultados em CSV, JSON, NDJSON e PDF, em streaming.
+
+Os relatórios são geradores sobre as consultas do banco (uma linha por vez):
+o consumo de memória não cresce com o tamanho da turma. O PDF é escrito à
+mão, sem dependências, página a página; só os offsets dos objetos ficam
+guardados até o fim, para a tabela xref.
+"""
+
+import csv
+import io
+import json
+import unicodedata
+
+from motor_correcao import AREAS
+
+SIGLAS_AREAS = {
+    "Linguagens": "LC",
+    "Ciências Humanas": "CH",
+    "Ciências da Natureza": "CN",
+    "Matemática": "MT",
+}
+
+
+def _coluna_area(prefixo, area):
+    sem_acento = "".join(
+        c
+        for c in unicodedata.normalize("NFD", area.lower())
+        if unicodedata.category(c) != "Mn"
+    )
+    return f"{prefixo}_{sem_acento.replace(' ', '_')}"
+
+
+COLUNAS_ALUNOS = (
+    [
+        "codigo_aluno",
+        "nome",
+        "turma",
+        "ano",
+        "dia",
+        "idioma",
+        "data_correcao",
+        "acertos",
+        "total_questoes",
+    ]
+    + [_coluna_area("acertos", area) for area in AREAS]
+    + ["questoes_erradas"]
+)
+
+COLUNAS_TURMAS = (
+    [
+        "turma",
+        "ano",
+        "dia",
+        "correcoes",
+        "alunos",
+        "media_acertos",
+        "minimo",
+        "maximo",
+    ]
+    + [_coluna_area("media", area) for area in AREAS]
+    + ["questoes_mais_erradas"]
+)
+
+# (título, chave da linha achatada, peso da largura) das tabelas em PDF.
+COLUNAS_PDF_ALUNOS = (
+    [
+        ("Código", "codigo_aluno", 1.2),
+        ("Nome", "nome", 4),
+        ("Turma", "turma", 1.5),
+        ("Ano", "ano", 1),
+        ("Dia", "dia", 0.6),
+        ("Acertos", "acertos", 1.2),
+    ]
+    + [(SIGLAS_AREAS[area], _coluna_area("acertos", area), 0.7) for area in AREAS]
+    + [("Questões erradas", "questoes_erradas", 9)]
+)
+
+COLUNAS_PDF_TURMAS = (
+    [
+        ("Turma", "turma", 2),
+        ("Ano", "ano", 1),
+        ("Dia", "dia", 0.6),
+        ("Alunos", "alunos", 1),
+        ("Média", "media_acertos", 1),
+        ("Mín.", "minimo", 0.8),
+        ("Máx.", "maximo", 0.8),
+    ]
+    + [(SIGLAS_AREAS[area], _coluna_area("media", area), 0.8) for area in AREAS]
+    + [("Questões mais erradas (erros)", "questoes_mais_erradas", 7)]
+)
+
+
+def achatar_correcao(correcao):
+    """Correção de `BancoAlunos.percorrer_correcoes` -> linha de COLUNAS_ALUNOS."""
+    linha = {coluna: correcao.get(coluna) for coluna in COLUNAS_ALUNOS}
+    for area in correcao["por_area"]:
+        linha[_coluna_area("acertos", area["area"])] = area["acertos"]
+    linha["questoes_erradas"] = " ".join(map(str, correcao["questoes_erradas"]))
+    return linha
+
+
+def achatar_turma(resumo):
+    """Resumo de `BancoAlunos.resumo_turmas` -> linha de COLUNAS_TURMAS."""
+    linha = {coluna: resumo.get(coluna) for coluna in COLUNAS_TURMAS}
+    for area, media in resumo["por_area"].items():
+        linha[_coluna_area("media", area)] = media
+    linha["questoes_mais_erradas"] = ", ".join(
+        f"{q['questao']} ({q['erros']})" for q in resumo["questoes_mais_erradas"]
+    )
+    return linha
+
+
+def gerar_ndjson(linhas):
+    for linha in linhas:
+        yield json.dumps(linha, ensure_ascii=False) + "\n"
+
+
+def gerar_json(linhas):
+    """Um array JSON, escrito elemento a elemento."""
+    separador = "[\n"
+    for linha in linhas:
+        yield separador + json.dumps(linha, ensure_ascii=False)
+        separador = ",\n"
+    yield "[]\n" if separador == "[\n" else "\n]\n"
+
+
+def gerar_csv(linhas, colunas, tamanho_bloco=200):
+    """Gera o CSV em blocos de linhas, com cabeçalho."""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=colunas)
+    escritor.writeheader()
+    for i, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if i % tamanho_bloco == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _texto_pdf(texto):
+    """String literal do PDF (WinAnsi), com os caracteres especiais escapados."""
+    dados = str(texto).encode("cp1252", "replace")
+    dados = dados.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + dados + b")"
+
+
+class _EscritorPdf:
+    """Serializa objetos PDF numerados guardando o offset de cada um."""
+
+    def __init__(self):
+        self.posicao = 0
+        self.offsets = {}
+
+    def bruto(self, dados):
+        self.posicao += len(dados)
+        return dados
+
+    def objeto(self, numero, corpo):
+        self.offsets[numero] = self.posicao
+        return self.bruto(b"%d 0 obj\n%s\nendobj\n" % (numero, corpo))
+
+    def fluxo(self, numero, conteudo):
+        return self.objeto(
+            numero,
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(conteudo), conteudo),
+        )
+
+    def final(self, raiz):
+        """Tabela xref e trailer; os objetos devem ir de 1 a len(offsets)."""
+        inicio_xref = self.posicao
+        total = len(self.offsets) + 1
+        entradas = [b"0000000000 65535 f \n"] + [
+            b"%010d 00000 n \n" % self.offsets[numero] for numero in range(1, total)
+        ]
+        return (
+            b"xref\n0 %d\n" % total
+            + b"".join(entradas)
+            + b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (total, raiz, inicio_xref)
+        )
+
+
+def gerar_pdf(titulo, colunas, linhas, linhas_por_pagina=38):
+    """
+    Tabela em PDF (A4 paisagem, Helvetica), página a página. `colunas` são
+    (título, chave, peso da largura); textos que não cabem são cortados.
+    """
+    largura_pagina, altura_pagina, margem = 842, 595, 36
+    tamanho, entrelinha = 8, 13
+    total_pesos = sum(peso for _, _, peso in colunas)
+    larguras = [
+        (largura_pagina - 2 * margem) * peso / total_pesos for _, _, peso in colunas
+    ]
+    # Largura média de um caractere da Helvetica: ~0,5 do corpo.
+    maximos = [max(1, int(largura / (tamanho * 0.5))) for largura in larguras]
+
+    pdf = _EscritorPdf()
+    yield pdf.bruto(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    # 1: catálogo, 2: árvore de páginas (escrita no fim), 3 e 4: fontes.
+    for numero, fonte in ((3, b"Helvetica"), (4, b"Helvetica-Bold")):
+        yield pdf.objeto(
+            numero,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+            b"/Encoding /WinAnsiEncoding >>" % fonte,
+        )
+
+    paginas = []
+
+    def pagina(bloco):
+        numero = 5 + 2 * len(paginas)
+        comandos = []
+
+        def escrever(fonte, corpo, x, y, texto):
+            comandos.append(
+                b"BT /%s %d Tf %.1f %.1f Td %s Tj ET"
+                % (fonte, corpo, x, y, _texto_pdf(texto))
+            )
+
+        y = altura_pagina - margem - 14
+        escrever(b"F2", 14, margem, y, titulo)
+        escrever(
+            b"F1",
+            tamanho,
+            largura_pagina - margem - 60,
+            margem - 14,
+            f"Página {len(paginas) + 1}",
+        )
+        y -= 2 * entrelinha
+        for linha, fonte in [(None, b"F2")] + [(linha, b"F1") for linha in bloco]:
+            x = margem
+            for (rotulo, chave, _), largura, maximo in zip(colunas, larguras, maximos):
+                valor = rotulo if linha is None else linha.get(chave)
+                texto = "" if valor is None else str(valor)
+                if len(texto) > maximo:
+                    texto = texto[: maximo - 1] + "…"
+                escrever(fonte, tamanho, x, y, texto)
+                x += largura
+            if linha is None:
+                comandos.append(
+                    b"%.1f %.1f m %.1f %.1f l S"
+                    % (margem, y - 4, largura_pagina - margem, y - 4)
+                )
+            y -= entrelinha
+        if not bloco:
+            escrever(b"F1", tamanho, margem, y, "Nenhum resultado.")
+
+        paginas.append(numero + 1)
+        return pdf.fluxo(numero, b"\n".join(comandos)) + pdf.objeto(
+            numero + 1,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (largura_pagina, altura_pagina, numero),
+        )
+
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) == linhas_por_pagina:
+            yield pagina(bloco)
+            bloco = []
+    if bloco or not paginas:
+        yield pagina(bloco)
+
+    kids = b" ".join(b"%d 0 R" % numero for numero in paginas)
+    yield pdf.objeto(
+        2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(paginas))
+    )
+    yield pdf.objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield pdf.final(raiz=1)
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Fila local de jobs de correção, sem broker externo.
+
+O envio só grava os arquivos em disco e devolve o id do job; um worker
+assíncrono no próprio processo do uvicorn separa as folhas (imagens, .zip
+ou .pdf) e corrige uma a uma pelo pool de OCR. O estado de cada job e de
+cada folha fica em SQLite, então um restart retoma o que faltava.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import traceback
+import uuid
+import zipfile
+from datetime import datetime
+
+from configuracao import (
+    LOTE_MAXIMO_DESCOMPACTADO,
+    TAMANHO_MAXIMO_UPLOAD,
+    ContagemLote,
+    LoteGrandeDemais,
+    mensagem_upload_grande,
+)
+from entrada_pdf import PdfInvalido, paginas_pdf
+
+JOBS_DIR = os.environ.get("JOBS_DIR", "jobs")
+EXTENSOES_FOLHA = ("jpg", "jpeg", "png")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    parametros TEXT NOT NULL,
+    expandido INTEGER NOT NULL DEFAULT 0,
+    criado_em TEXT NOT NULL,
+    atualizado_em TEXT NOT NULL,
+    erro TEXT
+);
+CREATE TABLE IF NOT EXISTS folhas_job (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    indice INTEGER NOT NULL,
+    arquivo TEXT NOT NULL,
+    caminho TEXT,
+    estado TEXT NOT NULL,
+    resultado TEXT,
+    PRIMARY KEY (job_id, indice)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_estado ON jobs (estado);
+"""
+
+
+def _agora():
+    return datetime.now().isoformat()
+
+
+def _separar_folhas(pasta_entrada, pasta_folhas):
+    """
+    Transforma os arquivos enviados em uma folha por arquivo de imagem.
+    Retorna [(arquivo, caminho_ou_None, erro_ou_None)] na ordem de envio.
+    As folhas são contadas como em main.expandir_uploads (ContagemLote): o
+    job todo passando dos limites levanta LoteGrandeDemais.
+    """
+    os.makedirs(pasta_folhas, exist_ok=True)
+    folhas = []
+    contar = ContagemLote().contar
+
+    def gravar(nome, conteudo, extensao):
+        caminho = os.path.join(pasta_folhas, f"{len(folhas):05d}.{extensao}")
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+        folhas.append((nome, caminho, None))
+
+    for nome_entrada in sorted(os.listdir(pasta_entrada)):
+        caminho_entrada = os.path.join(pasta_entrada, nome_entrada)
+        nome = nome_entrada.split("_", 1)[1]
+        extensao = nome.split(".")[-1].lower()
+        try:
+            if extensao == "zip":
+                with zipfile.ZipFile(caminho_entrada) as pacote:
+                    entradas = [info for info in pacote.infolist() if not info.is_dir()]
+                    for info in entradas:
+                        contar(info.file_size)
+                    for info in entradas:
+                        extensao_item = info.filename.split(".")[-1].lower()
+                        if extensao_item not in EXTENSOES_FOLHA:
+                            erro = "Formato de arquivo não suportado."
+                        elif info.file_size > TAMANHO_MAXIMO_UPLOAD:
+                            erro = mensagem_upload_grande()
+                        else:
+                            gravar(info.filename, pacote.read(info), extensao_item)
+                            continue
+                        folhas.append((info.filename, None, erro))
+            elif extensao == "pdf":
+                for numero, conteudo, extensao_pagina in paginas_pdf(caminho_entrada):
+                    rotulo = f"{nome}#pagina={numero}"
+                    if extensao_pagina is None:
+                        folhas.append((rotulo, None, str(conteudo)))
+                    else:
+                        contar(len(conteudo))
+                        gravar(rotulo, conteudo, extensao_pagina)
+            elif extensao in EXTENSOES_FOLHA:
+                contar(os.path.getsize(caminho_entrada))
+                caminho = os.path.join(pasta_folhas, f"{len(folhas):05d}.{extensao}")
+                shutil.copyfile(caminho_entrada, caminho)
+                folhas.append((nome, caminho, None))
+            else:
+                folhas.append((nome, None, "Formato de arquivo não suportado."))
+        except zipfile.BadZipFile:
+            folhas.append((nome, None, "Arquivo .zip inválido."))
+        except PdfInvalido:
+            folhas.append((nome, None, "Arquivo .pdf inválido."))
+    return folhas
+
+
+def _gravar_entrada(pasta_entrada, arquivos):
+    """
+    Grava os uploads em blocos, com cada imagem até TAMANHO_MAXIMO_UPLOAD e
+    o envio todo até LOTE_MAXIMO_DESCOMPACTADO; as imagens e as entradas dos
+    .zip (pelos tamanhos declarados) também passam pela ContagemLote. Um
+    envio fora dos limites levanta LoteGrandeDemais antes de entrar na fila.
+    """
+    os.makedirs(pasta_entrada, exist_ok=True)
+    contar = ContagemLote().contar
+    gravados = 0
+    for i, (nome, arquivo) in enumerate(arquivos):
+        nome_seguro = os.path.basename(nome) or "arquivo"
+        extensao = nome_seguro.split(".")[-1].lower()
+        caminho = os.path.join(pasta_entrada, f"{i:05d}_{nome_seguro}")
+        tamanho = 0
+        with open(caminho, "wb") as f:
+            while bloco := arquivo.read(2**20):
+                tamanho += len(bloco)
+                gravados += len(bloco)
+                if extensao in EXTENSOES_FOLHA and tamanho > TAMANHO_MAXIMO_UPLOAD:
+                    raise LoteGrandeDemais(
+                        f"'{nome_seguro}': {mensagem_upload_grande()}"
+                    )
+                if gravados > LOTE_MAXIMO_DESCOMPACTADO:
+                    raise LoteGrandeDemais(
+                        "O envio passa do limite de "
+                        f"{LOTE_MAXIMO_DESCOMPACTADO / 2**20:g} MB."
+                    )
+                f.write(bloco)
+        if extensao in EXTENSOES_FOLHA:
+            contar(tamanho)
+        elif extensao == "zip" and zipfile.is_zipfile(caminho):
+            with zipfile.ZipFile(caminho) as pacote:
+                for info in pacote.infolist():
+                    if not info.is_dir():
+                        contar(info.file_size)
+
+
+class FilaJobs:
+    """
+    `processar_folha(caminho, parametros, origem)` é a corrotina que corrige
+    uma folha e devolve a entrada do histórico (ou um dict com "error").
+    `origem` ("job_id:indice") identifica a folha no histórico, para que a
+    folha refeita depois de um restart não seja registrada duas vezes.
+    """
+
+    def __init__(self, processar_folha, diretorio=JOBS_DIR, folhas_simultaneas=4):
+        self.processar_folha = processar_folha
+        self.diretorio = diretorio
+        self.folhas_simultaneas = folhas_simultaneas
+        self._conexao = None
+        self._fila = None
+        self._worker = None
+
+    def _conectar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        conexao = sqlite3.connect(
+            os.path.join(self.diretorio, "jobs.db"), isolation_level=None
+        )
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        for comando in ESQUEMA.split(";"):
+            conexao.execute(comando)
+        return conexao
+
+    def _pasta(self, job_id, *partes):
+        return os.path.join(self.diretorio, job_id, *partes)
+
+    async def iniciar(self):
+        """Abre o banco, recoloca na fila os jobs não terminados e sobe o worker."""
+        self._conexao = self._conectar()
+        self._fila = asyncio.Queue()
+        pendentes = self._conexao.execute(
+            "SELECT id FROM jobs WHERE estado IN ('na_fila', 'processando') "
+            "ORDER BY criado_em"
+        ).fetchall()
+        for linha in pendentes:
+            self._fila.put_nowait(linha["id"])
+        if pendentes:
+            print(f"🔁 {len(pendentes)} job(s) retomado(s) da fila.")
+        self._worker = asyncio.create_task(self._executar_fila())
+
+    async def encerrar(self):
+        # Jobs interrompidos continuam "processando" no banco e são retomados.
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._conexao is not None:
+            self._conexao.close()
+
+    async def criar(self, arquivos, parametros):
+        """
+        Grava os uploads [(nome, arquivo)] e enfileira o job; devolve o id.
+        LoteGrandeDemais (e nada fica em disco) se o envio passar dos limites.
+        """
+        job_id = uuid.uuid4().hex
+        try:
+            await asyncio.to_thread(
+                _gravar_entrada, self._pasta(job_id, "entrada"), arquivos
+            )
+        except LoteGrandeDemais:
+            shutil.rmtree(self._pasta(job_id), ignore_errors=True)
+            raise
+
+        agora = _agora()
+        self._conexao.execute(
+            "INSERT INTO jobs (id, estado, parametros, criado_em, atualizado_em) "
+            "VALUES (?, 'na_fila', ?, ?, ?)",
+            (job_id, json.dumps(parametros), agora, agora),
+        )
+        self._fila.put_nowait(job_id)
+        return job_id
+
+    def status(self, job_id):
+        job = self._conexao.execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if job is None:
+            return None
+        folhas = self._conexao.execute(
+            "SELECT indice, arquivo, estado, resultado FROM folhas_job "
+            "WHERE job_id = ? ORDER BY indice",
+            (job_id,),
+        ).fetchall()
+
+        total = len(folhas)
+        concluidas = sum(folha["estado"] == "concluida" for folha in folhas)
+        falhas = sum(folha["estado"] == "falhou" for folha in folhas)
+        processadas = concluidas + falhas
+        return {
+            "job_id": job_id,
+            "estado": job["estado"],
+            "parametros": json.loads(job["parametros"]),
+            "criado_em": job["criado_em"],
+            "atualizado_em": job["atualizado_em"],
+            "erro": job["erro"],
+            "total": total if job["expandido"] else None,
+            "processadas": processadas,
+            "corrigidas": concluidas,
+            "falhas": falhas,
+            "progresso": round(processadas / total, 3) if total else 0.0,
+            "folhas": [
+                {
+                    "indice": folha["indice"],
+                    "arquivo": folha["arquivo"],
+                    "estado": folha["estado"],
+                    **(json.loads(folha["resultado"]) if folha["resultado"] else {}),
+                }
+                for folha in folhas
+                if folha["estado"] != "pendente"
+            ],
+        }
+
+    def _atualizar_job(self, job_id, estado, erro=None):
+        self._conexao.execute(
+            "UPDATE jobs SET estado = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+            (estado, erro, _agora(), job_id),
+        )
+
+    async def _executar_fila(self):
+        while True:
+            job_id = await self._fila.get()
+            try:
+                await self._processar(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(traceback.format_exc())
+                self._atualizar_job(job_id, "falhou", str(e))
+
+    async def _expandir(self, job_id):
+        folhas = await asyncio.to_thread(
+            _separar_folhas,
+            self._pasta(job_id, "entrada"),
+            self._pasta(job_id, "folhas"),
+        )
+        self._conexao.execute("BEGIN")
+        self._conexao.execute("DELETE FROM folhas_job WHERE job_id = ?", (job_id,))
+        self._conexao.executemany(
+            "INSERT INTO folhas_job (job_id, indice, arquivo, caminho, estado, resultado) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    job_id,
+                    indice,
+                    arquivo,
+                    caminho,
+                    "falhou" if erro else "pendente",
+                    json.dumps({"error": erro}, ensure_ascii=False) if erro else None,
+                )
+                for indice, (arquivo, caminho, erro) in enumerate(folhas)
+            ],
+        )
+        self._conexao.execute(
+            "UPDATE jobs SET expandido = 1, atualizado_em = ? WHERE id = ?",
+            (_agora(), job_id),
+        )
+        self._conexao.execute("COMMIT")
+        shutil.rmtree(self._pasta(job_id, "entrada"), ignore_errors=True)
+
+    async def _processar(self, job_id):
+        job = self._conexao.execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if job is None or job["estado"] not in ("na_fila", "processando"):
+            return
+        self._atualizar_job(job_id, "processando")
+        parametros = json.loads(job["parametros"])
+        if not job["expandido"]:
+            await self._expandir(job_id)
+
+        pendentes = self._conexao.execute(
+            "SELECT indice, caminho FROM folhas_job "
+            "WHERE job_id = ? AND estado = 'pendente' ORDER BY indice",
+            (job_id,),
+        ).fetchall()
+        vagas = asyncio.Semaphore(self.folhas_simultaneas)
+
+        async def corrigir(indice, caminho):
+            async with vagas:
+                try:
+                    resultado = await self.processar_folha(
+                        caminho, parametros, f"{job_id}:{indice}"
+                    )
+                except Exception as e:
+                    print(traceback.format_exc())
+                    resultado = {
+                        "error": "Erro ao processar a folha.",
+                        "details": str(e),
+                    }
+            # Cada folha é gravada assim que termina: o restart não a refaz.
+            self._conexao.execute(
+                "UPDATE folhas_job SET estado = ?, resultado = ? "
+                "WHERE job_id = ? AND indice = ?",
+                (
+                    "falhou" if "error" in resultado else "concluida",
+                    json.dumps(resultado, ensure_ascii=False),
+                    job_id,
+                    indice,
+                ),
+            )
+            self._atualizar_job(job_id, "processando")
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+        await asyncio.gather(
+            *[corrigir(linha["indice"], linha["caminho"]) for linha in pendentes]
+        )
+        self._atualizar_job(job_id, "concluido")
+        shutil.rmtree(self._pasta(job_id), ignore_errors=True)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import metricas
+from layout import LAYOUT_PADRAO, carregar_layout
+
+QUESTOES_POR_DIA = 90
+# Questões lidas com confiança abaixo disso são apontadas para conferência.
+CONFIANCA_MINIMA = 0.5
+
+
+class FolhaIlegivel(Exception):
+    """Erro de leitura de uma folha (código do aluno ou respostas)."""
+
+
+def ler_folha(imagem, layout=LAYOUT_PADRAO):
+    """
+    Extrai o código do aluno, a lista das 90 respostas de uma folha e a
+    confiança (0 a 1) da leitura de cada questão. Respostas são letras,
+    "X" (em branco) ou "*" (mais de uma bolha marcada).
+    `imagem` é o conteúdo do arquivo enviado (bytes) ou o caminho dele.
+    A imagem é decodificada e registrada no `layout` uma única vez para os
+    dois leitores, que amostram as bolhas nas posições do modelo.
+    """
+    # Leitores (OpenCV) importados só no worker que lê a folha.
+    from contexto_folha import SheetContext
+    from leitor_gabarito import extrair_respostas_gabarito
+    from roi_code import extrair_codigo_aluno_automatico
+
+    layout = carregar_layout(layout)
+    with metricas.medir("decodificacao"):
+        contexto = SheetContext.obter(imagem)
+    if contexto is None:
+        metricas.FOLHAS.incrementar(resultado="imagem_invalida")
+        raise FolhaIlegivel("Não foi possível abrir a imagem enviada.")
+
+    # Registra antes dos leitores para que o tempo de cada um fique separado.
+    contexto.registro(layout)
+
+    codigo_aluno = extrair_codigo_aluno_automatico(contexto, layout)
+    if not codigo_aluno or "?" in codigo_aluno:
+        metricas.FOLHAS.incrementar(resultado="codigo_ilegivel")
+        raise FolhaIlegivel("Não foi possível ler o código do aluno.")
+
+    respostas_dict = extrair_respostas_gabarito(contexto, layout)
+    if not respostas_dict:
+        metricas.FOLHAS.incrementar(resultado="respostas_ilegiveis")
+        raise FolhaIlegivel("Não foi possível extrair as respostas do gabarito.")
+
+    inicio_questao = 1
+    fim_questao = 90
+    list_answers = [
+        respostas_dict.get(i, "X") for i in range(inicio_questao, fim_questao + 1)
+    ]
+    # A leitura por blocos (sem layout registrado) não mede confiança: None.
+    por_questao = contexto.confianca.get("respostas", {})
+    confianca = [
+        round(por_questao[i], 3) if i in por_questao else None
+        for i in range(inicio_questao, fim_questao + 1)
+    ]
+    return codigo_aluno, list_answers, confianca
+
+
+def resumir_leitura(confianca, dia):
+    """
+    Resumo da confiança de uma folha para o resultado: a média e os números
+    (da prova) das questões abaixo de CONFIANCA_MINIMA. None sem medição.
+    """
+    medidas = [(i, c) for i, c in enumerate(confianca or []) if c is not None]
+    if not medidas:
+        return None
+    inicio = (int(dia) - 1) * QUESTOES_POR_DIA + 1
+    return {
+        "confianca_media": round(sum(c for _, c in medidas) / len(medidas), 3),
+        "questoes_duvidosas": [inicio + i for i, c in medidas if c < CONFIANCA_MINIMA],
+    }
+
+
+def montar_resultado(
+    aluno, codigo_aluno, year, day, language, results_analysis, confianca=None
+):
+    """
+    Monta a entrada de histórico/resultado de uma correção. Com a confiança
+    por questão da leitura, inclui o resumo dela em "leitura".
+    """
+    entrada = {
+        "data_correcao": datetime.now().isoformat(),
+        "mensagem": f"Prova do aluno {aluno.get('nome', '')} corrigida e histórico salvo!",
+        "codigo_aluno": codigo_aluno,
+        "nome_aluno": aluno.get("nome", "Não cadastrado"),
+        "detalhes_prova": {"ano": year, "dia": day, "idioma": language},
+        "analise": results_analysis,
+    }
+    leitura = resumir_leitura(confianca, day)
+    if leitura is not None:
+        entrada["leitura"] = leitura
+    return entrada
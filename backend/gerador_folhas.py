@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de folhas de resposta sintéticas a partir de um layout.
+
+Desenha a folha (marcadores, bolhas do código e das respostas, textos das
+âncoras) com código e respostas conhecidos e aplica as degradações de uma
+foto de celular: escala, rotação, perspectiva, sombra, desfoque, ruído e
+compressão JPEG. Usado pelo benchmark para medir latência e acerto.
+
+Uso (a partir da pasta backend):
+    python gerador_folhas.py [quantidade] [pasta_saida]
+"""
+
+import cv2
+import numpy as np
+
+from layout import carregar_layout
+
+FONTE = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def sortear_gabarito(rng, layout, prob_branco=0.03):
+    """Código do aluno e respostas ({questao: letra ou "X"}) aleatórios."""
+    codigo = "".join(
+        str(rng.integers(10)) for _ in range(layout.codigo_aluno["colunas"])
+    )
+    respostas = {
+        questao: (
+            "X"
+            if rng.random() < prob_branco
+            else layout.alternativas[rng.integers(len(layout.alternativas))]
+        )
+        for questao in layout.questoes
+    }
+    return codigo, respostas
+
+
+def desenhar_folha(codigo, respostas, layout=None, largura=1000, rng=None):
+    """Folha limpa, em BGR, com `largura` px e o referencial do layout escalado."""
+    layout = carregar_layout() if layout is None else carregar_layout(layout)
+    rng = np.random.default_rng() if rng is None else rng
+    escala = largura / layout.largura
+    altura = int(round(layout.altura * escala))
+    folha = np.full((altura, largura), 250, dtype=np.uint8)
+
+    def ponto(x, y):
+        return int(round(x * escala)), int(round(y * escala))
+
+    def texto(conteudo, x, y, tamanho=0.45, cor=40):
+        # (x, y) é o canto superior esquerdo, como nas âncoras do layout.
+        (_, altura_texto), _ = cv2.getTextSize(conteudo, FONTE, tamanho * escala, 1)
+        origem = ponto(x, y)
+        cv2.putText(
+            folha,
+            conteudo,
+            (origem[0], origem[1] + altura_texto),
+            FONTE,
+            tamanho * escala,
+            cor,
+            max(1, int(round(escala))),
+            cv2.LINE_AA,
+        )
+
+    for ancora in layout.ancoras.values():
+        texto(ancora["texto"].capitalize(), *ancora["posicao"])
+    texto("Nome do aluno: ______________________", 100, 230, 0.35)
+
+    lado = layout.lado_marcador * escala
+    for x, y in layout.grade_marcadores:
+        x0, y0 = x * escala - lado / 2, y * escala - lado / 2
+        cv2.rectangle(
+            folha,
+            (int(round(x0)), int(round(y0))),
+            (int(round(x0 + lado)) - 1, int(round(y0 + lado)) - 1),
+            15,
+            -1,
+        )
+
+    raio = layout.raio_bolha * escala
+    espessura = max(1, int(round(escala)))
+
+    def bolha(x, y, marcada, rotulo):
+        centro = ponto(x, y)
+        if marcada:
+            # Preenchimento de caneta/lápis: escuro, com pequena variação.
+            cor = int(rng.integers(15, 70))
+            cv2.circle(folha, centro, int(round(raio)), cor, -1, cv2.LINE_AA)
+            return
+        cv2.circle(folha, centro, int(round(raio)), 90, espessura, cv2.LINE_AA)
+        (largura_rotulo, altura_rotulo), _ = cv2.getTextSize(
+            rotulo, FONTE, 0.22 * escala, 1
+        )
+        cv2.putText(
+            folha,
+            rotulo,
+            (centro[0] - largura_rotulo // 2, centro[1] + altura_rotulo // 2),
+            FONTE,
+            0.22 * escala,
+            130,
+            1,
+            cv2.LINE_AA,
+        )
+
+    for coluna, digito_marcado in enumerate(codigo):
+        for digito in range(layout.codigo_aluno["digitos"]):
+            x, y = layout.centros_codigo[coluna, digito]
+            bolha(x, y, digito == int(digito_marcado), str(digito))
+
+    for linha, questao in enumerate(layout.questoes):
+        for opcao, letra in enumerate(layout.alternativas):
+            x, y = layout.centros_respostas[linha, opcao]
+            bolha(x, y, respostas.get(questao) == letra, letra)
+
+    return cv2.cvtColor(folha, cv2.COLOR_GRAY2BGR)
+
+
+def degradar(imagem, rng, intensidade=1.0):
+    """
+    Aplica distorções de foto com parâmetros sorteados (escalados por
+    `intensidade`, 0 = nenhuma). Retorna (imagem, parametros).
+    """
+    parametros = {
+        "escala": float(np.exp(rng.uniform(np.log(0.8), np.log(3.5)))),
+        "rotacao": float(rng.uniform(-8, 8) * intensidade),
+        "perspectiva": float(rng.uniform(0, 0.03) * intensidade),
+        "sombra": float(rng.uniform(0, 0.45) * intensidade),
+        "desfoque": float(rng.uniform(0, 1.2) * intensidade),
+        "ruido": float(rng.uniform(0, 6) * intensidade),
+        "qualidade_jpeg": int(round(95 - rng.uniform(0, 55) * intensidade)),
+    }
+
+    altura, largura = imagem.shape[:2]
+    escala = parametros["escala"]
+    margem = 0.08
+    saida_l = int(largura * escala * (1 + 2 * margem))
+    saida_a = int(altura * escala * (1 + 2 * margem))
+
+    # Cantos da folha no fundo (mesa), com rotação e perspectiva.
+    cantos = np.float32([[0, 0], [largura, 0], [largura, altura], [0, altura]])
+    centro = np.float32([largura / 2, altura / 2])
+    angulo = np.deg2rad(parametros["rotacao"])
+    rotacao = np.float32(
+        [[np.cos(angulo), -np.sin(angulo)], [np.sin(angulo), np.cos(angulo)]]
+    )
+    destino = (cantos - centro) @ rotacao.T * escala
+    destino += rng.uniform(-1, 1, size=(4, 2)).astype(np.float32) * (
+        parametros["perspectiva"] * largura * escala
+    )
+    destino += np.float32([saida_l / 2, saida_a / 2])
+    fundo = tuple(int(c) for c in rng.integers(150, 215, size=3))
+    foto = cv2.warpPerspective(
+        imagem,
+        cv2.getPerspectiveTransform(cantos, destino.astype(np.float32)),
+        (saida_l, saida_a),
+        flags=cv2.INTER_LINEAR,
+        borderValue=fundo,
+    ).astype(np.float32)
+
+    if parametros["sombra"] > 0:
+        direcao = rng.uniform(0, 2 * np.pi)
+        ys, xs = np.mgrid[0:saida_a, 0:saida_l].astype(np.float32)
+        projecao = xs * np.cos(direcao) + ys * np.sin(direcao)
+        projecao = (projecao - projecao.min()) / max(1.0, np.ptp(projecao))
+        foto *= (1 - parametros["sombra"] * projecao)[..., None]
+
+    if parametros["desfoque"] > 0:
+        foto = cv2.GaussianBlur(foto, (0, 0), parametros["desfoque"] * escala)
+
+    if parametros["ruido"] > 0:
+        foto += rng.normal(0, parametros["ruido"], size=foto.shape).astype(np.float32)
+
+    foto = np.clip(foto, 0, 255).astype(np.uint8)
+    _, jpeg = cv2.imencode(
+        ".jpg", foto, [cv2.IMWRITE_JPEG_QUALITY, parametros["qualidade_jpeg"]]
+    )
+    return cv2.imdecode(jpeg, cv2.IMREAD_COLOR), parametros
+
+
+def gerar_folhas(quantidade, semente=0, layout=None, intensidade=1.0):
+    """Gera (imagem, codigo, respostas, parametros) de forma reprodutível."""
+    layout = carregar_layout() if layout is None else carregar_layout(layout)
+    rng = np.random.default_rng(semente)
+    for _ in range(quantidade):
+        codigo, respostas = sortear_gabarito(rng, layout)
+        folha = desenhar_folha(codigo, respostas, layout, rng=rng)
+        imagem, parametros = degradar(folha, rng, intensidade)
+        yield imagem, codigo, respostas, parametros
+
+
+if __name__ == "__main__":
+    import json
+    import os
+    import sys
+
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pasta = sys.argv[2] if len(sys.argv) > 2 else "folhas_sinteticas"
+    os.makedirs(pasta, exist_ok=True)
+
+    for i, (imagem, codigo, respostas, parametros) in enumerate(
+        gerar_folhas(quantidade)
+    ):
+        nome = os.path.join(pasta, f"sintetica_{i:03d}")
+        cv2.imwrite(f"{nome}.jpg", imagem)
+        with open(f"{nome}.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {"codigo": codigo, "respostas": respostas, "parametros": parametros},
+                f,
+                ensure_ascii=False,
+                indent=4,
+            )
+    print(f"✅ {quantidade} folhas sintéticas gravadas em '{pasta}'.")
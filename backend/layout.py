@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import numpy as np
+
+from configuracao import TesseractIndisponivel
+
+LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts")
+LAYOUT_PADRAO = os.environ.get("LAYOUT_PADRAO", "simulado_ifce")
+
+_layouts = {}
+
+
+class LayoutDesconhecido(ValueError):
+    """Não existe arquivo de layout com o nome pedido."""
+
+
+class LayoutFolha:
+    """
+    Modelo de uma versão de folha de respostas.
+
+    Todas as coordenadas estão no referencial da folha (`largura` x `altura`);
+    os centros das bolhas são calculados uma vez a partir das grades do JSON.
+    """
+
+    def __init__(self, dados):
+        self.nome = dados["nome"]
+        self.versao = dados.get("versao", 1)
+        self.descricao = dados.get("descricao", "")
+        self.largura = dados["largura"]
+        self.altura = dados["altura"]
+        self.raio_bolha = dados["raio_bolha"]
+        self.lado_marcador = dados.get("lado_marcador", 10)
+        self.marcadores = dados.get("marcadores", {})
+        self.ancoras = dados.get("ancoras", {})
+        self.alternativas = dados["alternativas"]
+        self.blocos_respostas = dados["respostas"]
+        self.codigo_aluno = dados["codigo_aluno"]
+
+        self.questoes, self.centros_respostas = self._grade_respostas()
+        self.centros_codigo = self._grade_codigo()
+        self.grade_marcadores = self._grade_marcadores(dados.get("grade_marcadores"))
+
+    @property
+    def raio_amostra(self):
+        """Raio do miolo da bolha que é amostrado (evita o contorno impresso)."""
+        return self.raio_bolha * 0.75
+
+    def _grade_respostas(self):
+        questoes = []
+        centros = []
+        for bloco in self.blocos_respostas:
+            x0, y0 = bloco["origem"]
+            passo_x, passo_y = bloco["passo"]
+            for linha in range(bloco["questoes"]):
+                questoes.append(bloco["questao_inicial"] + linha)
+                centros.append(
+                    [
+                        (x0 + coluna * passo_x, y0 + linha * passo_y)
+                        for coluna in range(len(self.alternativas))
+                    ]
+                )
+        return questoes, np.array(centros, dtype=np.float32)
+
+    def _grade_codigo(self):
+        x0, y0 = self.codigo_aluno["origem"]
+        passo_x, passo_y = self.codigo_aluno["passo"]
+        return np.array(
+            [
+                [
+                    (x0 + coluna * passo_x, y0 + digito * passo_y)
+                    for digito in range(self.codigo_aluno["digitos"])
+                ]
+                for coluna in range(self.codigo_aluno["colunas"])
+            ],
+            dtype=np.float32,
+        )
+
+    def _grade_marcadores(self, grade):
+        """Todos os quadrados pretos da folha; sem grade, só os quatro cantos."""
+        if not grade:
+            return np.array(list(self.marcadores.values()), dtype=np.float32)
+        x0, y0 = grade["origem"]
+        passo_x, passo_y = grade["passo"]
+        return np.array(
+            [
+                (x0 + coluna * passo_x, y0 + linha * passo_y)
+                for linha in range(grade["linhas"])
+                for coluna in range(grade["colunas"])
+            ],
+            dtype=np.float32,
+        ).reshape(-1, 2)
+
+
+def listar_layouts():
+    return sorted(
+        os.path.splitext(nome)[0]
+        for nome in os.listdir(LAYOUTS_DIR)
+        if nome.endswith(".json")
+    )
+
+
+def carregar_layout(nome=LAYOUT_PADRAO):
+    """Lê (uma vez por processo) o layout `layouts/<nome>.json`."""
+    if isinstance(nome, LayoutFolha):
+        return nome
+    if nome not in _layouts:
+        caminho = os.path.join(LAYOUTS_DIR, f"{nome}.json")
+        if not os.path.exists(caminho):
+            raise LayoutDesconhecido(f"Layout de folha '{nome}' não encontrado.")
+        with open(caminho, "r", encoding="utf-8") as f:
+            _layouts[nome] = LayoutFolha(json.load(f))
+    return _layouts[nome]
+
+
+def registrar_por_ancoras(contexto, layout):
+    """
+    Homografia referencial do layout -> imagem a partir das âncoras de texto.
+    A escala vem do tamanho da imagem (como no leitor antigo) e a translação
+    da média das âncoras encontradas pelo OCR. Retorna None sem âncoras ou
+    sem Tesseract.
+    """
+    altura, largura = contexto.formato
+    escala_x = largura / layout.largura
+    escala_y = altura / layout.altura
+
+    deslocamentos = []
+    for nome, ancora in layout.ancoras.items():
+        x_ref, y_ref = ancora["posicao"]
+        try:
+            palavra = contexto.procurar_palavra(
+                ancora["texto"], conf_minima=40, chave=f"{layout.nome}:{nome}"
+            )
+        except TesseractIndisponivel as e:
+            print(f"ERRO: {e}")
+            return None
+        if palavra is not None:
+            deslocamentos.append(
+                (palavra["left"] - x_ref * escala_x, palavra["top"] - y_ref * escala_y)
+            )
+
+    if not deslocamentos:
+        return None
+
+    desloc_x, desloc_y = np.mean(deslocamentos, axis=0)
+    return np.array(
+        [[escala_x, 0, desloc_x], [0, escala_y, desloc_y], [0, 0, 1]],
+        dtype=np.float64,
+    )
+
+
+def projetar(homografia, pontos):
+    """Leva pontos (..., 2) do referencial do layout para a imagem."""
+    import cv2
+
+    formato = pontos.shape
+    projetados = cv2.perspectiveTransform(
+        pontos.reshape(-1, 1, 2).astype(np.float32), homografia
+    )
+    return projetados.reshape(formato)
+
+
+def escala_media(homografia):
+    """Fator de escala aproximado da homografia (para raios e tolerâncias)."""
+    return float(np.sqrt(abs(np.linalg.det(homografia[:2, :2]))))
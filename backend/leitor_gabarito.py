@@ -1,28 +1,31 @@
 # -*- coding: utf-8 -*-
 import cv2
-import pytesseract
-import numpy as np
 from imutils import contours
-import unicodedata
 import os
 
+import metricas
+from bolhas import (
+    MARCACAO_MULTIPLA,
+    SEM_MARCACAO,
+    classificar_marcacoes,
+    matriz_preenchimento,
+)
+from contexto_folha import SheetContext
+from layout import LAYOUT_PADRAO, carregar_layout
 
-try:
-    pytesseract.pytesseract.tesseract_cmd = (
-        r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-    )
-    pytesseract.get_tesseract_version()
-except Exception as e:
-    print(
-        "ERRO: Tesseract não encontrado. Verifique o caminho na variável 'pytesseract.pytesseract.tesseract_cmd'."
-    )
-    exit()
+
+# Questão sem nenhuma bolha marcada ("X") ou com mais de uma ("*").
+RESPOSTA_POR_ESTADO = {SEM_MARCACAO: "X", MARCACAO_MULTIPLA: "*"}
 
 
-def processar_bloco_respostas(roi_bloco, questao_inicial, imagem_para_desenhar):
+def processar_bloco_respostas(
+    roi_bloco, questao_inicial, marcadas=None, deslocamento=(0, 0)
+):
     """
     Analisa uma ROI, detecta as respostas marcadas e as retorna em um dicionário.
     *** VERSÃO CORRIGIDA: Usa intensidade média em escala de cinza para robustez. ***
+    As bolhas marcadas entram em `marcadas` como (x, y, raio), somando o
+    `deslocamento` (x, y) da ROI na imagem.
     """
     LIMIAR_DE_PREENCHIMENTO = 90.0
 
@@ -68,60 +71,116 @@ def processar_bloco_respostas(roi_bloco, questao_inicial, imagem_para_desenhar):
 
     mapa_respostas = {0: "A", 1: "B", 2: "C", 3: "D", 4: "E"}
 
-    LIMIAR_DE_PREENCHimento = 90.0
-
+    questoes = []
+    grupos = []
     for i in range(0, len(bolhas_validas), 5):
         grupo_atual = bolhas_validas[i : i + 5]
         if len(grupo_atual) != 5:
             continue
         grupo_atual = contours.sort_contours(grupo_atual, method="left-to-right")[0]
+        questoes.append(questao_inicial + (i // 5))
+        grupos.append(grupo_atual)
 
-        medias_intensidade = []
-        for c in grupo_atual:
-
-            mask = np.zeros(img_cinza.shape, dtype="uint8")
-            cv2.drawContours(mask, [c], -1, 255, -1)
+    # Uma única passada para as intensidades de todas as bolhas do bloco.
+    preenchimento = matriz_preenchimento(img_cinza_invertida, grupos)
+    escolhas, _ = classificar_marcacoes(preenchimento, LIMIAR_DE_PREENCHIMENTO)
 
-            pixels_da_bolha = cv2.bitwise_and(
-                img_cinza_invertida, img_cinza_invertida, mask=mask
-            )
+    for numero_questao_atual, grupo_atual, indice_marcado in zip(
+        questoes, grupos, escolhas
+    ):
+        resposta_marcada = RESPOSTA_POR_ESTADO.get(int(indice_marcado))
 
-            media = np.mean(pixels_da_bolha[mask > 0])
-            medias_intensidade.append(media)
-
-        indice_marcado = np.argmax(medias_intensidade)
-        maior_intensidade = medias_intensidade[indice_marcado]
-        numero_questao_atual = questao_inicial + (i // 5)
-        resposta_marcada = "X"
-
-        if maior_intensidade > LIMIAR_DE_PREENCHIMENTO:
+        if resposta_marcada is None:
             resposta_marcada = mapa_respostas[indice_marcado]
-            (x, y, w, h) = cv2.boundingRect(grupo_atual[indice_marcado])
-            cv2.circle(
-                imagem_para_desenhar,
-                (x + w // 2, y + h // 2),
-                int(w * 0.6),
-                (0, 255, 0),
-                2,
-            )
+            if marcadas is not None:
+                (x, y, w, h) = cv2.boundingRect(grupo_atual[indice_marcado])
+                marcadas.append(
+                    (
+                        deslocamento[0] + x + w // 2,
+                        deslocamento[1] + y + h // 2,
+                        int(w * 0.6),
+                    )
+                )
 
         gabarito_parcial[numero_questao_atual] = resposta_marcada
     return gabarito_parcial
 
 
-def extrair_respostas_gabarito(caminho_imagem):
+def imprimir_gabarito(gabarito_final):
+    print("\n\n--- GABARITO EXTRAÍDO COM SUCESSO ---")
+
+    for i in range(30):
+        linha_str = ""
+        if (i + 1) in gabarito_final:
+            linha_str += f"Q{i+1:02d}: {gabarito_final[i+1]}   \t"
+        else:
+            linha_str += " " * 10 + "\t"
+        if (i + 31) in gabarito_final:
+            linha_str += f"Q{i+31:02d}: {gabarito_final[i+31]}   \t"
+        else:
+            linha_str += " " * 10 + "\t"
+        if (i + 46) in gabarito_final:
+            linha_str += f"Q{i+46:02d}: {gabarito_final[i+46]}   \t"
+        else:
+            linha_str += " " * 10 + "\t"
+        if (i + 76) in gabarito_final:
+            linha_str += f"Q{i+76:02d}: {gabarito_final[i+76]}"
+        print(linha_str)
+
+
+def ler_respostas_por_layout(contexto, layout):
+    """
+    Lê as 90 questões amostrando as bolhas direto nas posições do layout,
+    depois de registrar a folha uma vez (sem findContours por bloco).
+    """
+    LIMIAR_DE_PREENCHIMENTO = 90.0
+
+    homografia = contexto.registro(layout)
+    if homografia is None:
+        print(
+            f"ERRO CRÍTICO: Não foi possível registrar a folha no layout '{layout.nome}'."
+        )
+        return None
+
+    preenchimento = contexto.preenchimento(
+        homografia,
+        layout.centros_respostas,
+        layout.raio_amostra,
+        LIMIAR_DE_PREENCHIMENTO,
+        nome="respostas",
+    )
+    escolhas, confianca = classificar_marcacoes(preenchimento, LIMIAR_DE_PREENCHIMENTO)
+    contexto.confianca["respostas"] = dict(zip(layout.questoes, confianca.tolist()))
+
+    gabarito_final = {}
+    for numero_questao, indice_marcado in zip(layout.questoes, escolhas):
+        resposta_marcada = RESPOSTA_POR_ESTADO.get(int(indice_marcado))
+        if resposta_marcada is None:
+            resposta_marcada = layout.alternativas[indice_marcado]
+        gabarito_final[numero_questao] = resposta_marcada
+    return gabarito_final
+
+
+@metricas.cronometrar("respostas")
+def extrair_respostas_gabarito(origem, layout=None):
     """
     Função principal que orquestra a leitura completa do gabarito.
     *** VERSÃO SEM REDIMENSIONAMENTO FIXO: Coordenadas são escaladas dinamicamente ***
+    `origem` pode ser o caminho da imagem ou um SheetContext compartilhado.
+    Com um `layout` (nome ou LayoutFolha), as bolhas são lidas nas posições do
+    modelo; sem ele, os blocos são recortados e as bolhas procuradas por contorno.
     """
-    imagem_original = cv2.imread(caminho_imagem)
-    if imagem_original is None:
-        print(f"ERRO: Não foi possível carregar a imagem: '{caminho_imagem}'")
+    contexto = SheetContext.obter(origem)
+    if contexto is None:
         return None
 
-    
-    imagem = imagem_original.copy()
-    imagem_resultado = imagem.copy()
+    if layout is not None:
+        gabarito_final = ler_respostas_por_layout(contexto, carregar_layout(layout))
+        if gabarito_final:
+            imprimir_gabarito(gabarito_final)
+        return gabarito_final
+
+    imagem = contexto.imagem
     
     altura_real, largura_real, _ = imagem.shape
     print(f"Tratando imagem original com tamanho: {largura_real}x{altura_real}")
@@ -137,31 +196,15 @@ def extrair_respostas_gabarito(caminho_imagem):
 
     
     print("Procurando âncora 'Simulado'...")
-    img_cinza_ocr = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
-    dados = pytesseract.image_to_data(
-        img_cinza_ocr, output_type=pytesseract.Output.DICT, lang="por"
-    )
-
     ancora_x, ancora_y = None, None
-    for i, palavra in enumerate(dados["text"]):
-        palavra_limpa = (
-            unicodedata.normalize("NFKD", palavra)
-            .encode("ascii", "ignore")
-            .decode("utf-8")
-            .lower()
-        )
-        if "simulado" in palavra_limpa and dados["conf"][i] > 50:
-            ancora_x = dados["left"][i]
-            ancora_y = dados["top"][i]
-            print(f"✅ Âncora 'Simulado' encontrada em (x={ancora_x}, y={ancora_y})")
-            cv2.rectangle(
-                imagem_resultado,
-                (ancora_x, ancora_y),
-                (ancora_x + dados["width"][i], ancora_y + dados["height"][i]),
-                (0, 0, 255),
-                2,
-            )
-            break
+    # O leitor sem layout foi escrito para a folha do layout padrão.
+    palavra = contexto.procurar_palavra(
+        "simulado", conf_minima=50, chave=f"{LAYOUT_PADRAO}:simulado"
+    )
+    if palavra is not None:
+        ancora_x = palavra["left"]
+        ancora_y = palavra["top"]
+        print(f"✅ Âncora 'Simulado' encontrada em (x={ancora_x}, y={ancora_y})")
 
     if ancora_x is None:
         print(
@@ -185,6 +228,8 @@ def extrair_respostas_gabarito(caminho_imagem):
     ]
 
     gabarito_final = {}
+    regioes = contexto.deteccoes.setdefault("regioes", [])
+    marcadas = contexto.deteccoes.setdefault("marcadas", [])
 
     for bloco in todos_blocos:
         print(f"Processando {bloco['label']}...")
@@ -207,49 +252,29 @@ def extrair_respostas_gabarito(caminho_imagem):
         h = min(h_escalado, altura_real - y_abs)
 
         roi_recortada = imagem[y_abs : y_abs + h, x_abs : x_abs + w]
-        roi_para_desenhar = imagem_resultado[y_abs : y_abs + h, x_abs : x_abs + w]
 
         respostas_parciais = processar_bloco_respostas(
-            roi_recortada, bloco["questao_inicial"], roi_para_desenhar
+            roi_recortada, bloco["questao_inicial"], marcadas, (x_abs, y_abs)
         )
         gabarito_final.update(respostas_parciais)
-        cv2.rectangle(
-            imagem_resultado, (x_abs, y_abs), (x_abs + w, y_abs + h), (255, 0, 0), 3
-        )
+        regioes.append((x_abs, y_abs, w, h))
 
     
-    print("\n\n--- GABARITO EXTRAÍDO COM SUCESSO ---")
-    
-    for i in range(30):
-        linha_str = ""
-        if (i + 1) in gabarito_final:
-            linha_str += f"Q{i+1:02d}: {gabarito_final[i+1]}   \t"
-        else:
-            linha_str += " " * 10 + "\t"
-        if (i + 31) in gabarito_final:
-            linha_str += f"Q{i+31:02d}: {gabarito_final[i+31]}   \t"
-        else:
-            linha_str += " " * 10 + "\t"
-        if (i + 46) in gabarito_final:
-            linha_str += f"Q{i+46:02d}: {gabarito_final[i+46]}   \t"
-        else:
-            linha_str += " " * 10 + "\t"
-        if (i + 76) in gabarito_final:
-            linha_str += f"Q{i+76:02d}: {gabarito_final[i+76]}"
-        print(linha_str)
+    imprimir_gabarito(gabarito_final)
 
-    #Linhas para debug visual
-    #cv2.imwrite("gabarito_resultado_visual.jpg", imagem_resultado)
-    #print("\n📝 Imagem 'gabarito_resultado_visual.jpg' salva com as detecções.")
-    
+    # As detecções ficam em contexto.deteccoes; o desenho é feito sob demanda
+    # por overlay.py (GET /corrigir/{id}/overlay).
     return gabarito_final
 
 
 if __name__ == "__main__":
-    
-    diretorio_do_script = os.path.dirname(os.path.abspath(__file__))
-    nome_do_arquivo = "imagens_teste/prova4.png"
-    caminho_do_gabarito = os.path.join(diretorio_do_script, nome_do_arquivo)
-   
+    import sys
 
-    extrair_respostas_gabarito(caminho_do_gabarito)
+    # Uso: python leitor_gabarito.py [imagem]; sem argumento, usa imagens_teste/prova4.png.
+    diretorio_do_script = os.path.dirname(os.path.abspath(__file__))
+    caminho_do_gabarito = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(diretorio_do_script, "imagens_teste", "prova4.png")
+    )
+    print(extrair_respostas_gabarito(caminho_do_gabarito, carregar_layout()))
@@ -1,25 +1,84 @@
 from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import JSONResponse, FileResponse
+from typing import List, Optional
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
-import cv2
-import numpy as np
-import pytesseract
 import json
 import os
-import PyPDF2
-from datetime import datetime
+from contextlib import asynccontextmanager
 
+import asyncio
+import time
 import traceback
 
 
-from enem_question_analyzer import compare_answers
-from roi_code import extrair_codigo_aluno_automatico
-from leitor_gabarito import extrair_respostas_gabarito
-import shutil
+import metricas
+from enem_question_analyzer import (
+    cliente_enem,
+    corrigir_com_gabarito,
+    repositorio_gabaritos,
+)
+from banco_alunos import COLUNAS_HISTORICO, BancoAlunos
+from cache_resultados import criar_cache_resultados
+from entrada_pdf import PdfInvalido, paginas_pdf
+from exportacao import (
+    COLUNAS_ALUNOS,
+    COLUNAS_PDF_ALUNOS,
+    COLUNAS_PDF_TURMAS,
+    COLUNAS_TURMAS,
+    achatar_correcao,
+    achatar_turma,
+    gerar_csv,
+    gerar_json,
+    gerar_ndjson,
+    gerar_pdf,
+)
+from fila_jobs import FilaJobs
+from configuracao import (
+    LOTE_MAXIMO_DESCOMPACTADO,
+    MANTER_UPLOADS,
+    RESULTADOS_DIR,
+    TAMANHO_MAXIMO_UPLOAD,
+    UPLOADS_DIR,
+    ContagemLote,
+    LoteGrandeDemais,
+    estado_motores,
+    mensagem_upload_grande,
+    preparar_diretorios,
+    tesseract_disponivel,
+)
+from folha import FolhaIlegivel, montar_resultado
+from motor_correcao import GabaritoDia, corrigir_turma
+from overlay import RepositorioOverlays, renderizar_overlay
+from layout import LAYOUT_PADRAO, LayoutDesconhecido, carregar_layout, listar_layouts
+from pool_ocr import PoolSaturado, pool_ocr
 import uuid
+import zipfile
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    preparar_diretorios()
+    banco_alunos.iniciar()
+    if not tesseract_disponivel():
+        print(
+            "AVISO: Tesseract indisponível. Só folhas com os marcadores legíveis "
+            "serão corrigidas."
+        )
+    await pool_ocr.iniciar()
+    await fila_jobs.iniciar()
+    yield
+    await fila_jobs.encerrar()
+    pool_ocr.encerrar()
+    await cliente_enem.fechar()
+
+
+app = FastAPI(lifespan=lifespan)
 
 FRONTEND_DIST = os.path.join(os.path.dirname(__file__), "..", "frontend", "dist")
 
@@ -30,21 +89,159 @@ if os.path.exists(os.path.join(FRONTEND_DIST, "assets")):
         name="assets",
     )
 
-UPLOADS_DIR = "uploads"
-os.makedirs(UPLOADS_DIR, exist_ok=True)
-os.makedirs("resultados", exist_ok=True)
+EXTENSOES_IMAGEM = ["jpg", "jpeg", "png"]
+
+
+banco_alunos = BancoAlunos()
+cache_resultados = criar_cache_resultados()
+repositorio_overlays = RepositorioOverlays()
+
+LIMITE_PAGINA_MAXIMO = 1000
+
+metricas.Medidor(
+    "ocr_pendentes",
+    "Folhas no pool de OCR (em execução + aguardando).",
+    funcao=lambda: pool_ocr.estatisticas()["pendentes"],
+)
+
+
+# Tamanho máximo do corpo por rota: uma folha (ou PDF) ou um job inteiro.
+LIMITES_UPLOAD = {
+    "/corrigir/": TAMANHO_MAXIMO_UPLOAD,
+    "/corrigir/pdf/": TAMANHO_MAXIMO_UPLOAD,
+    "/jobs/": LOTE_MAXIMO_DESCOMPACTADO,
+}
+
+
+@app.middleware("http")
+async def limitar_upload(request, call_next):
+    """Recusa pelo Content-Length, antes de ler o corpo, o envio grande demais de LIMITES_UPLOAD."""
+    tamanho = request.headers.get("content-length")
+    limite = LIMITES_UPLOAD.get(request.url.path)
+    if (
+        limite is not None
+        and tamanho
+        and tamanho.isdigit()
+        # Folga para os outros campos do formulário.
+        and int(tamanho) > limite + 2**16
+    ):
+        if limite == TAMANHO_MAXIMO_UPLOAD:
+            return resposta_upload_grande()
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"O envio passa do limite de {limite / 2**20:g} MB."},
+        )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def medir_requisicoes(request, call_next):
+    """Duração por rota (o modelo do caminho, não o caminho com ids) e em andamento."""
+    if not metricas.METRICAS:
+        return await call_next(request)
+    inicio = time.perf_counter()
+    metricas.EM_ANDAMENTO.incrementar()
+    status = 500
+    try:
+        resposta = await call_next(request)
+        status = resposta.status_code
+        return resposta
+    finally:
+        metricas.EM_ANDAMENTO.decrementar()
+        rota = getattr(request.scope.get("route"), "path", "desconhecida")
+        metricas.REQUISICOES.observar(
+            time.perf_counter() - inicio, rota=rota, status=status
+        )
+
+
+def resposta_upload_grande():
+    return JSONResponse(status_code=413, content={"error": mensagem_upload_grande()})
+
+
+def gravar_upload(arquivo, caminho, limite=TAMANHO_MAXIMO_UPLOAD):
+    """
+    Copia o upload para `caminho` em blocos. Passando de `limite` bytes (o
+    Content-Length pode faltar), apaga o que foi gravado e devolve False.
+    """
+    gravados = 0
+    with open(caminho, "wb") as destino:
+        while bloco := arquivo.read(2**20):
+            gravados += len(bloco)
+            if gravados > limite:
+                break
+            destino.write(bloco)
+    if gravados > limite:
+        os.remove(caminho)
+        return False
+    return True
+
+
+def reter_upload(conteudo, extensao):
+    """Com MANTER_UPLOADS, guarda a imagem recebida em UPLOADS_DIR para depuração."""
+    if MANTER_UPLOADS:
+        caminho = os.path.join(UPLOADS_DIR, f"{uuid.uuid4()}.{extensao}")
+        with open(caminho, "wb") as buffer:
+            buffer.write(conteudo)
+
+
+def resposta_ocr_indisponivel():
+    """Resposta 503 quando não há como executar o OCR agora."""
+    if pool_ocr.saturado:
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": "5"},
+            content={
+                "error": "Servidor ocupado corrigindo outras provas. Tente novamente."
+            },
+        )
+    return None
+
 
+def salvar_resultado_individual(resultado, codigo_aluno, year, day):
+    output_filename = os.path.join(RESULTADOS_DIR, f"{codigo_aluno}_{year}_{day}.json")
+    with open(output_filename, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=4)
 
-def carregar_dados_alunos():
-    """Carrega os dados do arquivo alunos.json."""
-    with open("alunos.json", "r", encoding="utf-8") as f:
-        return json.load(f)
 
+def expandir_uploads(files):
+    """
+    Gera (nome, bytes, None) das imagens enviadas, abrindo arquivos .zip, ou
+    (nome, None, erro) das que não serão lidas (formato não suportado ou
+    maior que TAMANHO_MAXIMO_UPLOAD). Os tamanhos declarados no .zip são
+    conferidos antes de descompactar qualquer entrada; o lote todo passando
+    dos limites levanta LoteGrandeDemais.
+    """
+    contar = ContagemLote().contar
 
-def salvar_dados_alunos(dados):
-    """Salva os dados no arquivo alunos.json."""
-    with open("alunos.json", "w", encoding="utf-8") as f:
-        json.dump(dados, f, indent=4, ensure_ascii=False)
+    def erro_de(nome, tamanho):
+        if nome.split(".")[-1].lower() not in EXTENSOES_IMAGEM:
+            return "Formato de arquivo não suportado."
+        if tamanho > TAMANHO_MAXIMO_UPLOAD:
+            return mensagem_upload_grande()
+        return None
+
+    for file in files:
+        extensao = file.filename.split(".")[-1].lower()
+        if extensao == "zip":
+            with zipfile.ZipFile(file.file) as pacote:
+                entradas = [info for info in pacote.infolist() if not info.is_dir()]
+                for info in entradas:
+                    contar(info.file_size)
+                # A leitura de uma entrada para no tamanho declarado (e confere o CRC).
+                for info in entradas:
+                    erro = erro_de(info.filename, info.file_size)
+                    if erro:
+                        yield info.filename, None, erro
+                    else:
+                        yield info.filename, pacote.read(info), None
+        else:
+            tamanho = file.size or 0
+            contar(tamanho)
+            erro = erro_de(file.filename, tamanho)
+            if erro:
+                yield file.filename, None, erro
+            else:
+                yield file.filename, file.file.read(), None
 
 
 @app.get("/")
@@ -58,119 +255,689 @@ async def corrigir(
     day: str = Form(...),
     year: str = Form(...),
     language: str = Form(...),
+    layout: str = Form(LAYOUT_PADRAO),
+    overlay: bool = Form(False),
 ):
+    """
+    Corrige uma folha. Com overlay=true, a folha fica guardada e a resposta
+    traz em "overlay" o endereço da imagem com as detecções desenhadas.
+    """
+    try:
+        layout_folha = carregar_layout(layout)
+        day_int, year_int = int(day), int(year)
+    except LayoutDesconhecido as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except ValueError:
+        return JSONResponse(
+            status_code=400, content={"error": "Ano e dia devem ser números."}
+        )
+    if day_int not in (1, 2):
+        return JSONResponse(
+            status_code=400, content={"error": "O dia da prova deve ser 1 ou 2."}
+        )
 
     try:
         file_extension = file.filename.split(".")[-1].lower()
-        temp_filename = f"{uuid.uuid4()}.{file_extension}"
-        temp_filepath = os.path.join(UPLOADS_DIR, temp_filename)
+        if file_extension not in EXTENSOES_IMAGEM:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Formato de arquivo não suportado."},
+            )
+        if (file.size or 0) > TAMANHO_MAXIMO_UPLOAD:
+            return resposta_upload_grande()
+        # Lido do upload já em memória/spool; a imagem é decodificada no worker.
+        conteudo = file.file.read()
 
-        with open(temp_filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        extras = {}
+        if overlay:
+            id_overlay = repositorio_overlays.guardar(conteudo, layout_folha)
+            extras["overlay"] = f"/corrigir/{id_overlay}/overlay"
 
-        codigo_aluno = None
-        respostas_dict = None
+        # Mesma foto para a mesma prova: devolve a correção já registrada.
+        chave_cache = cache_resultados.chave(
+            conteudo, year, day, language, layout_folha
+        )
+        em_cache = cache_resultados.obter(chave_cache)
+        if em_cache and "resultado" in em_cache:
+            metricas.FOLHAS.incrementar(resultado="em_cache")
+            return JSONResponse({**em_cache["resultado"], **extras})
 
-        if file_extension in ["jpg", "jpeg", "png"]:
-            codigo_aluno = extrair_codigo_aluno_automatico(temp_filepath)
-            if not codigo_aluno or "?" in codigo_aluno:
+        if em_cache:
+            codigo_aluno, list_answers = em_cache["codigo_aluno"], em_cache["respostas"]
+            confianca = em_cache.get("confianca")
+        else:
+            indisponivel = resposta_ocr_indisponivel()
+            if indisponivel:
+                return indisponivel
+
+            reter_upload(conteudo, file_extension)
+            try:
+                codigo_aluno, list_answers, confianca = await pool_ocr.ler_folha(
+                    conteudo, layout
+                )
+            except FolhaIlegivel as e:
                 return JSONResponse(
-                    status_code=400,
-                    content={"error": f"Não foi possível ler o código do aluno."},
+                    status_code=400, content={"error": str(e), **extras}
                 )
-
-            respostas_dict = extrair_respostas_gabarito(temp_filepath)
-            if not respostas_dict:
+            except PoolSaturado as e:
                 return JSONResponse(
-                    status_code=400,
-                    content={
-                        "error": "Não foi possível extrair as respostas do gabarito."
-                    },
+                    status_code=503,
+                    headers={"Retry-After": "5"},
+                    content={"error": str(e)},
                 )
-        else:
+            cache_resultados.guardar_leitura(
+                chave_cache, codigo_aluno, list_answers, confianca
+            )
+
+        questoes = await repositorio_gabaritos.obter(year_int, language, day_int)
+        if not questoes:
+            return JSONResponse(
+                status_code=502,
+                content={"error": "Não foi possível obter o gabarito oficial."},
+            )
+        results_analysis = corrigir_com_gabarito(
+            list_answers, questoes, day_int, year_int
+        )
+
+        aluno = banco_alunos.obter_aluno(codigo_aluno)
+        if aluno is None:
+            metricas.FOLHAS.incrementar(resultado="aluno_nao_encontrado")
             return JSONResponse(
-                status_code=400, content={"error": "Formato de arquivo não suportado."}
+                status_code=404,
+                content={
+                    "error": f"Aluno com código '{codigo_aluno}' não encontrado.",
+                    **extras,
+                },
             )
 
-        inicio_questao = 1
-        fim_questao = 90
-        list_answers = [
-            respostas_dict.get(i, "X") for i in range(inicio_questao, fim_questao + 1)
-        ]
+        nova_entrada_historico = montar_resultado(
+            aluno, codigo_aluno, year, day, language, results_analysis, confianca
+        )
+        with metricas.medir("historico"):
+            banco_alunos.registrar_correcao(codigo_aluno, nova_entrada_historico)
+        metricas.FOLHAS.incrementar(resultado="corrigida")
 
-        day_int = int(day)
-        year_int = int(year)
+        resultado_final = dict(nova_entrada_historico)
+        del resultado_final["data_correcao"]
+        salvar_resultado_individual(resultado_final, codigo_aluno, year, day)
+        cache_resultados.guardar_resultado(
+            chave_cache, codigo_aluno, list_answers, resultado_final, confianca
+        )
+
+        return JSONResponse({**resultado_final, **extras})
+
+    except Exception as e:
+        metricas.FOLHAS.incrementar(resultado="erro")
 
-        results_analysis = await compare_answers(
-            list_answers, year_int, test_day=day_int, language=language
+        print("!!!!!!!!!! OCORREU UM ERRO CRÍTICO !!!!!!!!!!")
+        print(traceback.format_exc())
+        print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Erro interno no servidor.", "details": str(e)},
         )
 
-        alunos_db = carregar_dados_alunos()
-        if codigo_aluno not in alunos_db:
+
+@app.get("/corrigir/{id_overlay}/overlay")
+async def overlay_folha(id_overlay: str):
+    """
+    Imagem (JPEG) de uma folha enviada com overlay=true, com o que os
+    leitores encontraram desenhado. É desenhada no primeiro pedido, num
+    worker do pool de OCR, e servida do disco nos seguintes.
+    """
+    imagem = repositorio_overlays.overlay(id_overlay)
+    if imagem is None:
+        folha = repositorio_overlays.folha(id_overlay)
+        if folha is None:
             return JSONResponse(
                 status_code=404,
-                content={"error": f"Aluno com código '{codigo_aluno}' não encontrado."},
+                content={
+                    "error": f"Overlay '{id_overlay}' não encontrado. Envie a "
+                    "folha ao /corrigir/ com overlay=true."
+                },
+            )
+        try:
+            imagem = await pool_ocr.executar(renderizar_overlay, *folha)
+        except FolhaIlegivel as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        except PoolSaturado as e:
+            return JSONResponse(
+                status_code=503, headers={"Retry-After": "5"}, content={"error": str(e)}
             )
+        repositorio_overlays.guardar_overlay(id_overlay, imagem)
+    return Response(imagem, media_type="image/jpeg")
 
-        aluno = alunos_db[codigo_aluno]
-        if "historico" not in aluno:
-            aluno["historico"] = []
 
-        nova_entrada_historico = {
-            "data_correcao": datetime.now().isoformat(),
-            "mensagem": f"Prova do aluno {aluno.get('nome', '')} corrigida e histórico salvo!",
-            "codigo_aluno": codigo_aluno,
-            "nome_aluno": aluno.get("nome", "Não cadastrado"),
-            "detalhes_prova": {"ano": year, "dia": day, "idioma": language},
-            "analise": results_analysis,
-        }
+@app.post("/corrigir/lote/")
+async def corrigir_lote(
+    files: List[UploadFile] = File(...),
+    day: str = Form(...),
+    year: str = Form(...),
+    language: str = Form(...),
+    layout: str = Form(LAYOUT_PADRAO),
+):
+    """
+    Corrige uma pilha de folhas da mesma prova (várias imagens ou um .zip).
+    O gabarito é consultado uma vez, as folhas lidas são corrigidas juntas e o
+    histórico é gravado em uma única escrita. `estatisticas` traz as médias
+    por área e, por questão, a taxa de acerto e as alternativas marcadas.
+    """
+    indisponivel = resposta_ocr_indisponivel()
+    if indisponivel:
+        return indisponivel
 
-        aluno["historico"].append(nova_entrada_historico)
-        salvar_dados_alunos(alunos_db)
+    try:
+        layout_folha = carregar_layout(layout)
+    except LayoutDesconhecido as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
-        resultado_final = {
-            "mensagem": f"Prova do aluno {aluno.get('nome', '')} corrigida e histórico salvo!",
-            "codigo_aluno": codigo_aluno,
-            "nome_aluno": aluno.get("nome", "Não cadastrado"),
-            "detalhes_prova": {"ano": year, "dia": day, "idioma": language},
-            "analise": results_analysis,
-        }
+    try:
+        day_int = int(day)
+        if day_int not in (1, 2):
+            return JSONResponse(
+                status_code=400, content={"error": "O dia da prova deve ser 1 ou 2."}
+            )
+        questoes = await repositorio_gabaritos.obter(int(year), language, day_int)
+        if not questoes:
+            return JSONResponse(
+                status_code=502,
+                content={"error": "Não foi possível obter o gabarito oficial."},
+            )
+        gabarito = GabaritoDia(questoes, day_int, int(year))
+
+        resultados = []
+        lidas = []
+        novos = []
+        falhas = []
+        alunos_db = {}
+
+        async def leitura_em_cache(em_cache):
+            return (
+                em_cache["codigo_aluno"],
+                em_cache["respostas"],
+                em_cache.get("confianca"),
+            )
 
-        output_filename = os.path.join(
-            "resultados", f"{codigo_aluno}_{year}_{day}.json"
+        async def ler_bloco(folhas):
+            """Lê um bloco de folhas no pool; só as respostas ficam em `lidas`."""
+            leituras = await asyncio.gather(
+                *[
+                    (
+                        leitura_em_cache(em_cache)
+                        if em_cache
+                        else pool_ocr.ler_folha(conteudo, layout, aguardar_vaga=True)
+                    )
+                    for _, conteudo, _, em_cache in folhas
+                ],
+                return_exceptions=True,
+            )
+            alunos_db.update(
+                banco_alunos.obter_alunos(
+                    leitura[0]
+                    for leitura in leituras
+                    if not isinstance(leitura, Exception)
+                )
+            )
+
+            for (nome_arquivo, _, chave, em_cache), leitura in zip(folhas, leituras):
+                if isinstance(leitura, FolhaIlegivel):
+                    falhas.append({"arquivo": nome_arquivo, "error": str(leitura)})
+                    continue
+                if isinstance(leitura, Exception):
+                    print(
+                        "".join(
+                            traceback.format_exception(
+                                type(leitura), leitura, leitura.__traceback__
+                            )
+                        )
+                    )
+                    metricas.FOLHAS.incrementar(resultado="erro")
+                    falhas.append(
+                        {
+                            "arquivo": nome_arquivo,
+                            "error": "Erro ao processar a folha.",
+                            "details": str(leitura),
+                        }
+                    )
+                    continue
+
+                codigo_aluno, list_answers, confianca = leitura
+                if not em_cache:
+                    cache_resultados.guardar_leitura(
+                        chave, codigo_aluno, list_answers, confianca
+                    )
+                if codigo_aluno not in alunos_db:
+                    metricas.FOLHAS.incrementar(resultado="aluno_nao_encontrado")
+                    falhas.append(
+                        {
+                            "arquivo": nome_arquivo,
+                            "codigo_aluno": codigo_aluno,
+                            "error": f"Aluno com código '{codigo_aluno}' não encontrado.",
+                        }
+                    )
+                    continue
+
+                lidas.append(
+                    (nome_arquivo, chave, codigo_aluno, list_answers, confianca)
+                )
+
+        # As imagens são lidas e enviadas ao pool em blocos do tamanho da fila
+        # de OCR: só um bloco de arquivos fica em memória por vez.
+        bloco = []
+        for nome_arquivo, conteudo, erro in expandir_uploads(files):
+            if erro is not None:
+                falhas.append({"arquivo": nome_arquivo, "error": erro})
+                continue
+
+            chave = cache_resultados.chave(conteudo, year, day, language, layout_folha)
+            em_cache = cache_resultados.obter(chave)
+            if em_cache and "resultado" in em_cache:
+                # Folha repetida: a correção já está no histórico.
+                metricas.FOLHAS.incrementar(resultado="em_cache")
+                resultados.append({"arquivo": nome_arquivo, **em_cache["resultado"]})
+                continue
+
+            if not em_cache:
+                reter_upload(conteudo, nome_arquivo.split(".")[-1].lower())
+            bloco.append((nome_arquivo, conteudo, chave, em_cache))
+            if len(bloco) >= pool_ocr.fila_maxima:
+                await ler_bloco(bloco)
+                bloco = []
+        await ler_bloco(bloco)
+
+        # Todas as folhas lidas são corrigidas de uma vez, como uma matriz.
+        correcao = corrigir_turma(
+            [list_answers for _, _, _, list_answers, _ in lidas], gabarito
         )
-        with open(output_filename, "w", encoding="utf-8") as f:
-            json.dump(resultado_final, f, ensure_ascii=False, indent=4)
+        for i, (
+            nome_arquivo,
+            chave,
+            codigo_aluno,
+            list_answers,
+            confianca,
+        ) in enumerate(lidas):
+            entrada = montar_resultado(
+                alunos_db[codigo_aluno],
+                codigo_aluno,
+                year,
+                day,
+                language,
+                correcao.analise_aluno(i),
+                confianca,
+            )
+            novos.append((chave, codigo_aluno, list_answers, confianca, entrada))
+            resultados.append({"arquivo": nome_arquivo, **entrada})
 
-        if os.path.exists(temp_filepath):
-            os.remove(temp_filepath)
+        if novos:
+            with metricas.medir("historico"):
+                banco_alunos.registrar_correcoes(
+                    [
+                        (codigo_aluno, entrada)
+                        for _, codigo_aluno, _, _, entrada in novos
+                    ]
+                )
+            metricas.FOLHAS.incrementar(len(novos), resultado="corrigida")
+            for chave, codigo_aluno, list_answers, confianca, entrada in novos:
+                resultado_final = {
+                    k: v for k, v in entrada.items() if k != "data_correcao"
+                }
+                salvar_resultado_individual(resultado_final, codigo_aluno, year, day)
+                cache_resultados.guardar_resultado(
+                    chave, codigo_aluno, list_answers, resultado_final, confianca
+                )
 
-        return JSONResponse(resultado_final)
+        return JSONResponse(
+            {
+                "total": len(resultados) + len(falhas),
+                "corrigidas": len(resultados),
+                "resultados": resultados,
+                "falhas": falhas,
+                "estatisticas": correcao.estatisticas(),
+            }
+        )
 
+    except zipfile.BadZipFile:
+        return JSONResponse(
+            status_code=400, content={"error": "Arquivo .zip inválido."}
+        )
+    except LoteGrandeDemais as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
-
         print("!!!!!!!!!! OCORREU UM ERRO CRÍTICO !!!!!!!!!!")
         print(traceback.format_exc())
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-
-        if "temp_filepath" in locals() and os.path.exists(temp_filepath):
-            os.remove(temp_filepath)
-
         return JSONResponse(
             status_code=500,
             content={"error": "Erro interno no servidor.", "details": str(e)},
         )
 
+
+async def corrigir_folha(conteudo, extensao, prova, origem=None):
+    """
+    Lê, corrige e registra uma folha avulsa (página de PDF ou folha de um
+    job). Devolve a entrada do histórico ou um dict com "error". Com `origem`
+    (folha de job), a mesma folha nunca entra duas vezes no histórico.
+    """
+    year, day, language, layout_folha, questoes = prova
+    chave = cache_resultados.chave(conteudo, year, day, language, layout_folha)
+    em_cache = cache_resultados.obter(chave)
+    if em_cache and "resultado" in em_cache:
+        metricas.FOLHAS.incrementar(resultado="em_cache")
+        return em_cache["resultado"]
+
+    if em_cache:
+        codigo_aluno, list_answers = em_cache["codigo_aluno"], em_cache["respostas"]
+        confianca = em_cache.get("confianca")
+    else:
+        reter_upload(conteudo, extensao)
+        try:
+            codigo_aluno, list_answers, confianca = await pool_ocr.ler_folha(
+                conteudo, layout_folha.nome, aguardar_vaga=True
+            )
+        except FolhaIlegivel as e:
+            return {"error": str(e)}
+        cache_resultados.guardar_leitura(chave, codigo_aluno, list_answers, confianca)
+
+    aluno = banco_alunos.obter_aluno(codigo_aluno)
+    if aluno is None:
+        metricas.FOLHAS.incrementar(resultado="aluno_nao_encontrado")
+        return {
+            "codigo_aluno": codigo_aluno,
+            "error": f"Aluno com código '{codigo_aluno}' não encontrado.",
+        }
+
+    results_analysis = corrigir_com_gabarito(
+        list_answers, questoes, int(day), int(year)
+    )
+    entrada = montar_resultado(
+        aluno, codigo_aluno, year, day, language, results_analysis, confianca
+    )
+    with metricas.medir("historico"):
+        banco_alunos.registrar_correcao(codigo_aluno, entrada, origem)
+    metricas.FOLHAS.incrementar(resultado="corrigida")
+
+    resultado_final = {k: v for k, v in entrada.items() if k != "data_correcao"}
+    salvar_resultado_individual(resultado_final, codigo_aluno, year, day)
+    cache_resultados.guardar_resultado(
+        chave, codigo_aluno, list_answers, resultado_final, confianca
+    )
+    return entrada
+
+
+async def corrigir_pagina(numero, conteudo, extensao, prova):
+    return {"pagina": numero, **await corrigir_folha(conteudo, extensao, prova)}
+
+
+async def corrigir_folha_job(caminho, parametros, origem):
+    """Corrige uma folha de um job da fila (ver fila_jobs.FilaJobs)."""
+    layout_folha = carregar_layout(parametros["layout"])
+    questoes = await repositorio_gabaritos.obter(
+        int(parametros["year"]), parametros["language"], int(parametros["day"])
+    )
+    if not questoes:
+        return {"error": "Não foi possível obter o gabarito oficial."}
+    with open(caminho, "rb") as f:
+        conteudo = f.read()
+    prova = (
+        parametros["year"],
+        parametros["day"],
+        parametros["language"],
+        layout_folha,
+        questoes,
+    )
+    return await corrigir_folha(conteudo, caminho.split(".")[-1], prova, origem)
+
+
+fila_jobs = FilaJobs(corrigir_folha_job)
+
+
+def gerar_linha_pagina(tarefa):
+    try:
+        resultado = tarefa.result()
+    except Exception as e:
+        print("".join(traceback.format_exception(type(e), e, e.__traceback__)))
+        metricas.FOLHAS.incrementar(resultado="erro")
+        resultado = {"error": "Erro ao processar a página.", "details": str(e)}
+    return json.dumps(resultado, ensure_ascii=False) + "\n"
+
+
+async def corrigir_paginas_pdf(caminho_pdf, paginas, prova):
+    """
+    Gera uma linha NDJSON por página de `paginas` (o gerador de paginas_pdf),
+    na ordem em que as correções terminam; a página que não pôde ser extraída
+    vira uma linha de erro. No máximo `janela` páginas ficam em memória/no
+    pool ao mesmo tempo.
+    """
+    janela = max(2, pool_ocr.workers * 2)
+    pendentes = set()
+
+    async def linhas_prontas(quando):
+        nonlocal pendentes
+        prontas, pendentes = await asyncio.wait(pendentes, return_when=quando)
+        return [gerar_linha_pagina(tarefa) for tarefa in prontas]
+
+    try:
+        while True:
+            # A extração da página (PyPDF2/PyMuPDF) roda fora do event loop.
+            pagina = await asyncio.to_thread(next, paginas, None)
+            if pagina is None:
+                break
+            numero, conteudo, extensao = pagina
+            if extensao is None:
+                yield json.dumps(
+                    {"pagina": numero, "error": str(conteudo)}, ensure_ascii=False
+                ) + "\n"
+                continue
+            pendentes.add(
+                asyncio.create_task(corrigir_pagina(numero, conteudo, extensao, prova))
+            )
+            if len(pendentes) >= janela:
+                for linha in await linhas_prontas(asyncio.FIRST_COMPLETED):
+                    yield linha
+        if pendentes:
+            for linha in await linhas_prontas(asyncio.ALL_COMPLETED):
+                yield linha
+    finally:
+        for tarefa in pendentes:
+            tarefa.cancel()
+        paginas.close()
+        os.remove(caminho_pdf)
+
+
+@app.post("/corrigir/pdf/")
+async def corrigir_pdf(
+    file: UploadFile = File(...),
+    day: str = Form(...),
+    year: str = Form(...),
+    language: str = Form(...),
+    layout: str = Form(LAYOUT_PADRAO),
+):
+    """
+    Corrige um PDF escaneado (uma folha por página). As páginas são lidas uma
+    a uma e cada resultado é enviado (NDJSON) assim que fica pronto.
+    """
+    if file.filename.split(".")[-1].lower() != "pdf":
+        return JSONResponse(
+            status_code=400, content={"error": "Envie um arquivo .pdf."}
+        )
+    if (file.size or 0) > TAMANHO_MAXIMO_UPLOAD:
+        return resposta_upload_grande()
+    try:
+        layout_folha = carregar_layout(layout)
+        ano, dia = int(year), int(day)
+    except LayoutDesconhecido as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except ValueError:
+        return JSONResponse(
+            status_code=400, content={"error": "Ano e dia devem ser números."}
+        )
+    if dia not in (1, 2):
+        return JSONResponse(
+            status_code=400, content={"error": "O dia da prova deve ser 1 ou 2."}
+        )
+
+    questoes = await repositorio_gabaritos.obter(ano, language, dia)
+    if not questoes:
+        return JSONResponse(
+            status_code=502,
+            content={"error": "Não foi possível obter o gabarito oficial."},
+        )
+
+    # Cópia em disco (em blocos): o upload é fechado antes do fim do streaming.
+    caminho_pdf = os.path.join(UPLOADS_DIR, f"{uuid.uuid4()}.pdf")
+    if not await asyncio.to_thread(gravar_upload, file.file, caminho_pdf):
+        return resposta_upload_grande()
+    # Aberto antes de responder: um PDF inválido é um 400, não um stream cortado.
+    try:
+        paginas = await asyncio.to_thread(paginas_pdf, caminho_pdf)
+    except PdfInvalido as e:
+        os.remove(caminho_pdf)
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    prova = (year, day, language, layout_folha, questoes)
+    return StreamingResponse(
+        corrigir_paginas_pdf(caminho_pdf, paginas, prova),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/jobs/", status_code=202)
+async def criar_job(
+    files: List[UploadFile] = File(...),
+    day: str = Form(...),
+    year: str = Form(...),
+    language: str = Form(...),
+    layout: str = Form(LAYOUT_PADRAO),
+):
+    """
+    Enfileira a correção de imagens, .zip ou .pdf e responde na hora com o id
+    do job; o andamento e os resultados parciais ficam em /jobs/{job_id}.
+    """
+    try:
+        carregar_layout(layout)
+        dia = int(day)
+        int(year)
+    except LayoutDesconhecido as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except ValueError:
+        return JSONResponse(
+            status_code=400, content={"error": "Ano e dia devem ser números."}
+        )
+    if dia not in (1, 2):
+        return JSONResponse(
+            status_code=400, content={"error": "O dia da prova deve ser 1 ou 2."}
+        )
+
+    try:
+        job_id = await fila_jobs.criar(
+            [(file.filename, file.file) for file in files],
+            {"year": year, "day": day, "language": language, "layout": layout},
+        )
+    except LoteGrandeDemais as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "estado": "na_fila", "status": f"/jobs/{job_id}"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def status_job(job_id: str):
+    """Progresso, resultados por folha e erros de um job."""
+    status = fila_jobs.status(job_id)
+    if status is None:
+        return JSONResponse(
+            status_code=404, content={"error": f"Job '{job_id}' não encontrado."}
+        )
+    return JSONResponse(status)
+
+
+@app.get("/health")
+async def health():
+    """
+    Motores de leitura disponíveis e estado do pool de OCR. Sem Tesseract a
+    API continua corrigindo folhas com marcadores ("degradado").
+    """
+    motores = await asyncio.to_thread(estado_motores)
+    pool = pool_ocr.estatisticas()
+    iniciado = pool_ocr.iniciado
+    if not iniciado:
+        status, codigo = "indisponivel", 503
+    elif not motores["tesseract"]["disponivel"]:
+        status, codigo = "degradado", 200
+    else:
+        status, codigo = "ok", 200
+    return JSONResponse(
+        status_code=codigo,
+        content={
+            "status": status,
+            "motores": motores,
+            "pool_ocr": {
+                "iniciado": iniciado,
+                "workers": pool["workers"],
+                "pendentes": pool["pendentes"],
+            },
+        },
+    )
+
+
+@app.get("/layouts/")
+def layouts_disponiveis():
+    """Versões de folha de respostas cadastradas em backend/layouts/."""
+    return JSONResponse({"padrao": LAYOUT_PADRAO, "layouts": listar_layouts()})
+
+
+@app.get("/ocr/estatisticas/")
+def estatisticas_ocr():
+    """Tempo de espera na fila x tempo de processamento do pool de OCR."""
+    return JSONResponse(pool_ocr.estatisticas())
+
+
 @app.get("/resumo_historico/")
-def resumo_historico():
+def resumo_historico(
+    formato: str = "texto",
+    turma: Optional[str] = None,
+    ano: Optional[str] = None,
+    dia: Optional[str] = None,
+    codigo_aluno: Optional[str] = None,
+    apos: int = 0,
+    limite: int = 100,
+):
+    """
+    Sem parâmetros, o resumo em texto de sempre. Com `formato=ndjson` ou
+    `formato=csv`, uma página do histórico em streaming, filtrada por turma,
+    ano, dia e/ou aluno; a próxima página vem no cabeçalho X-Proximo-Cursor
+    (passe-o em `apos`).
+    """
+    if formato in ("ndjson", "csv"):
+        filtros = dict(turma=turma, ano=ano, dia=dia, codigo_aluno=codigo_aluno)
+        limite = min(max(1, limite), LIMITE_PAGINA_MAXIMO)
+        cabecalhos = {}
+        proximo = banco_alunos.proximo_cursor(apos, limite, **filtros)
+        if proximo is not None:
+            cabecalhos["X-Proximo-Cursor"] = str(proximo)
+
+        linhas = banco_alunos.percorrer_historico(apos, limite, **filtros)
+        if formato == "csv":
+            return StreamingResponse(
+                gerar_csv(linhas, COLUNAS_HISTORICO),
+                media_type="text/csv",
+                headers=cabecalhos,
+            )
+        return StreamingResponse(
+            gerar_ndjson(linhas), media_type="application/x-ndjson", headers=cabecalhos
+        )
+    if formato != "texto":
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Formato inválido. Use texto, ndjson ou csv."},
+        )
+
     try:
-        alunos_db = carregar_dados_alunos()
         resumo_list = []
 
-        for codigo, aluno in alunos_db.items():
-            nome = aluno.get("nome", "Não cadastrado")
-            historico = aluno.get("historico", [])
-
+        for codigo, nome, historico in banco_alunos.alunos_com_historico():
             resumo_list.append(f"{codigo} - {nome}")
 
             if not historico:
@@ -178,16 +945,12 @@ def resumo_historico():
                 continue
 
             for correcao in historico:
-                # tenta pegar do novo formato
-                detalhes = correcao.get("detalhes_prova", {})
-                analise = correcao.get("analise", {})
-
-                ano = detalhes.get("ano", "?")
-                dia = detalhes.get("dia", "?")
-                idioma = detalhes.get("idioma", "?")
+                ano = correcao["ano"] or "?"
+                dia = correcao["dia"] or "?"
+                idioma = correcao["idioma"] or "?"
 
-                acertos = analise.get("acertos", 0)
-                total_questoes = analise.get("total_questoes", 0)
+                acertos = correcao["acertos"] or 0
+                total_questoes = correcao["total_questoes"] or 0
 
                 resumo_list.append(
                     f"   Ano: {ano} | Dia: {dia} | Idioma: {idioma} → {acertos} / {total_questoes}"
@@ -202,3 +965,134 @@ def resumo_historico():
             content={"error": "Erro ao gerar resumo do histórico.", "details": str(e)},
         )
 
+
+FORMATOS_EXPORTACAO = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+
+def exportar(
+    formato, nome, gerar_linhas, achatar, colunas, colunas_pdf, titulo, filtros
+):
+    """
+    Resposta em streaming de um relatório. A exportação vai até a correção
+    mais recente no momento da consulta, cujo id no histórico é devolvido em
+    X-Exportado-Ate: quem consulta periodicamente o passa em `desde` na
+    próxima vez e recebe só o que foi registrado depois.
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Formato inválido. Use csv, json, ndjson ou pdf."},
+        )
+    ate = banco_alunos.ultima_correcao(**filtros)
+    cabecalhos = {"X-Exportado-Ate": str(ate or filtros.get("desde") or "")}
+    if ate is None and filtros.get("desde") is not None:
+        # Nada novo desde a última exportação.
+        linhas = iter(())
+    else:
+        linhas = gerar_linhas(**filtros, ate=ate)
+
+    media_type, extensao = FORMATOS_EXPORTACAO[formato]
+    cabecalhos["Content-Disposition"] = f'attachment; filename="{nome}.{extensao}"'
+    if formato == "csv":
+        corpo = gerar_csv(map(achatar, linhas), colunas)
+    elif formato == "pdf":
+        corpo = gerar_pdf(titulo, colunas_pdf, map(achatar, linhas))
+    elif formato == "json":
+        corpo = gerar_json(linhas)
+    else:
+        corpo = gerar_ndjson(linhas)
+    return StreamingResponse(corpo, media_type=media_type, headers=cabecalhos)
+
+
+@app.get("/exportar/alunos/")
+def exportar_alunos(
+    formato: str = "csv",
+    turma: Optional[str] = None,
+    ano: Optional[str] = None,
+    dia: Optional[str] = None,
+    codigo_aluno: Optional[str] = None,
+    desde: Optional[int] = None,
+):
+    """
+    Uma linha por correção: acertos, acertos por área e questões erradas.
+    `desde` (o X-Exportado-Ate de uma exportação anterior) exporta só as
+    correções registradas depois dela.
+    """
+    filtros = dict(
+        turma=turma, ano=ano, dia=dia, codigo_aluno=codigo_aluno, desde=desde
+    )
+    return exportar(
+        formato,
+        "resultados_alunos",
+        banco_alunos.percorrer_correcoes,
+        achatar_correcao,
+        COLUNAS_ALUNOS,
+        COLUNAS_PDF_ALUNOS,
+        "Resultados por aluno",
+        filtros,
+    )
+
+
+@app.get("/exportar/turmas/")
+def exportar_turmas(
+    formato: str = "csv",
+    turma: Optional[str] = None,
+    ano: Optional[str] = None,
+    dia: Optional[str] = None,
+    desde: Optional[int] = None,
+):
+    """
+    Uma linha por turma e prova: média, extremos, média por área e as
+    questões mais erradas. Com `desde`, só as correções posteriores contam.
+    """
+    filtros = dict(turma=turma, ano=ano, dia=dia, desde=desde)
+    return exportar(
+        formato,
+        "resultados_turmas",
+        banco_alunos.resumo_turmas,
+        achatar_turma,
+        COLUNAS_TURMAS,
+        COLUNAS_PDF_TURMAS,
+        "Resultados por turma",
+        filtros,
+    )
+
+
+@app.get("/cache/estatisticas/")
+def estatisticas_cache():
+    """Acertos e faltas do cache de resultados por conteúdo da imagem."""
+    return JSONResponse(
+        {
+            **cache_resultados.estatisticas(),
+            "overlays": repositorio_overlays.estatisticas(),
+        }
+    )
+
+
+@app.get("/resumo_historico/agregados/")
+def agregados_historico(ano: Optional[str] = None, dia: Optional[str] = None):
+    """Média e distribuição de acertos por prova, mantidas a cada correção."""
+    return JSONResponse({"provas": banco_alunos.agregados(ano, dia)})
+
+
+@app.get("/metrics")
+def exportar_metricas():
+    """Histogramas das etapas, contadores de resultado e medidores (Prometheus)."""
+    if not metricas.METRICAS:
+        return JSONResponse(
+            status_code=404, content={"error": "Métricas desativadas (METRICAS=0)."}
+        )
+    return PlainTextResponse(
+        metricas.exportar(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/gabaritos/estatisticas/")
+def estatisticas_gabaritos():
+    """Latência das consultas ao repositório de gabaritos, fria (api) e quente."""
+    return JSONResponse(repositorio_gabaritos.estatisticas())
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação leve das etapas da correção, exposta em /metrics no formato
+texto do Prometheus, sem dependências externas.
+
+As etapas que rodam nos workers do pool de OCR são acumuladas no próprio
+worker e devolvidas junto com o resultado (ver pool_ocr._executar), para
+serem somadas às métricas do processo principal.
+
+Com METRICAS=0 nada é medido: `medir` devolve um contexto vazio,
+`cronometrar` devolve a função original e os contadores retornam na hora.
+"""
+
+import contextlib
+import functools
+import os
+import threading
+import time
+
+METRICAS = os.environ.get("METRICAS", "1").lower() not in ("0", "false", "nao")
+PREFIXO = "ocr_enem_"
+BALDES_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metricas = {}
+# Nos workers do pool vira uma lista de observações a devolver ao processo
+# principal; no processo principal fica None e as métricas são atualizadas na hora.
+_envio = None
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = PREFIXO + nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _metricas[self.nome] = self
+
+    def _registrar(self, rotulos, valor):
+        chave = tuple(str(rotulos[nome]) for nome in self.rotulos)
+        if _envio is not None:
+            _envio.append((self.nome, chave, valor))
+        else:
+            self._aplicar(chave, valor)
+
+    def _aplicar(self, chave, valor):
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _linhas(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            yield f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+
+    def exportar(self):
+        cabecalho = [
+            f"# HELP {self.nome} {self.descricao}",
+            f"# TYPE {self.nome} {self.tipo}",
+        ]
+        return "\n".join(cabecalho + list(self._linhas()))
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, valor=1, **rotulos):
+        if METRICAS:
+            self._registrar(rotulos, valor)
+
+
+class Medidor(_Metrica):
+    """Gauge; com `funcao`, o valor é lido dela no momento da exportação."""
+
+    tipo = "gauge"
+
+    def __init__(self, nome, descricao, rotulos=(), funcao=None):
+        super().__init__(nome, descricao, rotulos)
+        self.funcao = funcao
+
+    def incrementar(self, valor=1, **rotulos):
+        if METRICAS:
+            self._registrar(rotulos, valor)
+
+    def decrementar(self, valor=1, **rotulos):
+        self.incrementar(-valor, **rotulos)
+
+    def _linhas(self):
+        if self.funcao is not None:
+            yield f"{self.nome} {_formatar_numero(self.funcao())}"
+            return
+        yield from super()._linhas()
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, descricao, rotulos=(), baldes=BALDES_PADRAO):
+        super().__init__(nome, descricao, rotulos)
+        self.baldes = tuple(sorted(baldes)) + (float("inf"),)
+
+    def observar(self, valor, **rotulos):
+        if METRICAS:
+            self._registrar(rotulos, valor)
+
+    def _aplicar(self, chave, valor):
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                # [contagem por balde (não acumulada), soma, total]
+                estado = self._valores[chave] = [[0] * len(self.baldes), 0.0, 0]
+            for i, limite in enumerate(self.baldes):
+                if valor <= limite:
+                    estado[0][i] += 1
+                    break
+            estado[1] += valor
+            estado[2] += 1
+
+    def _linhas(self):
+        with self._lock:
+            itens = sorted(
+                (chave, [list(e[0]), e[1], e[2]]) for chave, e in self._valores.items()
+            )
+        for chave, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.baldes, contagens):
+                acumulado += contagem
+                le = f'le="{_formatar_numero(limite)}"'
+                yield f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {acumulado}"
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            yield f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}"
+            yield f"{self.nome}_count{rotulos} {total}"
+
+
+ETAPAS = Histograma(
+    "etapa_segundos",
+    "Duração de cada etapa da correção (decodificação, registro, busca das âncoras, OCR, leitura das bolhas, API, banco).",
+    ["etapa"],
+)
+REQUISICOES = Histograma(
+    "requisicao_segundos",
+    "Duração das requisições HTTP até o início da resposta.",
+    ["rota", "status"],
+)
+EM_ANDAMENTO = Medidor("requisicoes_em_andamento", "Requisições HTTP sendo atendidas.")
+FOLHAS = Contador(
+    "folhas_total",
+    "Folhas processadas por resultado (corrigida, em_cache, codigo_ilegivel, "
+    "respostas_ilegiveis, imagem_invalida, aluno_nao_encontrado, erro).",
+    ["resultado"],
+)
+REGISTRO = Contador(
+    "registro_total",
+    "Registro da folha no layout por método (marcadores, ancoras ou falhou: sem marcadores nem âncoras).",
+    ["metodo"],
+)
+ANCORAS = Contador(
+    "ancoras_total",
+    "Buscas de âncora de texto pela faixa em que foram achadas (janela_aprendida, "
+    "faixa_superior, metade_superior, pagina_inteira ou nao_encontrada).",
+    ["faixa"],
+)
+
+
+class _Cronometro:
+    __slots__ = ("etapa", "inicio")
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        ETAPAS.observar(time.perf_counter() - self.inicio, etapa=self.etapa)
+        return False
+
+
+_NULO = contextlib.nullcontext()
+
+
+def medir(etapa):
+    """`with medir("registro"): ...` observa a duração do bloco na etapa."""
+    return _Cronometro(etapa) if METRICAS else _NULO
+
+
+def cronometrar(etapa):
+    """Decorador equivalente a `medir` para a função inteira."""
+
+    def decorador(funcao):
+        if not METRICAS:
+            return funcao
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with _Cronometro(etapa):
+                return funcao(*args, **kwargs)
+
+        return medida
+
+    return decorador
+
+
+def ativar_envio():
+    """Chamado no worker do pool: as observações passam a ser devolvidas por `drenar`."""
+    global _envio
+    _envio = []
+
+
+def drenar():
+    """Observações acumuladas no worker desde a última chamada."""
+    if not _envio:
+        return []
+    observacoes = list(_envio)
+    _envio.clear()
+    return observacoes
+
+
+def incorporar(observacoes):
+    """Soma às métricas deste processo as observações vindas de um worker."""
+    for nome, chave, valor in observacoes:
+        _metricas[nome]._aplicar(chave, valor)
+
+
+def exportar():
+    """Todas as métricas no formato texto do Prometheus (versão 0.0.4)."""
+    return "\n".join(metrica.exportar() for metrica in _metricas.values()) + "\n"
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de correção vetorizado.
+
+As respostas de uma ou mais folhas viram uma matriz (alunos × questões do
+dia) de códigos inteiros e a correção inteira é feita em NumPy: acertos por
+aluno e por área, questões erradas, taxa de acerto e distribuição das
+alternativas marcadas em cada questão. Uma turma é corrigida em milissegundos.
+"""
+
+import numpy as np
+
+import metricas
+
+ALTERNATIVAS = ("A", "B", "C", "D", "E")
+QUESTOES_POR_DIA = 90
+# Códigos da matriz: 0..4 = A..E; "*" (mais de uma bolha) é marcação múltipla
+# e qualquer outra marcação ("X", "?") é branco.
+BRANCO = -1
+# Questão cujo gabarito não veio da API: nenhuma resposta confere.
+SEM_GABARITO = -2
+MULTIPLA = -3
+LETRA_MULTIPLA = "*"
+
+AREAS = ("Linguagens", "Ciências Humanas", "Ciências da Natureza", "Matemática")
+# Áreas de cada dia pela posição da questão na folha (início, fim), no
+# formato da prova desde 2017.
+AREAS_POR_DIA = {
+    1: (("Linguagens", 0, 45), ("Ciências Humanas", 45, 90)),
+    2: (("Ciências da Natureza", 0, 45), ("Matemática", 45, 90)),
+}
+# De 2009 a 2016 o 1º dia era Humanas e Natureza; o 2º, Linguagens e Matemática.
+ULTIMO_ANO_FORMATO_ANTIGO = 2016
+AREAS_POR_DIA_ATE_2016 = {
+    1: (("Ciências Humanas", 0, 45), ("Ciências da Natureza", 45, 90)),
+    2: (("Linguagens", 0, 45), ("Matemática", 45, 90)),
+}
+
+
+def areas_por_dia(ano=None):
+    """Áreas de cada dia no formato da prova de `ano` (sem ano: o atual)."""
+    if ano is not None and int(ano) <= ULTIMO_ANO_FORMATO_ANTIGO:
+        return AREAS_POR_DIA_ATE_2016
+    return AREAS_POR_DIA
+
+
+def codificar_respostas(respostas, largura=QUESTOES_POR_DIA):
+    """Listas de letras (uma por folha) -> matriz int8 (folhas × largura)."""
+    letras = np.full((len(respostas), largura), "", dtype="U1")
+    for i, linha in enumerate(respostas):
+        linha = [str(letra).upper() for letra in list(linha)[:largura]]
+        letras[i, : len(linha)] = linha
+    matriz = np.full(letras.shape, BRANCO, dtype=np.int8)
+    for codigo, letra in enumerate(ALTERNATIVAS):
+        matriz[letras == letra] = codigo
+    matriz[letras == LETRA_MULTIPLA] = MULTIPLA
+    return matriz
+
+
+class GabaritoDia:
+    """
+    Gabarito oficial de um dia da prova em vetores, com as áreas do dia no
+    formato da prova de `ano` (ver areas_por_dia).
+    As questões são casadas pelo número ("index"), aceitando tanto a prova
+    inteira quanto só o dia; uma questão ausente não conta acerto. Sem
+    "index", a lista é tomada como a prova inteira, na ordem.
+    """
+
+    def __init__(self, questoes, dia, ano=None):
+        dia = int(dia)
+        if dia not in AREAS_POR_DIA:
+            raise ValueError("O dia da prova deve ser 1 ou 2.")
+        inicio = (dia - 1) * QUESTOES_POR_DIA
+        numeros = range(inicio + 1, inicio + QUESTOES_POR_DIA + 1)
+        if questoes and all("index" in questao for questao in questoes):
+            por_numero = {questao["index"]: questao for questao in questoes}
+            questoes_dia = [por_numero.get(numero) for numero in numeros]
+            if not any(questoes_dia):
+                questoes_dia = []
+            questoes_dia = [
+                questao or {"index": numero, "correct": None}
+                for numero, questao in zip(numeros, questoes_dia)
+            ]
+        else:
+            questoes_dia = questoes[inicio : inicio + QUESTOES_POR_DIA]
+        corretas = [questao.get("correct") for questao in questoes_dia]
+
+        self.dia = dia
+        self.areas_dia = areas_por_dia(ano)[dia]
+        self.corretas = np.array(
+            [
+                ALTERNATIVAS.index(c) if c in ALTERNATIVAS else SEM_GABARITO
+                for c in corretas
+            ],
+            dtype=np.int8,
+        )
+        self.anuladas = np.array([c == "Anulado" for c in corretas], dtype=bool)
+        self.numeros = np.array(
+            [
+                questao.get("index", inicio + i + 1)
+                for i, questao in enumerate(questoes_dia)
+            ],
+            dtype=np.int32,
+        )
+
+    def __len__(self):
+        return len(self.corretas)
+
+    def areas(self, total_questoes):
+        """(nome, início, fim) das áreas com ao menos uma questão corrigida."""
+        return [
+            (nome, inicio, min(fim, total_questoes))
+            for nome, inicio, fim in self.areas_dia
+            if inicio < total_questoes
+        ]
+
+
+class CorrecaoTurma:
+    """Resultado de `corrigir_turma`: matrizes de respostas e de acertos."""
+
+    def __init__(self, matriz, acertos, gabarito):
+        self.matriz = matriz
+        self.acertos = acertos
+        self.gabarito = gabarito
+        self.total_questoes = acertos.shape[1]
+        self.areas = gabarito.areas(self.total_questoes)
+        self.acertos_aluno = acertos.sum(axis=1)
+        if self.areas:
+            self.acertos_area = np.add.reduceat(
+                acertos, [inicio for _, inicio, _ in self.areas], axis=1
+            )
+        else:
+            self.acertos_area = np.zeros((len(acertos), 0), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.matriz)
+
+    def analise_aluno(self, i):
+        """Entrada "analise" do histórico para a folha `i`."""
+        numeros = self.gabarito.numeros[: self.total_questoes]
+        erradas = ~self.acertos[i]
+        return {
+            "acertos": int(self.acertos_aluno[i]),
+            "total_questoes": self.total_questoes,
+            "por_area": [
+                {"area": nome, "acertos": int(acertos), "total_questoes": fim - inicio}
+                for (nome, inicio, fim), acertos in zip(
+                    self.areas, self.acertos_area[i]
+                )
+            ],
+            "questoes_erradas": numeros[erradas].tolist(),
+            "questoes_em_branco": numeros[self.matriz[i] == BRANCO].tolist(),
+            "questoes_com_dupla_marcacao": numeros[self.matriz[i] == MULTIPLA].tolist(),
+        }
+
+    def distribuicao_alternativas(self):
+        """Contagem (questões × 7): coluna 0 = branco, 1..5 = A..E, 6 = múltipla."""
+        questoes = self.total_questoes
+        colunas = np.where(self.matriz == MULTIPLA, 6, self.matriz.astype(np.intp) + 1)
+        indices = colunas + 7 * np.arange(questoes)
+        return np.bincount(indices.ravel(), minlength=7 * questoes).reshape(questoes, 7)
+
+    def estatisticas(self):
+        """Médias da turma, por área e por questão (taxa de acerto e distratores)."""
+        alunos = len(self)
+        if not alunos:
+            return {"alunos": 0}
+        distribuicao = self.distribuicao_alternativas()
+        taxas = self.acertos.mean(axis=0)
+        area_da_questao = {}
+        for nome, inicio, fim in self.areas:
+            area_da_questao.update(dict.fromkeys(range(inicio, fim), nome))
+
+        questoes = []
+        for j in range(self.total_questoes):
+            correta = self.gabarito.corretas[j]
+            questoes.append(
+                {
+                    "numero": int(self.gabarito.numeros[j]),
+                    "area": area_da_questao.get(j),
+                    "correta": (
+                        "Anulado"
+                        if self.gabarito.anuladas[j]
+                        else ALTERNATIVAS[correta] if correta >= 0 else None
+                    ),
+                    "taxa_acerto": round(float(taxas[j]), 4),
+                    "alternativas": dict(
+                        zip(ALTERNATIVAS, distribuicao[j, 1:6].tolist())
+                    ),
+                    "em_branco": int(distribuicao[j, 0]),
+                    "dupla_marcacao": int(distribuicao[j, 6]),
+                }
+            )
+        return {
+            "alunos": alunos,
+            "media_acertos": round(float(self.acertos_aluno.mean()), 2),
+            "total_questoes": self.total_questoes,
+            "por_area": [
+                {
+                    "area": nome,
+                    "media_acertos": round(float(self.acertos_area[:, k].mean()), 2),
+                    "total_questoes": fim - inicio,
+                }
+                for k, (nome, inicio, fim) in enumerate(self.areas)
+            ],
+            "questoes": questoes,
+        }
+
+
+@metricas.cronometrar("correcao")
+def corrigir_turma(respostas, gabarito):
+    """
+    Corrige todas as folhas de uma vez. `respostas` é uma lista de listas de
+    letras ou uma matriz já codificada; `gabarito` é um GabaritoDia.
+    """
+    if not isinstance(respostas, np.ndarray):
+        respostas = codificar_respostas(respostas)
+    total = min(respostas.shape[1], len(gabarito))
+    matriz = respostas[:, :total]
+    acertos = (matriz == gabarito.corretas[:total]) | gabarito.anuladas[:total]
+    return CorrecaoTurma(matriz, acertos, gabarito)
+
+
+def _medir_turma(alunos=1000, repeticoes=20):
+    import time
+
+    rng = np.random.default_rng(0)
+    questoes = [
+        {"index": i + 1, "correct": ALTERNATIVAS[rng.integers(5)]} for i in range(180)
+    ]
+    gabarito = GabaritoDia(questoes, 1)
+    matriz = rng.integers(-1, 5, size=(alunos, QUESTOES_POR_DIA)).astype(np.int8)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        correcao = corrigir_turma(matriz, gabarito)
+        correcao.estatisticas()
+    decorrido = (time.perf_counter() - inicio) * 1000 / repeticoes
+    print(f"✅ {alunos} alunos corrigidos (com estatísticas) em {decorrido:.2f} ms")
+
+
+if __name__ == "__main__":
+    _medir_turma()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Motores de OCR para as âncoras de texto da folha.
+
+Com o tesserocr instalado (pip install tesserocr), cada processo mantém uma
+instância da API C do Tesseract com o modelo `por` já carregado e passa a
+imagem direto da memória. Sem ele, usa o pytesseract, que a cada chamada
+grava a imagem em disco e executa o binário do Tesseract.
+
+MOTOR_OCR escolhe o motor: auto (padrão: tesserocr se houver), tesserocr
+ou pytesseract. Os dois devolvem palavras no mesmo formato e aceitam uma
+região (x, y, largura, altura) para ler só um trecho da imagem e uma lista
+de caracteres permitidos (tessedit_char_whitelist).
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from configuracao import TesseractIndisponivel, inicializar_tesseract
+
+MOTOR_OCR = os.environ.get("MOTOR_OCR", "auto").lower()
+IDIOMA_OCR = "por"
+
+_motor = None
+_lock_motor = threading.Lock()
+
+
+def _recortar(imagem, regiao):
+    """Recorte de `regiao` dentro da imagem e o deslocamento (x, y) dele."""
+    if regiao is None:
+        return imagem, 0, 0
+    x, y, largura, altura = (int(round(valor)) for valor in regiao)
+    altura_imagem, largura_imagem = imagem.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(largura_imagem, x + largura), min(altura_imagem, y + altura)
+    return imagem[y0:y1, x0:x1], x0, y0
+
+
+class MotorPytesseract:
+    nome = "pytesseract"
+
+    def __init__(self):
+        self.versao = inicializar_tesseract()
+
+    def ler_palavras(self, imagem, regiao=None, caracteres=None):
+        """
+        Palavras de uma imagem em cinza (uint8): dicts com texto, conf, left,
+        top, width e height em coordenadas da imagem inteira.
+        """
+        import pytesseract
+
+        recorte, x0, y0 = _recortar(imagem, regiao)
+        if recorte.size == 0:
+            return []
+        config = f"-c tessedit_char_whitelist={caracteres}" if caracteres else ""
+        dados = pytesseract.image_to_data(
+            recorte,
+            output_type=pytesseract.Output.DICT,
+            lang=IDIOMA_OCR,
+            config=config,
+        )
+        palavras = []
+        for i, texto in enumerate(dados["text"]):
+            if not texto or not texto.strip():
+                continue
+            palavras.append(
+                {
+                    "texto": texto,
+                    "conf": float(dados["conf"][i]),
+                    "left": int(dados["left"][i]) + x0,
+                    "top": int(dados["top"][i]) + y0,
+                    "width": int(dados["width"][i]),
+                    "height": int(dados["height"][i]),
+                }
+            )
+        return palavras
+
+
+class MotorTesserocr:
+    """API C do Tesseract carregada uma vez por processo (não é thread-safe)."""
+
+    nome = "tesserocr"
+
+    def __init__(self):
+        try:
+            import tesserocr
+        except ImportError as e:
+            raise TesseractIndisponivel("Pacote 'tesserocr' não instalado.") from e
+        self._tesserocr = tesserocr
+        try:
+            self._api = tesserocr.PyTessBaseAPI(lang=IDIOMA_OCR)
+        except RuntimeError as e:
+            raise TesseractIndisponivel(
+                f"tesserocr não conseguiu carregar o modelo '{IDIOMA_OCR}': {e}"
+            ) from e
+        self.versao = tesserocr.tesseract_version().split()[1]
+        self._lock = threading.Lock()
+
+    def ler_palavras(self, imagem, regiao=None, caracteres=None):
+        recorte, x0, y0 = _recortar(imagem, regiao)
+        if recorte.size == 0:
+            return []
+        recorte = np.ascontiguousarray(recorte, dtype=np.uint8)
+        altura, largura = recorte.shape[:2]
+        nivel = self._tesserocr.RIL.WORD
+
+        with self._lock:
+            # Sem arquivo temporário: o buffer vai direto para a API C.
+            self._api.SetImageBytes(recorte.tobytes(), largura, altura, 1, largura)
+            self._api.SetVariable("tessedit_char_whitelist", caracteres or "")
+            self._api.Recognize()
+            iterador = self._api.GetIterator()
+            palavras = []
+            if iterador is not None:
+                for palavra in self._tesserocr.iterate_level(iterador, nivel):
+                    texto = palavra.GetUTF8Text(nivel)
+                    caixa = palavra.BoundingBox(nivel)
+                    if not texto or not texto.strip() or caixa is None:
+                        continue
+                    esquerda, topo, direita, base = caixa
+                    palavras.append(
+                        {
+                            "texto": texto,
+                            "conf": float(palavra.Confidence(nivel)),
+                            "left": esquerda + x0,
+                            "top": topo + y0,
+                            "width": direita - esquerda,
+                            "height": base - topo,
+                        }
+                    )
+            self._api.Clear()
+        return palavras
+
+
+MOTORES = {"tesserocr": MotorTesserocr, "pytesseract": MotorPytesseract}
+
+
+def criar_motor(nome=MOTOR_OCR):
+    """Instancia o motor pedido; em "auto", o primeiro disponível."""
+    if nome != "auto":
+        if nome not in MOTORES:
+            raise ValueError(
+                f"MOTOR_OCR inválido: '{nome}'. Use auto, tesserocr ou pytesseract."
+            )
+        return MOTORES[nome]()
+    try:
+        return MotorTesserocr()
+    except TesseractIndisponivel:
+        return MotorPytesseract()
+
+
+def obter_motor():
+    """Motor do processo, criado na primeira leitura. TesseractIndisponivel se não houver."""
+    global _motor
+    if _motor is None:
+        with _lock_motor:
+            if _motor is None:
+                _motor = criar_motor()
+    return _motor
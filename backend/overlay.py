@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Overlay de depuração: a folha com o que os leitores encontraram desenhado.
+
+Os leitores não desenham nada; eles só deixam em `SheetContext.deteccoes`
+as âncoras, as bolhas (centros, raio e preenchimento) e as regiões lidas.
+Uma folha enviada com overlay=true ao /corrigir/ é guardada em OVERLAYS_DIR
+e o overlay só é desenhado quando pedido em /corrigir/{id}/overlay (em um
+worker do pool de OCR), ficando em disco para os próximos pedidos. Passando
+de OVERLAYS_MAXIMO folhas, as usadas há mais tempo são apagadas.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+from layout import carregar_layout
+
+OVERLAYS_DIR = os.environ.get("OVERLAYS_DIR", "overlays")
+OVERLAYS_MAXIMO = int(os.environ.get("OVERLAYS_MAXIMO", "200"))
+ID_VALIDO = re.compile(r"[0-9a-f]{32}")
+
+# Cores (BGR) do overlay.
+COR_REGIAO = (255, 0, 0)
+COR_ANCORA = (0, 0, 255)
+COR_MARCADA = (0, 200, 0)
+COR_MULTIPLA = (0, 140, 255)
+COR_VAZIA = (170, 170, 170)
+COR_DUVIDA = (0, 0, 255)
+
+
+class RepositorioOverlays:
+    """
+    Em `diretorio`, por folha: `<id>.img` (o arquivo enviado), `<id>.json`
+    (layout) e, depois do primeiro pedido, `<id>.jpg` (o overlay). O horário
+    de modificação do .json marca o último uso, para o despejo.
+    """
+
+    def __init__(self, diretorio=OVERLAYS_DIR, capacidade=OVERLAYS_MAXIMO):
+        self.diretorio = diretorio
+        self.capacidade = max(1, capacidade)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def gerar_id(conteudo, layout):
+        resumo = hashlib.sha256(conteudo)
+        resumo.update(f":{layout.nome}:v{layout.versao}".encode())
+        return resumo.hexdigest()[:32]
+
+    def _caminho(self, id_folha, extensao):
+        return os.path.join(self.diretorio, f"{id_folha}.{extensao}")
+
+    def _gravar(self, caminho, dados):
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+
+    def guardar(self, conteudo, layout):
+        """Guarda a folha enviada e devolve o id do overlay dela."""
+        id_folha = self.gerar_id(conteudo, layout)
+        with self._lock:
+            os.makedirs(self.diretorio, exist_ok=True)
+            if not os.path.exists(self._caminho(id_folha, "img")):
+                self._gravar(self._caminho(id_folha, "img"), conteudo)
+            self._gravar(
+                self._caminho(id_folha, "json"),
+                json.dumps({"layout": layout.nome}).encode("utf-8"),
+            )
+            self._despejar()
+        return id_folha
+
+    def folha(self, id_folha):
+        """(conteúdo, nome do layout) da folha guardada, ou None."""
+        if not ID_VALIDO.fullmatch(id_folha):
+            return None
+        try:
+            with open(self._caminho(id_folha, "json"), "r", encoding="utf-8") as f:
+                layout = json.load(f)["layout"]
+            with open(self._caminho(id_folha, "img"), "rb") as f:
+                return f.read(), layout
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def overlay(self, id_folha):
+        """JPEG do overlay já desenhado, ou None."""
+        if not ID_VALIDO.fullmatch(id_folha):
+            return None
+        try:
+            with open(self._caminho(id_folha, "jpg"), "rb") as f:
+                imagem = f.read()
+            os.utime(self._caminho(id_folha, "json"))
+        except OSError:
+            return None
+        return imagem
+
+    def guardar_overlay(self, id_folha, imagem):
+        with self._lock:
+            if os.path.exists(self._caminho(id_folha, "json")):
+                self._gravar(self._caminho(id_folha, "jpg"), imagem)
+                os.utime(self._caminho(id_folha, "json"))
+
+    def _despejar(self):
+        """Apaga as folhas (e overlays) menos usadas além da capacidade."""
+        ids = []
+        for nome in os.listdir(self.diretorio):
+            id_folha, _, extensao = nome.partition(".")
+            if extensao == "json" and ID_VALIDO.fullmatch(id_folha):
+                caminho = os.path.join(self.diretorio, nome)
+                ids.append((os.path.getmtime(caminho), id_folha))
+        ids.sort()
+        for _, id_folha in ids[: max(0, len(ids) - self.capacidade)]:
+            for extensao in ("json", "img", "jpg"):
+                try:
+                    os.remove(self._caminho(id_folha, extensao))
+                except FileNotFoundError:
+                    pass
+
+    def estatisticas(self):
+        if not os.path.isdir(self.diretorio):
+            return {"folhas": 0, "overlays": 0, "capacidade": self.capacidade}
+        extensoes = [nome.rsplit(".", 1)[-1] for nome in os.listdir(self.diretorio)]
+        return {
+            "folhas": extensoes.count("json"),
+            "overlays": extensoes.count("jpg"),
+            "capacidade": self.capacidade,
+        }
+
+
+def desenhar_overlay(contexto, layout):
+    """
+    Cópia da imagem da folha com as detecções de `contexto.deteccoes`: o
+    contorno do layout registrado, as âncoras, as regiões recortadas e as
+    bolhas (verde: marcada, laranja: marcação múltipla, cinza: em branco,
+    anel vermelho: leitura de baixa confiança).
+    """
+    import cv2
+    import numpy as np
+
+    from bolhas import MARCACAO_MULTIPLA, SEM_MARCACAO, classificar_marcacoes
+    from folha import CONFIANCA_MINIMA
+    from layout import projetar
+
+    imagem = contexto.imagem.copy()
+    espessura = max(1, round(contexto.formato[1] / 800))
+    deteccoes = contexto.deteccoes
+
+    homografia = contexto.registro(layout)
+    if homografia is not None:
+        cantos = projetar(
+            homografia,
+            np.array(
+                [
+                    [0, 0],
+                    [layout.largura, 0],
+                    [layout.largura, layout.altura],
+                    [0, layout.altura],
+                ],
+                dtype=np.float64,
+            ),
+        )
+        cv2.polylines(
+            imagem, [np.round(cantos).astype(np.int32)], True, COR_REGIAO, espessura
+        )
+    else:
+        cv2.putText(
+            imagem,
+            "Folha nao registrada no layout",
+            (20, 40 * espessura),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            espessura,
+            COR_ANCORA,
+            espessura,
+        )
+
+    for palavra in deteccoes.get("ancoras", {}).values():
+        x, y = palavra["left"], palavra["top"]
+        cv2.rectangle(
+            imagem,
+            (x, y),
+            (x + palavra["width"], y + palavra["height"]),
+            COR_ANCORA,
+            espessura,
+        )
+
+    for x, y, largura, altura in deteccoes.get("regioes", []):
+        cv2.rectangle(imagem, (x, y), (x + largura, y + altura), COR_REGIAO, espessura)
+    for x, y, raio in deteccoes.get("marcadas", []):
+        cv2.circle(imagem, (x, y), raio, COR_MARCADA, espessura)
+
+    for bolhas in deteccoes.get("bolhas", {}).values():
+        preenchimento = bolhas["preenchimento"]
+        escolhas, confianca = classificar_marcacoes(preenchimento, bolhas["limiar"])
+        centros = np.round(bolhas["centros"]).astype(np.int32)
+        raio = max(1, int(round(bolhas["raio"])))
+        for linha in np.ndindex(escolhas.shape):
+            escolha = int(escolhas[linha])
+            for opcao, (x, y) in enumerate(centros[linha]):
+                if escolha == MARCACAO_MULTIPLA:
+                    cor = COR_MULTIPLA
+                elif escolha == opcao:
+                    cor = COR_MARCADA
+                elif escolha == SEM_MARCACAO:
+                    cor = COR_VAZIA
+                else:
+                    continue
+                cv2.circle(imagem, (int(x), int(y)), raio, cor, espessura)
+            if confianca[linha] < CONFIANCA_MINIMA:
+                for x, y in centros[linha]:
+                    cv2.circle(
+                        imagem, (int(x), int(y)), raio + 2 * espessura, COR_DUVIDA, 1
+                    )
+    return imagem
+
+
+def renderizar_overlay(conteudo, layout):
+    """
+    Roda no worker: lê a folha de novo (os mesmos leitores da correção) e
+    devolve o overlay em JPEG. FolhaIlegivel se a imagem não abrir.
+    """
+    import cv2
+
+    from contexto_folha import SheetContext
+    from folha import FolhaIlegivel
+    from leitor_gabarito import extrair_respostas_gabarito
+    from roi_code import extrair_codigo_aluno_automatico
+
+    layout = carregar_layout(layout)
+    contexto = SheetContext.obter(conteudo)
+    if contexto is None:
+        raise FolhaIlegivel("Não foi possível abrir a imagem enviada.")
+    if contexto.registro(layout) is not None:
+        extrair_codigo_aluno_automatico(contexto, layout)
+        extrair_respostas_gabarito(contexto, layout)
+
+    imagem = desenhar_overlay(contexto, layout)
+    _, buffer = cv2.imencode(".jpg", imagem, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buffer.tobytes()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metricas
+from folha import ler_folha
+
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", os.cpu_count() or 1))
+OCR_FILA_MAXIMA = int(os.environ.get("OCR_FILA_MAXIMA", OCR_WORKERS * 4))
+
+
+class PoolSaturado(Exception):
+    """Todas as vagas da fila de OCR estão ocupadas."""
+
+
+def _inicializar_worker():
+    """
+    Executado uma vez em cada processo. O Tesseract não é testado aqui: só
+    na primeira folha que precisar das âncoras de texto.
+    """
+    metricas.ativar_envio()
+
+
+def _aquecer():
+    # Importa os leitores (OpenCV) no worker antes da primeira folha.
+    for modulo in ("leitor_gabarito", "roi_code"):
+        importlib.import_module(modulo)
+    return os.getpid()
+
+
+def _executar(funcao, args, enviado_em):
+    """
+    Roda no worker; o erro volta junto com os tempos e as etapas medidas no
+    worker para entrar nas métricas.
+    """
+    inicio = time.time()
+    inicio_computo = time.perf_counter()
+    resultado, erro = None, None
+    try:
+        resultado = funcao(*args)
+    except Exception as e:
+        erro = e
+    computo = time.perf_counter() - inicio_computo
+    return resultado, erro, inicio - enviado_em, computo, metricas.drenar()
+
+
+class PoolOCR:
+    """
+    Estágio de execução das leituras de folha em um pool de processos.
+
+    A fila é limitada em `fila_maxima` trabalhos (em execução + aguardando);
+    quando cheia, `executar` levanta PoolSaturado em vez de enfileirar.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, fila_maxima=OCR_FILA_MAXIMA):
+        self.workers = max(1, workers)
+        self.fila_maxima = max(self.workers, fila_maxima)
+        self._executor = None
+        self._vagas = None
+        self._pendentes = 0
+        self._metricas = {
+            "concluidos": 0,
+            "falhas": 0,
+            "rejeitados": 0,
+            "espera_total_s": 0.0,
+            "espera_max_s": 0.0,
+            "computo_total_s": 0.0,
+            "computo_max_s": 0.0,
+        }
+
+    async def iniciar(self):
+        """Cria os processos e espera todos subirem, para não pagar isso na 1ª folha."""
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_worker,
+        )
+        self._vagas = asyncio.Semaphore(self.fila_maxima)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self._executor, _aquecer)
+                for _ in range(self.workers)
+            ]
+        )
+        print(f"✅ Pool de OCR iniciado com {self.workers} processos")
+
+    def encerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def iniciado(self):
+        return self._executor is not None
+
+    @property
+    def saturado(self):
+        return self._pendentes >= self.fila_maxima
+
+    async def executar(self, funcao, *args, aguardar_vaga=False):
+        """
+        Executa `funcao(*args)` em um worker. Sem `aguardar_vaga`, falha com
+        PoolSaturado se a fila estiver cheia.
+        """
+        if self._executor is None:
+            raise RuntimeError("Pool de OCR não iniciado.")
+        if self.saturado and not aguardar_vaga:
+            self._metricas["rejeitados"] += 1
+            raise PoolSaturado("Fila de OCR cheia. Tente novamente em instantes.")
+
+        async with self._vagas:
+            self._pendentes += 1
+            try:
+                loop = asyncio.get_running_loop()
+                resultado, erro, espera, computo, observacoes = (
+                    await loop.run_in_executor(
+                        self._executor, _executar, funcao, args, time.time()
+                    )
+                )
+            except Exception:
+                self._metricas["falhas"] += 1
+                raise
+            finally:
+                self._pendentes -= 1
+
+        self._metricas["concluidos"] += 1
+        metricas.incorporar(observacoes)
+        metricas.ETAPAS.observar(espera, etapa="fila_ocr")
+        if erro is not None:
+            self._metricas["falhas"] += 1
+        self._metricas["espera_total_s"] += espera
+        self._metricas["espera_max_s"] = max(self._metricas["espera_max_s"], espera)
+        self._metricas["computo_total_s"] += computo
+        self._metricas["computo_max_s"] = max(self._metricas["computo_max_s"], computo)
+        if erro is not None:
+            raise erro
+        return resultado
+
+    async def ler_folha(self, imagem, layout, aguardar_vaga=False):
+        """`imagem`: conteúdo do arquivo (decodificado no worker) ou caminho."""
+        return await self.executar(
+            ler_folha, imagem, layout, aguardar_vaga=aguardar_vaga
+        )
+
+    def estatisticas(self) -> dict:
+        """Tempo de espera na fila x tempo de processamento dos trabalhos."""
+        m = self._metricas
+        concluidos = m["concluidos"]
+        return {
+            "workers": self.workers,
+            "fila_maxima": self.fila_maxima,
+            "pendentes": self._pendentes,
+            "concluidos": concluidos,
+            "falhas": m["falhas"],
+            "rejeitados": m["rejeitados"],
+            "espera_media_ms": (
+                round(m["espera_total_s"] * 1000 / concluidos, 2)
+                if concluidos
+                else None
+            ),
+            "espera_max_ms": round(m["espera_max_s"] * 1000, 2),
+            "computo_medio_ms": (
+                round(m["computo_total_s"] * 1000 / concluidos, 2)
+                if concluidos
+                else None
+            ),
+            "computo_max_ms": round(m["computo_max_s"] * 1000, 2),
+        }
+
+
+pool_ocr = PoolOCR()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Registro da folha pelos quadrados pretos impressos nas bordas da grade
+(marcadores fiduciais), sem OCR. O Tesseract fica só como alternativa
+quando os marcadores não são encontrados.
+"""
+
+import itertools
+
+import cv2
+import numpy as np
+
+# Largura máxima usada na busca dos marcadores; imagens maiores são reduzidas.
+LARGURA_REGISTRO = 1000
+
+ORDEM_CANTOS = (
+    "superior_esquerdo",
+    "superior_direito",
+    "inferior_direito",
+    "inferior_esquerdo",
+)
+
+
+def detectar_marcadores(cinza, lado_minimo, lado_maximo):
+    """
+    Centros (N, 2) das manchas quadradas e sólidas com o tamanho de um
+    marcador. A densidade (pixels pretos / área do retângulo mínimo) separa os
+    quadrados (~1.0) das bolhas preenchidas (~0.78) e de letras, em qualquer
+    rotação.
+    """
+    bloco = int(lado_maximo * 4) | 1
+    binaria = cv2.adaptiveThreshold(
+        cinza, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, bloco, 15
+    )
+    cnts, _ = cv2.findContours(binaria, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    centros = []
+    for c in cnts:
+        x, y, w, h = cv2.boundingRect(c)
+        if w < lado_minimo or h < lado_minimo or w > lado_maximo * 1.5:
+            continue
+        (cx, cy), (lado_a, lado_b), _ = cv2.minAreaRect(c)
+        if not (
+            lado_minimo <= min(lado_a, lado_b) and max(lado_a, lado_b) <= lado_maximo
+        ):
+            continue
+        if not 0.75 <= lado_a / lado_b <= 1.33:
+            continue
+        # O retângulo mínimo passa pelos centros dos pixels da borda: +1 em cada lado.
+        area = (lado_a + 1) * (lado_b + 1)
+        densidade = cv2.countNonZero(binaria[y : y + h, x : x + w]) / area
+        if densidade < 0.83:
+            continue
+        centros.append((cx, cy))
+    return np.array(centros, dtype=np.float32).reshape(-1, 2)
+
+
+def _candidatos_aos_cantos(centros, quantidade=3):
+    """Os `quantidade` marcadores mais extremos em cada canto (TL, TR, BR, BL)."""
+    soma = centros.sum(axis=1)
+    diferenca = centros[:, 0] - centros[:, 1]
+    return [
+        centros[np.argsort(soma)[:quantidade]],
+        centros[np.argsort(-diferenca)[:quantidade]],
+        centros[np.argsort(-soma)[:quantidade]],
+        centros[np.argsort(diferenca)[:quantidade]],
+    ]
+
+
+def _quadrilatero_plausivel(cantos, cantos_ref, tolerancia=0.15):
+    """Confere se os cantos detectados formam a grade esperada do layout."""
+    if not cv2.isContourConvex(cantos.reshape(-1, 1, 2)):
+        return False
+    if len({tuple(np.round(p, 1)) for p in cantos}) < 4:
+        return False
+
+    def proporcao(q):
+        largura = (np.linalg.norm(q[1] - q[0]) + np.linalg.norm(q[2] - q[3])) / 2
+        altura = (np.linalg.norm(q[3] - q[0]) + np.linalg.norm(q[2] - q[1])) / 2
+        return largura / altura if altura else 0
+
+    esperada = proporcao(cantos_ref)
+    return abs(proporcao(cantos) - esperada) <= tolerancia * esperada
+
+
+def _hipoteses(candidatos, cantos_ref):
+    """Homografias candidatas a partir de 4 (ou 3) marcadores de canto."""
+    for cantos in itertools.product(*candidatos):
+        yield cv2.getPerspectiveTransform(cantos_ref, np.float32(cantos))
+    for indices in itertools.combinations(range(4), 3):
+        indices = list(indices)
+        for cantos in itertools.product(*(candidatos[i] for i in indices)):
+            afim = cv2.getAffineTransform(cantos_ref[indices], np.float32(cantos))
+            yield np.vstack([afim, [0, 0, 1]])
+
+
+def registrar_por_marcadores(cinza, layout):
+    """
+    Homografia referencial do layout -> imagem a partir dos quatro marcadores
+    de canto da grade. Retorna None se os marcadores não forem confiáveis.
+    """
+    if not layout.marcadores:
+        return None
+
+    altura, largura = cinza.shape[:2]
+    fator = min(1.0, LARGURA_REGISTRO / largura)
+    reduzida = (
+        cv2.resize(
+            cinza,
+            (int(largura * fator), int(altura * fator)),
+            interpolation=cv2.INTER_AREA,
+        )
+        if fator < 1.0
+        else cinza
+    )
+
+    # Escala aproximada layout -> imagem reduzida, supondo a folha inteira na foto.
+    fator_ref = reduzida.shape[1] / layout.largura
+    lado_ref = layout.lado_marcador * fator_ref
+    centros = detectar_marcadores(reduzida, max(4, lado_ref * 0.4), lado_ref * 1.8)
+    if len(centros) < 4:
+        return None
+
+    cantos_ref = np.array(
+        [layout.marcadores[nome] for nome in ORDEM_CANTOS], dtype=np.float32
+    )
+    grade_ref = layout.grade_marcadores
+    tolerancia = lado_ref * 0.8
+
+    # Cada combinação dos marcadores mais extremos de cada canto é uma
+    # hipótese (perspectiva com os quatro cantos, ou afim com três, quando um
+    # canto se funde a uma marcação); vence a que projeta mais marcadores da
+    # grade do layout sobre marcadores detectados.
+    candidatos = _candidatos_aos_cantos(centros)
+    melhor = None
+    for homografia in _hipoteses(candidatos, cantos_ref):
+        projetados = cv2.perspectiveTransform(
+            np.float32([cantos_ref]), homografia
+        ).reshape(-1, 2)
+        if not _quadrilatero_plausivel(projetados, cantos_ref):
+            continue
+        projetados = cv2.perspectiveTransform(
+            grade_ref.reshape(-1, 1, 2), homografia
+        ).reshape(-1, 2)
+        distancias = np.linalg.norm(
+            projetados[:, None, :] - centros[None, :, :], axis=2
+        )
+        mais_proximos = distancias.argmin(axis=1)
+        inliers = distancias[np.arange(len(projetados)), mais_proximos] < tolerancia
+        if melhor is None or inliers.sum() > melhor[0].sum():
+            melhor = (inliers, mais_proximos)
+
+    if melhor is None:
+        return None
+    inliers, mais_proximos = melhor
+    # Um encaixe errado (grade deslocada) cobre bem menos da metade dos marcadores.
+    if inliers.sum() < max(4, len(grade_ref) // 2):
+        return None
+
+    # Refina com todos os marcadores da grade encontrados, não só os cantos.
+    origem = grade_ref[inliers].astype(np.float32)
+    destino = (centros[mais_proximos[inliers]] / fator).astype(np.float32)
+    homografia, _ = cv2.findHomography(origem, destino, 0)
+    return homografia
+
+
+def _erro_nas_bolhas(cinza, layout, homografia):
+    """
+    Distância média (px) entre os centros de bolha projetados pelo registro e
+    os contornos de bolha reais mais próximos. Usado só na avaliação.
+    """
+    _, binaria = cv2.threshold(cinza, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    cnts, _ = cv2.findContours(binaria, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    escala = float(np.sqrt(abs(np.linalg.det(homografia[:2, :2]))))
+    diametro = layout.raio_bolha * 2 * escala
+
+    reais = []
+    for c in cnts:
+        x, y, w, h = cv2.boundingRect(c)
+        if (
+            0.7 * diametro <= w <= 1.5 * diametro
+            and 0.7 * diametro <= h <= 1.5 * diametro
+        ):
+            m = cv2.moments(c)
+            if m["m00"]:
+                reais.append((m["m10"] / m["m00"], m["m01"] / m["m00"]))
+    if not reais:
+        return None
+    reais = np.array(reais)
+
+    projetados = cv2.perspectiveTransform(
+        layout.centros_respostas.reshape(-1, 1, 2), homografia
+    ).reshape(-1, 2)
+    distancias = np.linalg.norm(projetados[:, None, :] - reais[None, :, :], axis=2)
+    return float(distancias.min(axis=1).mean())
+
+
+if __name__ == "__main__":
+    import glob
+    import os
+    import sys
+    import time
+
+    from layout import carregar_layout
+
+    diretorio = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "imagens_teste"
+    )
+    caminhos = sys.argv[1:] or sorted(glob.glob(os.path.join(diretorio, "*.png")))
+    layout = carregar_layout()
+
+    print(f"{'imagem':<15}{'tempo (ms)':>12}{'erro médio (px)':>18}")
+    for caminho in caminhos:
+        cinza = cv2.cvtColor(cv2.imread(caminho), cv2.COLOR_BGR2GRAY)
+        tempos = []
+        for _ in range(10):
+            inicio = time.perf_counter()
+            homografia = registrar_por_marcadores(cinza, layout)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        if homografia is None:
+            print(f"{os.path.basename(caminho):<15}{min(tempos):>12.1f}{'FALHOU':>18}")
+            continue
+        erro = _erro_nas_bolhas(cinza, layout, homografia)
+        print(f"{os.path.basename(caminho):<15}{min(tempos):>12.1f}{erro:>18.2f}")
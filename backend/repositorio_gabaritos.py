@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+GABARITOS_DIR = os.environ.get("GABARITOS_DIR", "gabaritos")
+# Gabarito com questões que a API não encontrou ("provisoria"): fica só em
+# memória por este tempo e é buscado de novo depois.
+GABARITO_INCOMPLETO_TTL = int(os.environ.get("GABARITO_INCOMPLETO_TTL", "3600"))
+
+
+class RepositorioGabaritos:
+    """
+    Repositório dos gabaritos oficiais por (ano, idioma, dia).
+
+    O gabarito de uma prova nunca muda, então ele é buscado uma única vez pelo
+    `fetcher` (qualquer corrotina `fetcher(ano, idioma, dia) -> list`), gravado
+    em disco como JSON e mantido em um LRU em memória para as próximas correções.
+    Um gabarito com questões provisórias (404 na API) não vai para o disco e
+    expira da memória depois de `ttl_incompleto` segundos.
+    """
+
+    def __init__(
+        self,
+        fetcher,
+        diretorio=GABARITOS_DIR,
+        capacidade=32,
+        ttl_incompleto=GABARITO_INCOMPLETO_TTL,
+    ):
+        self.fetcher = fetcher
+        self.diretorio = diretorio
+        self.capacidade = capacidade
+        self.ttl_incompleto = ttl_incompleto
+        self._memoria = OrderedDict()
+        self._expira_em = {}
+        self._locks = {}
+        self._estatisticas = {
+            origem: {"chamadas": 0, "tempo_total_ms": 0.0}
+            for origem in ("memoria", "disco", "api")
+        }
+
+    @staticmethod
+    def _chave(ano, idioma, dia):
+        return (int(ano), str(idioma).lower(), int(dia))
+
+    def _caminho(self, chave):
+        ano, idioma, dia = chave
+        return os.path.join(self.diretorio, f"{ano}_{idioma}_dia{dia}.json")
+
+    def _registrar(self, origem, inicio):
+        decorrido_ms = (time.perf_counter() - inicio) * 1000
+        self._estatisticas[origem]["chamadas"] += 1
+        self._estatisticas[origem]["tempo_total_ms"] += decorrido_ms
+        return decorrido_ms
+
+    def _guardar_em_memoria(self, chave, questoes, expira_em=None):
+        self._memoria[chave] = questoes
+        self._memoria.move_to_end(chave)
+        if expira_em is None:
+            self._expira_em.pop(chave, None)
+        else:
+            self._expira_em[chave] = expira_em
+        while len(self._memoria) > self.capacidade:
+            antiga, _ = self._memoria.popitem(last=False)
+            self._expira_em.pop(antiga, None)
+
+    def _da_memoria(self, chave):
+        expira_em = self._expira_em.get(chave)
+        if expira_em is not None and expira_em < time.monotonic():
+            self._memoria.pop(chave, None)
+            del self._expira_em[chave]
+            return None
+        return self._memoria.get(chave)
+
+    def _ler_disco(self, chave):
+        caminho = self._caminho(chave)
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)["questoes"]
+
+    def _gravar_disco(self, chave, questoes):
+        os.makedirs(self.diretorio, exist_ok=True)
+        ano, idioma, dia = chave
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(
+                {"ano": ano, "idioma": idioma, "dia": dia, "questoes": questoes},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(temporario, caminho)
+
+    async def obter(self, ano, idioma, dia) -> list:
+        """Retorna as questões do dia, buscando na API só na primeira vez."""
+        chave = self._chave(ano, idioma, dia)
+        inicio = time.perf_counter()
+
+        questoes = self._da_memoria(chave)
+        if questoes is not None:
+            self._memoria.move_to_end(chave)
+            self._registrar("memoria", inicio)
+            return questoes
+
+        lock = self._locks.setdefault(chave, asyncio.Lock())
+        async with lock:
+            # Outra requisição pode ter preenchido o cache enquanto esperávamos.
+            questoes = self._da_memoria(chave)
+            if questoes is not None:
+                self._registrar("memoria", inicio)
+                return questoes
+
+            questoes = self._ler_disco(chave)
+            if questoes is not None:
+                self._guardar_em_memoria(chave, questoes)
+                decorrido = self._registrar("disco", inicio)
+                print(f"📁 Gabarito {chave} carregado do disco em {decorrido:.1f} ms")
+                return questoes
+
+            questoes = await self.fetcher(*chave)
+            decorrido = self._registrar("api", inicio)
+            print(f"🌐 Gabarito {chave} buscado na API em {decorrido:.1f} ms")
+
+            # Falhas não são persistidas: a próxima correção tenta de novo.
+            if questoes and any(questao.get("provisoria") for questao in questoes):
+                print(
+                    f"AVISO: gabarito {chave} incompleto; guardado só em memória "
+                    f"por {self.ttl_incompleto} s."
+                )
+                self._guardar_em_memoria(
+                    chave, questoes, time.monotonic() + self.ttl_incompleto
+                )
+            elif questoes:
+                self._gravar_disco(chave, questoes)
+                self._guardar_em_memoria(chave, questoes)
+            return questoes
+
+    def invalidar(self, ano, idioma, dia):
+        """Remove o gabarito da memória e do disco (ex.: gabarito retificado)."""
+        chave = self._chave(ano, idioma, dia)
+        self._memoria.pop(chave, None)
+        self._expira_em.pop(chave, None)
+        caminho = self._caminho(chave)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    def estatisticas(self) -> dict:
+        """Latência média separada por origem: frio (api) e quente (memoria/disco)."""
+        resumo = {}
+        for origem, dados in self._estatisticas.items():
+            chamadas = dados["chamadas"]
+            resumo[origem] = {
+                "chamadas": chamadas,
+                "latencia_media_ms": (
+                    round(dados["tempo_total_ms"] / chamadas, 3) if chamadas else None
+                ),
+            }
+        resumo["em_memoria"] = len(self._memoria)
+        return resumo
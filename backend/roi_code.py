@@ -1,20 +1,12 @@
 # -*- coding: utf-8 -*-
 import cv2
-import pytesseract
-import re
 import numpy as np
 from imutils import contours
-import unicodedata
 
-try:
-    pytesseract.pytesseract.tesseract_cmd = (
-        r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-    )
-    pytesseract.get_tesseract_version()
-except Exception as e:
-    print("ERRO: Tesseract não encontrado ou o caminho está incorreto.")
-    print("Verifique o caminho na variável 'pytesseract.pytesseract.tesseract_cmd'.")
-    exit()
+import metricas
+from bolhas import SEM_MARCACAO, classificar_marcacoes, medias_por_bolha
+from contexto_folha import SheetContext
+from layout import LAYOUT_PADRAO, carregar_layout
 
 
 def detectar_codigo_por_bolhas(roi_gabarito):
@@ -22,9 +14,11 @@ def detectar_codigo_por_bolhas(roi_gabarito):
     ### ALTERAÇÃO ###
     Versão modificada para usar valores dinâmicos baseados no tamanho da ROI,
     tornando a detecção de bolhas e colunas mais robusta.
+    Devolve o código e as bolhas marcadas (x, y, raio) nas coordenadas da ROI.
     """
+    marcadas = []
     if roi_gabarito is None or roi_gabarito.size == 0:
-        return "", roi_gabarito
+        return "", marcadas
 
     LIMIAR_DE_PREENCHIMENTO = 90.0
     roi_h, roi_w, _ = roi_gabarito.shape
@@ -54,7 +48,7 @@ def detectar_codigo_por_bolhas(roi_gabarito):
             bolhas_validas.append(c)
 
     if not bolhas_validas:
-        return "", roi_gabarito
+        return "", marcadas
 
     bolhas_validas = contours.sort_contours(bolhas_validas, method="left-to-right")[0]
     colunas = []
@@ -77,18 +71,13 @@ def detectar_codigo_por_bolhas(roi_gabarito):
     for idx, coluna_cnts in enumerate(colunas[:2]):
         coluna_cnts = contours.sort_contours(coluna_cnts, method="top-to-bottom")[0]
 
-        medias_intensidade = []
+        circulos = []
         for c in coluna_cnts:
-            mask = np.zeros(img_cinza_invertida.shape, dtype="uint8")
             (x, y, w, h) = cv2.boundingRect(c)
-            centro_x, centro_y = x + w // 2, y + h // 2
-            raio = int(w * 0.4)
-            cv2.circle(mask, (centro_x, centro_y), raio, 255, -1)
-
-            mask = cv2.bitwise_and(img_cinza_invertida, img_cinza_invertida, mask=mask)
-            pixels_da_bolha = mask[mask > 0]
-            media = np.mean(pixels_da_bolha) if pixels_da_bolha.size > 0 else 0
-            medias_intensidade.append(media)
+            circulos.append((x + w // 2, y + h // 2, int(w * 0.4)))
+        medias_intensidade = list(
+            medias_por_bolha(img_cinza_invertida, circulos=circulos, ignorar_zeros=True)
+        )
 
         if not medias_intensidade:
             continue
@@ -121,9 +110,7 @@ def detectar_codigo_por_bolhas(roi_gabarito):
             codigo_aluno += str(digito_marcado)
 
             (x, y, w, h) = cv2.boundingRect(contorno_marcado)
-            cv2.circle(
-                roi_gabarito, (x + w // 2, y + h // 2), int(w * 0.6), (0, 255, 0), 2
-            )
+            marcadas.append((x + w // 2, y + h // 2, int(w * 0.6)))
             print(
                 f"Análise da Coluna {idx+1}: Bolha MARCADA encontrada com intensidade {maior_media_encontrada:.2f}, dígito {digito_marcado}\n"
             )
@@ -134,32 +121,80 @@ def detectar_codigo_por_bolhas(roi_gabarito):
             )
 
     if codigo_aluno == "??":
-        return "", roi_gabarito
+        return "", marcadas
 
-    return codigo_aluno, roi_gabarito
+    return codigo_aluno, marcadas
 
 
-def normalizar_texto(texto):
-    if not texto:
-        return ""
-    texto = texto.lower()
-    texto = "".join(
-        c
-        for c in unicodedata.normalize("NFD", texto)
-        if unicodedata.category(c) != "Mn"
+def ler_codigo_por_layout(contexto, layout):
+    """
+    Lê as colunas do código do aluno nas posições do layout, usando o mesmo
+    registro da folha que o leitor de respostas.
+    """
+    LIMIAR_DE_PREENCHIMENTO = 90.0
+
+    homografia = contexto.registro(layout)
+    if homografia is None:
+        print(f"ERRO: Não foi possível registrar a folha no layout '{layout.nome}'.")
+        return None
+
+    preenchimento = contexto.preenchimento(
+        homografia,
+        layout.centros_codigo,
+        layout.raio_amostra,
+        LIMIAR_DE_PREENCHIMENTO,
+        nome="codigo",
     )
-    return texto
+    escolhas, confianca = classificar_marcacoes(preenchimento, LIMIAR_DE_PREENCHIMENTO)
+    contexto.confianca["codigo"] = confianca.tolist()
+
+    codigo_aluno = ""
+    for idx, (medias_intensidade, digito_marcado, certeza) in enumerate(
+        zip(preenchimento, escolhas, confianca)
+    ):
+        maior_media_encontrada = medias_intensidade.max()
+        if digito_marcado >= 0:
+            codigo_aluno += str(digito_marcado)
+            print(
+                f"Análise da Coluna {idx+1}: Bolha MARCADA encontrada com intensidade {maior_media_encontrada:.2f}, dígito {digito_marcado} (confiança {certeza:.2f})"
+            )
+        elif digito_marcado == SEM_MARCACAO:
+            codigo_aluno += "?"
+            print(
+                f"Análise da Coluna {idx+1}: Nenhuma bolha marcada (maior intensidade foi {maior_media_encontrada:.2f})"
+            )
+        else:
+            codigo_aluno += "?"
+            print(
+                f"Análise da Coluna {idx+1}: Mais de uma bolha marcada; dígito ilegível"
+            )
+
+    if set(codigo_aluno) == {"?"}:
+        return ""
+    return codigo_aluno
 
 
-def extrair_codigo_aluno_automatico(caminho_imagem):
+@metricas.cronometrar("codigo_aluno")
+def extrair_codigo_aluno_automatico(origem, layout=None):
+    """
+    Lê o código do aluno nas bolhas. `origem` pode ser o caminho da imagem ou
+    um SheetContext já compartilhado com o leitor de respostas. Com um
+    `layout`, as bolhas são amostradas nas posições do modelo da folha.
+    """
     try:
-        imagem_original = cv2.imread(caminho_imagem)
-        if imagem_original is None:
-            print(f"ERRO: Não foi possível carregar a imagem: '{caminho_imagem}'")
+        contexto = SheetContext.obter(origem)
+        if contexto is None:
             return None
 
+        if layout is not None:
+            codigo_limpo = ler_codigo_por_layout(contexto, carregar_layout(layout))
+            print(
+                f"Código do Aluno por Bolhas: {codigo_limpo if codigo_limpo else 'Nenhum código detectado.'}"
+            )
+            return codigo_limpo
+
         LARGURA_PADRAO = 1285
-        altura, largura, _ = imagem_original.shape
+        altura, largura = contexto.formato
         fator_redimensionamento = LARGURA_PADRAO / largura
         nova_altura = int(altura * fator_redimensionamento)
 
@@ -167,44 +202,39 @@ def extrair_codigo_aluno_automatico(caminho_imagem):
             f"Redimensionando imagem de {largura}x{altura} para {LARGURA_PADRAO}x{nova_altura}"
         )
         imagem_original = cv2.resize(
-            imagem_original, (LARGURA_PADRAO, nova_altura), interpolation=cv2.INTER_AREA
+            contexto.imagem,
+            (LARGURA_PADRAO, nova_altura),
+            interpolation=cv2.INTER_AREA,
         )
 
-        imagem_cinza = cv2.cvtColor(imagem_original, cv2.COLOR_BGR2GRAY)
-        _, imagem_binaria = cv2.threshold(
-            imagem_cinza, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
-        )
-        dados = pytesseract.image_to_data(
-            imagem_binaria, output_type=pytesseract.Output.DICT, lang="por"
+        anchor_box = None
+        # O leitor sem layout foi escrito para a folha do layout padrão.
+        palavra = contexto.procurar_palavra(
+            "assinatur", conf_minima=40, chave=f"{LAYOUT_PADRAO}:assinatura"
         )
+        if palavra is not None:
+            x_ancora = int(palavra["left"] * fator_redimensionamento)
+            y_ancora = int(palavra["top"] * fator_redimensionamento)
+            anchor_box = (x_ancora, y_ancora)
+            print(
+                f"✅ Âncora 'Assinatura' encontrada (variação: '{palavra['texto_normalizado']}') em: x={x_ancora}, y={y_ancora}"
+            )
 
-        anchor_box = None
-        for i in range(len(dados["level"])):
-            conf = int(dados["conf"][i])
-            palavra = normalizar_texto(dados["text"][i])
+        if anchor_box is None:
+            print("ERRO: Âncora 'Assinatura' não encontrada. Usando fallback...")
+            palavra = contexto.procurar_palavra(
+                "simulado", chave=f"{LAYOUT_PADRAO}:simulado"
+            )
+            if palavra is not None:
+                x_ancora = int(palavra["left"] * fator_redimensionamento)
+                y_ancora = int(palavra["top"] * fator_redimensionamento)
 
-            if conf > 40 and re.search(r"assinatur", palavra):
-                x_ancora, y_ancora = dados["left"][i], dados["top"][i]
+                x_ancora = x_ancora - 280
+                y_ancora = y_ancora + 10
                 anchor_box = (x_ancora, y_ancora)
                 print(
-                    f"✅ Âncora 'Assinatura' encontrada (variação: '{palavra}') em: x={x_ancora}, y={y_ancora}"
+                    f"⚠️ Usando fallback com 'Simulado' em x={x_ancora}, y={y_ancora}"
                 )
-                break
-
-        if anchor_box is None:
-            print("ERRO: Âncora 'Assinatura' não encontrada. Usando fallback...")
-            for i, palavra in enumerate(dados["text"]):
-                if "simulado" in palavra.lower():
-                    x_ancora = dados["left"][i]
-                    y_ancora = dados["top"][i]
-
-                    x_ancora = x_ancora - 280
-                    y_ancora = y_ancora + 10
-                    anchor_box = (x_ancora, y_ancora)
-                    print(
-                        f"⚠️ Usando fallback com 'Simulado' em x={x_ancora}, y={y_ancora}"
-                    )
-                    break
 
         if anchor_box is None:
             print("ERRO: Nenhuma âncora válida encontrada.")
@@ -245,26 +275,33 @@ def extrair_codigo_aluno_automatico(caminho_imagem):
         print("Coordenadas da ROI são válidas. Analisando bolhas...")
 
         roi_para_analise = imagem_original[y_roi_start:y_roi_end, x_roi_start:x_roi_end]
-        codigo_limpo, roi_com_deteccoes = detectar_codigo_por_bolhas(roi_para_analise)
-
-        imagem_original[y_roi_start:y_roi_end, x_roi_start:x_roi_end] = (
-            roi_com_deteccoes
+        codigo_limpo, marcadas = detectar_codigo_por_bolhas(roi_para_analise)
+
+        # Detecções de volta às coordenadas da imagem original, para o overlay.
+        contexto.deteccoes.setdefault("regioes", []).append(
+            tuple(
+                int(valor / fator_redimensionamento)
+                for valor in (
+                    x_roi_start,
+                    y_roi_start,
+                    x_roi_end - x_roi_start,
+                    y_roi_end - y_roi_start,
+                )
+            )
         )
-
-        cv2.rectangle(
-            imagem_original,
-            (x_roi_start, y_roi_start),
-            (x_roi_end, y_roi_end),
-            (0, 0, 255),
-            2,
+        contexto.deteccoes.setdefault("marcadas", []).extend(
+            (
+                int((x_roi_start + x) / fator_redimensionamento),
+                int((y_roi_start + y) / fator_redimensionamento),
+                int(raio / fator_redimensionamento),
+            )
+            for x, y, raio in marcadas
         )
-        # cv2.imwrite("resultado_deteccao_bolhas.jpg", imagem_original)
 
         print("\n--- RESULTADO ---")
         print(
             f"Código do Aluno por Bolhas: {codigo_limpo if codigo_limpo else 'Nenhum código detectado.'}"
         )
-        # print("\n📝 Imagem 'resultado_deteccao_bolhas.jpg' salva com as detecções.")
 
         return codigo_limpo
 
@@ -274,6 +311,14 @@ def extrair_codigo_aluno_automatico(caminho_imagem):
 
 
 if __name__ == "__main__":
-
-    caminho_da_prova = "backend/prova4.png"
-    extrair_codigo_aluno_automatico(caminho_da_prova)
+    import os
+    import sys
+
+    # Uso: python roi_code.py [imagem]; sem argumento, usa imagens_teste/prova4.png.
+    diretorio_do_script = os.path.dirname(os.path.abspath(__file__))
+    caminho_da_prova = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(diretorio_do_script, "imagens_teste", "prova4.png")
+    )
+    print(extrair_codigo_aluno_automatico(caminho_da_prova, carregar_layout()))